@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+#
+#   State turns per second of the batch engine against a Saga per state,
+#   every state playing the same random commands.
+#
+#   Usage: benchmarks/batch_steps.py <gamename> [states] [turns]
+#
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sagaenv import load_template
+from sagabatch import BatchSaga, ScalarBatch, random_commands
+
+
+def run(engine, commands):
+    start = time.time()
+    for command in commands:
+        engine.step(command)
+    return len(engine.observe()) * len(commands) / (time.time() - start)
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write(
+            'Usage: {0} <gamename> [states] [turns]\n'.format(argv[0]))
+        sys.exit(1)
+
+    template = load_template(argv[1])
+    states = len(argv) > 2 and int(argv[2]) or 1024
+    turns = len(argv) > 3 and int(argv[3]) or 100
+    commands = random_commands(template, turns)
+
+    print('{0:<12} {1:>8} {2:>14} {3:>10}'.format(
+        'engine', 'states', 'state turns/s', 'fallbacks'))
+    for count in (1, 64, states):
+        seeds = list(range(0, count))
+        for (name, engine) in (
+            ('scalar', ScalarBatch(template, seeds)),
+            ('batch', BatchSaga(template, seeds)),
+            ('batch exact', BatchSaga(template, seeds, True))
+        ):
+            rate = run(engine, commands)
+            print('{0:<12} {1:>8d} {2:>14.0f} {3:>10}'.format(
+                name, count, rate, getattr(engine, 'fallbacks', '-')))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
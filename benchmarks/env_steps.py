@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#
+#   Environment steps per second of a single SagaEnv and of VecSagaEnv with
+#   a number of worker processes, playing random commands.
+#
+#   Usage: benchmarks/env_steps.py <gamename> [envs] [steps]
+#
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sagaenv import SagaEnv, VecSagaEnv
+
+COMMANDS = [
+    'look', 'north', 'south', 'east', 'west', 'up', 'down',
+    'get all', 'inventory', 'drop all', 'score', 'look'
+]
+
+
+def single(filename, steps):
+    rng = random.Random(0)
+    env = SagaEnv(filename, max_steps=200)
+    env.reset(0)
+    start = time.time()
+    for i in range(0, steps):
+        (observation, reward, done, info) = env.step(rng.choice(COMMANDS))
+        if done:
+            env.reset(i)
+    return steps / (time.time() - start)
+
+
+def vectorised(filename, envs, workers, steps):
+    rng = random.Random(0)
+    env = VecSagaEnv(filename, envs, max_steps=200, workers=workers)
+    env.reset(0)
+    try:
+        for i in range(0, max(steps // envs, 1)):
+            env.step([rng.choice(COMMANDS) for j in range(0, envs)])
+        return env.steps_per_second()
+    finally:
+        env.close()
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write(
+            'Usage: {0} <gamename> [envs] [steps]\n'.format(argv[0]))
+        sys.exit(1)
+
+    envs = len(argv) > 2 and int(argv[2]) or 64
+    steps = len(argv) > 3 and int(argv[3]) or 50000
+
+    print('{0:<12} {1:>6} {2:>8} {3:>12}'.format('env', 'envs', 'workers', 'steps/s'))
+    print('{0:<12} {1:>6d} {2:>8d} {3:>12.0f}'.format(
+        'single', 1, 0, single(argv[1], steps)))
+    for workers in (1, 2, 4, 8):
+        print('{0:<12} {1:>6d} {2:>8d} {3:>12.0f}'.format(
+            'vectorised', envs, workers, vectorised(argv[1], envs, workers, steps)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+#   Throughput of the SagaGfx run-length bitmap decoders on synthetic images
+#   with different mixes of single pixels and runs.
+#
+#   Usage: benchmarks/gfx_rle.py [iterations]
+#
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import sagagfx
+
+WIDTH, HEIGHT = 255, 96
+
+# (name, chance of a single pixel, longest run)
+DISTRIBUTIONS = [
+    ('noisy', 0.9, 4),
+    ('mixed', 0.5, 16),
+    ('flat', 0.1, 127),
+    ('runs only', 0.0, 127),
+    ('short runs', 0.0, 3),
+]
+
+
+def encode(size, single, longest, seed=0):
+    rng = random.Random(seed)
+    data = bytearray()
+    n = 0
+    while n < size:
+        if rng.random() < single:
+            data.append(rng.randrange(0, 128))
+            n += 1
+        else:
+            j = min(rng.randrange(2, longest + 1), size - n)
+            data.extend((128 + j, rng.randrange(0, 256)))
+            n += j
+    return data
+
+
+def bench(decode, data, size, iterations):
+    start = time.time()
+    for _ in range(0, iterations):
+        decode(data, 0, size)
+    return (time.time() - start) / iterations
+
+
+def main(argv):
+    iterations = len(argv) > 1 and int(argv[1]) or 100
+    size = WIDTH * HEIGHT
+
+    decoders = [('bytearray', sagagfx.rle_decode)]
+    if sagagfx.numpy is not None:
+        decoders.append(('numpy', sagagfx.rle_decode_numpy))
+
+    print('{0:<12} {1:>8} {2:<10} {3:>10} {4:>12}'.format(
+        'bitmap', 'bytes', 'decoder', 'ms/image', 'Mpixels/s'))
+    for (name, single, longest) in DISTRIBUTIONS:
+        data = encode(size, single, longest)
+        for (decoder, decode) in decoders:
+            elapsed = bench(decode, data, size, iterations)
+            print('{0:<12} {1:>8d} {2:<10} {3:>10.3f} {4:>12.1f}'.format(
+                name, len(data), decoder, elapsed * 1000, size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+#   CPU time per turn with and without turn history recording (-x), playing
+#   a fixed list of commands.
+#
+#   Usage: benchmarks/history.py <gamename> [turns]
+#
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyscottfree import Saga
+
+COMMANDS = [
+    'look', 'north', 'south', 'east', 'west', 'up', 'down',
+    'get all', 'inventory', 'drop all', 'score', 'look'
+]
+
+clock = hasattr(time, 'process_time') and time.process_time or time.clock
+
+
+class ScriptedSaga(Saga):
+    def __init__(self, filename, options, turns):
+        self.commands = [COMMANDS[i % len(COMMANDS)] for i in range(0, turns)]
+        self.played = 0
+        Saga.__init__(self, options, 0, filename, None, False)
+        with open(filename, 'r') as file:
+            self.load_database(file, filename)
+
+    def exit(self, errno=0, errstr=None):
+        raise SystemExit(errno)
+
+    def input_read(self, str='', win=1):
+        if self.played >= len(self.commands):
+            return ''
+        self.played += 1
+        return self.commands[self.played - 1]
+
+    def emit(self, event, *args):
+        return self
+
+
+def play(filename, options, turns):
+    saga = ScriptedSaga(filename, options, turns)
+    start = clock()
+    try:
+        saga.game_loop()
+    except SystemExit:
+        pass
+    return (saga.played, clock() - start)
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write('Usage: {0} <gamename> [turns]\n'.format(argv[0]))
+        sys.exit(1)
+
+    turns = len(argv) > 2 and int(argv[2]) or 20000
+
+    print('{0:<10} {1:>8} {2:>12}'.format('history', 'turns', 'us/turn'))
+    for (name, options) in [('off', 0), ('on', Saga.FLAG_HISTORY)]:
+        (played, elapsed) = play(argv[1], options, turns)
+        print('{0:<10} {1:>8d} {2:>12.1f}'.format(
+            name, played, elapsed * 1000000 / max(played, 1)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#
+#   CPU time per turn with no tracing hooks, one hook, and a hook on every
+#   event several times over, playing a fixed list of commands.
+#
+#   Usage: benchmarks/hooks.py <gamename> [turns]
+#
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyscottfree import Saga
+
+COMMANDS = [
+    'look', 'north', 'south', 'east', 'west', 'up', 'down',
+    'get all', 'inventory', 'drop all', 'score', 'look'
+]
+
+clock = hasattr(time, 'process_time') and time.process_time or time.clock
+
+
+class ScriptedSaga(Saga):
+    def __init__(self, filename, turns):
+        self.commands = [COMMANDS[i % len(COMMANDS)] for i in range(0, turns)]
+        self.played = 0
+        Saga.__init__(self, 0, 0, filename, None, False)
+        with open(filename, 'r') as file:
+            self.load_database(file, filename)
+
+    def exit(self, errno=0, errstr=None):
+        raise SystemExit(errno)
+
+    def input_read(self, str='', win=1):
+        if self.played >= len(self.commands):
+            return ''
+        self.played += 1
+        return self.commands[self.played - 1]
+
+    def emit(self, event, *args):
+        return self
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, saga, *args):
+        self.calls += 1
+
+
+def play(filename, turns, hooks):
+    saga = ScriptedSaga(filename, turns)
+    counter = Counter()
+    for hook in hooks:
+        saga.add_hook(hook, counter)
+
+    start = clock()
+    try:
+        saga.game_loop()
+    except SystemExit:
+        pass
+    return (saga.played, clock() - start, counter.calls)
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write('Usage: {0} <gamename> [turns]\n'.format(argv[0]))
+        sys.exit(1)
+
+    turns = len(argv) > 2 and int(argv[2]) or 20000
+
+    print('{0:<10} {1:>8} {2:>12} {3:>12}'.format(
+        'hooks', 'turns', 'us/turn', 'calls/turn'))
+    for (name, hooks) in [
+            ('none', []),
+            ('one', [Saga.HOOK_LINE]),
+            ('many', Saga.HOOKS * 4)]:
+        (played, elapsed, calls) = play(argv[1], turns, hooks)
+        played = max(played, 1)
+        print('{0:<10} {1:>8d} {2:>12.1f} {3:>12.1f}'.format(
+            name, played, elapsed * 1000000 / played, float(calls) / played))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
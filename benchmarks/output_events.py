@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+#   Bytes and CPU time per turn of the wrapped text output against the
+#   structured event stream, playing a fixed list of commands.
+#
+#   Usage: benchmarks/output_events.py <gamename> [turns]
+#
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyscottfree import Saga
+
+COMMANDS = [
+    'look', 'north', 'south', 'east', 'west', 'up', 'down',
+    'get all', 'inventory', 'drop all', 'score', 'look'
+]
+
+clock = hasattr(time, 'process_time') and time.process_time or time.clock
+
+
+class ScriptedSaga(Saga):
+    def __init__(self, filename, turns):
+        self.commands = [COMMANDS[i % len(COMMANDS)] for i in range(0, turns)]
+        self.turns = 0
+        self.bytes = 0
+        Saga.__init__(self, 0, 0, filename, None, False)
+        with open(filename, 'r') as file:
+            self.load_database(file, filename)
+
+    def exit(self, errno=0, errstr=None):
+        raise SystemExit(errno)
+
+    def input_read(self, str='', win=1):
+        if self.turns >= len(self.commands):
+            return ''
+        self.turns += 1
+        return self.commands[self.turns - 1]
+
+    def output_flush(self):
+        return self
+
+
+# The current path, wrapped text as written to a terminal or socket
+class TextSaga(ScriptedSaga):
+    def output_write(self, str, win=1, scroll=True):
+        self.bytes += len(str.encode('utf-8'))
+        return self
+
+
+# Events serialised as compact JSON, one per line
+class EventSaga(ScriptedSaga):
+    def emit(self, event, *args):
+        if event == Saga.EVENT_ROOM and self.view_unchanged:
+            return self
+        self.bytes += len(json.dumps(
+            [event] + list(args), separators=(',', ':')
+        ).encode('utf-8')) + 1
+        return self
+
+
+def play(obj_type, filename, turns):
+    saga = obj_type(filename, turns)
+    start = clock()
+    try:
+        saga.game_loop()
+    except SystemExit:
+        pass
+    elapsed = clock() - start
+    return (saga.turns, saga.bytes, elapsed)
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write('Usage: {0} <gamename> [turns]\n'.format(argv[0]))
+        sys.exit(1)
+
+    filename = argv[1]
+    turns = len(argv) > 2 and int(argv[2]) or 1000
+
+    print('{0:<8} {1:>8} {2:>12} {3:>12}'.format(
+        'output', 'turns', 'bytes/turn', 'us/turn'))
+    for (name, obj_type) in [('text', TextSaga), ('events', EventSaga)]:
+        (played, size, elapsed) = play(obj_type, filename, turns)
+        played = max(played, 1)
+        print('{0:<8} {1:>8d} {2:>12.1f} {3:>12.1f}'.format(
+            name, played, float(size) / played, elapsed * 1e6 / played))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
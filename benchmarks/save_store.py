@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+#   Saves per second of the save stores, from a number of worker threads
+#   each saving many users' games.
+#
+#   Usage: benchmarks/save_store.py <gamename> [saves] [threads]
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyscottfree import Saga
+from sagasave import FileSaveStore, SQLiteSaveStore
+
+
+def worker(store, saga, first, count):
+    data = saga.save_state()
+    for i in range(first, first + count):
+        store.save('user{0:d}'.format(i % 1000), saga.name, 'slot{0:d}'.format(i % 3), data)
+    store.flush()
+
+
+def bench(store, saga, saves, threads):
+    count = saves // threads
+    workers = [
+        threading.Thread(target=worker, args=(store, saga, i * count, count))
+        for i in range(0, threads)
+    ]
+
+    start = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.time() - start
+
+    store.close()
+    return count * threads / elapsed
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.stderr.write(
+            'Usage: {0} <gamename> [saves] [threads]\n'.format(argv[0]))
+        sys.exit(1)
+
+    saves = len(argv) > 2 and int(argv[2]) or 5000
+    threads = len(argv) > 3 and int(argv[3]) or 4
+
+    saga = Saga(0, 0, None, None, False)
+    with open(argv[1], 'r') as file:
+        saga.load_database(file, os.path.basename(argv[1]))
+
+    path = tempfile.mkdtemp()
+    try:
+        stores = [
+            ('file', lambda: FileSaveStore(os.path.join(path, 'files'))),
+            ('sqlite, batch 1', lambda: SQLiteSaveStore(
+                os.path.join(path, 'saves1.db'), batch_size=1)),
+            ('sqlite, batch 64', lambda: SQLiteSaveStore(
+                os.path.join(path, 'saves64.db'), batch_size=64)),
+        ]
+
+        print('{0:<18} {1:>8} {2:>8} {3:>12}'.format(
+            'store', 'saves', 'threads', 'saves/s'))
+        for (name, store) in stores:
+            rate = bench(store(), saga, saves, threads)
+            print('{0:<18} {1:>8d} {2:>8d} {3:>12.0f}'.format(
+                name, saves, threads, rate))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+#
+#   Time of GET ALL / DROP ALL in a room full of items, with the indexed
+#   action lookup against a scan of the whole action table per item.
+#
+#   Usage: benchmarks/take_all.py [iterations]
+#
+
+import os
+import sys
+import time
+import random
+
+if sys.version_info[0] > 2:
+    from io import StringIO
+else:
+    from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyscottfree import Saga
+
+# (items in the room, action lines)
+SIZES = [(10, 100), (50, 250), (100, 500), (200, 1000)]
+
+
+def database(items, lines, seed=0):
+    # A TRS-80 format game with one room holding every item
+    rng = random.Random(seed)
+    words = 20 + items
+    verbs = ['AUT', 'GO'] + ['V%02d' % i for i in range(2, words)]
+    verbs[10], verbs[18] = 'GET', 'DRO'
+    nouns = ['ANY', 'NOR', 'SOU', 'EAS', 'WES', 'UP', 'DOW'] \
+        + ['N%03d' % i for i in range(7, words)]
+
+    out = ['0']
+    for n in (items, lines - 1, words - 1, 1, items + 1, 1, 0, 3, -1, 0, 0):
+        out.append(str(n))
+    for i in range(0, lines):
+        # Unconditional message 1 lines for any verb and noun but GET/DROP
+        verb = rng.choice([v for v in range(2, words) if v not in (10, 18)])
+        out.append('{0} 0 0 0 0 0 150 0'.format(
+            verb * 150 + rng.randrange(0, words)))
+    for (verb, noun) in zip(verbs, nouns):
+        out.extend(['"%s"' % verb, '"%s"' % noun])
+    out.extend(['0 0 0 0 0 0', '""', '0 0 0 0 0 0', '"room"'])
+    out.append('""')
+    for i in range(0, items + 1):
+        out.append('"Item %d/N%03d/" 1' % (i, 7 + i))
+    out.extend(['""'] * lines)
+    out.extend(['0', '0'])
+    return '\n'.join(out) + '\n'
+
+
+class QuietSaga(Saga):
+    def emit(self, event, *args):
+        return self
+
+
+# The action table scan used before the index, for comparison
+class ScanSaga(QuietSaga):
+    def perform_verb(self, verb_id, noun_id):
+        fl = -1
+        do_again = False
+        for action in self.actions:
+            (vv, nv) = divmod(action.vocab, 150)
+            if vv != 0:
+                do_again = False
+            if not do_again and fl == 0:
+                break
+
+            if vv == verb_id or (do_again and action.vocab == 0):
+                if do_again or nv == noun_id or nv == 0:
+                    if fl == -1:
+                        fl = -2
+                    f2 = self.perform_line(action)
+                    if f2 > 0:
+                        fl = 0
+                        if f2 == 2:
+                            do_again = True
+                        if not do_again:
+                            return 0
+        return fl
+
+    # Auto get words were looked up on every GET ALL / DROP ALL
+    def get_all(self, verb_id):
+        for (i, item) in enumerate(self.items):
+            if self.auto_get_ids[i] is not None:
+                self.auto_get_ids[i] = self.which_word(item.auto_get, self.nouns)
+        return QuietSaga.get_all(self, verb_id)
+
+    def drop_all(self, verb_id):
+        for (i, item) in enumerate(self.items):
+            if self.auto_get_ids[i] is not None:
+                self.auto_get_ids[i] = self.which_word(item.auto_get, self.nouns)
+        return QuietSaga.drop_all(self, verb_id)
+
+
+def bench(obj_type, data, iterations):
+    saga = obj_type(0, 0, 'bench', None, False)
+    saga.load_database(StringIO(data), 'bench')
+    saga.noun_text = 'all'
+    start = time.time()
+    for _ in range(0, iterations):
+        saga.perform_actions(10, -1)
+        saga.perform_actions(18, -1)
+    return (time.time() - start) / iterations
+
+
+def main(argv):
+    iterations = len(argv) > 1 and int(argv[1]) or 20
+
+    print('{0:>6} {1:>6} {2:>12} {3:>12} {4:>8}'.format(
+        'items', 'lines', 'scan ms', 'index ms', 'speedup'))
+    for (items, lines) in SIZES:
+        data = database(items, lines)
+        scan = bench(ScanSaga, data, iterations)
+        index = bench(QuietSaga, data, iterations)
+        print('{0:>6d} {1:>6d} {2:>12.3f} {3:>12.3f} {4:>7.1f}x'.format(
+            items, lines, scan * 1000, index * 1000, scan / index))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#
+#   Bytes per turn received by a client of the wire protocol in text mode
+#   and in ids mode, with and without a cached copy of the string tables.
+#
+#   Usage: benchmarks/wire_bandwidth.py <gamedir> <gamename> [turns]
+#
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sagalibrary import SagaLibrary
+from sagawire import SagaWireServer, SagaClient, MODE_IDS, MODE_TEXT
+
+COMMANDS = [
+    'look', 'north', 'south', 'east', 'west', 'up', 'down',
+    'get all', 'inventory', 'drop all', 'score', 'look'
+]
+
+
+class ScriptedClient(SagaClient):
+    def __init__(self, turns, cache_dir):
+        self.commands = [COMMANDS[i % len(COMMANDS)] for i in range(0, turns)]
+        self.handshake = 0
+        SagaClient.__init__(self, 0, cache_dir)
+
+    def connect(self, address, game, mode=MODE_IDS):
+        SagaClient.connect(self, address, game, mode)
+        self.handshake = self.bytes_received
+        return self
+
+    def read_command(self):
+        if self.turns > len(self.commands):
+            return ':quit'
+        return self.commands[self.turns - 1]
+
+    def output_write(self, str, win=1, scroll=True):
+        return self
+
+
+def main(argv):
+    if len(argv) < 3:
+        sys.stderr.write(
+            'Usage: {0} <gamedir> <gamename> [turns]\n'.format(argv[0]))
+        sys.exit(1)
+
+    turns = len(argv) > 3 and int(argv[3]) or 1000
+    server = SagaWireServer(('localhost', 0), SagaLibrary(argv[1]))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        print('{0:<14} {1:>8} {2:>10} {3:>12}'.format(
+            'mode', 'turns', 'handshake', 'bytes/turn'))
+        for (name, mode) in [
+                ('text', MODE_TEXT),
+                ('ids', MODE_IDS),
+                ('ids, cached', MODE_IDS)]:
+            client = ScriptedClient(turns, cache_dir)
+            client.connect(server.server_address, argv[2], mode).play()
+            played = max(client.turns, 1)
+            print('{0:<14} {1:>8d} {2:>10d} {3:>12.1f}'.format(
+                name, played, client.handshake,
+                float(client.bytes_received - client.handshake) / played))
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
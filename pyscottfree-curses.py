@@ -22,15 +22,39 @@
 
 from pyscottfree import Saga, main
 
+import os
 import sys
+import time
 import curses
+import locale
 import signal
 
+try:
+    from sagagfx import SagaGfx
+except ImportError:     # PIL is not installed
+    SagaGfx = None
+
 __author__ = 'Jon Ruttan'
 __copyright__ = 'Copyright (C) 2016 Jon Ruttan'
 __license__ = 'Distributed under the GNU software license'
 __version__ = '0.1.5'
 
+HALF_BLOCK = u'\u2580'     # Upper half block, foreground top, background bottom
+CUBE = (0, 95, 135, 175, 215, 255)
+
+
+def xterm_colour(r, g, b):
+    # Nearest colour of the xterm 256 colour cube or grey ramp
+    cube = [min(range(0, 6), key=lambda i: abs(CUBE[i] - v)) for v in (r, g, b)]
+    colour = 16 + 36 * cube[0] + 6 * cube[1] + cube[2]
+    distance = sum((CUBE[c] - v) ** 2 for (c, v) in zip(cube, (r, g, b)))
+
+    grey = min(23, max(0, int(round(((r + g + b) / 3.0 - 8) / 10))))
+    level = 8 + 10 * grey
+    if sum((level - v) ** 2 for v in (r, g, b)) < distance:
+        colour = 232 + grey
+    return colour
+
 
 class CursesSaga(Saga):
     def __init__(self, options=0, seed=None, name=None, file=None, greet=True):
@@ -38,7 +62,17 @@ class CursesSaga(Saga):
 
         self.win = [None, None]
         self.win_height = (10, 14)      # Height of the curses windows
+        self.dirty = set()              # Windows to refresh on output_flush
+
+        self.gfx = None
+        self.win_gfx = None             # Picture, right of the room window
+        self.cells = {}                 # Cell grids keyed by (scene, size)
+        self.cells_shown = None
+        self.pairs = {}                 # Colour pairs keyed by (fg, bg)
+        self.gfx_stats = dict(conversions=0, convert_time=0.0, looks=0,
+                              cells=0, bytes=0)
 
+        locale.setlocale(locale.LC_ALL, '')
         curses.initscr()
         self.curses_up = True
 
@@ -71,15 +105,28 @@ class CursesSaga(Saga):
 
     def do_exit(self, errno=0, str=None):
         if self.curses_up:
+            self.output_flush()
             curses.nocbreak()
             curses.echo()
             curses.endwin()
             self.curses_up = False
 
+        if self.gfx is not None and self.option(Saga.FLAG_DEBUGGING):
+            stats = self.gfx_stats
+            sys.stderr.write(
+                'Pictures: {0} conversions, {1:.2f} ms each, '
+                '{2:.0f} cells and ~{3:.0f} bytes redrawn per look\n'.format(
+                    stats['conversions'],
+                    stats['convert_time'] * 1000 / max(1, stats['conversions']),
+                    stats['cells'] / float(max(1, stats['looks'])),
+                    stats['bytes'] / float(max(1, stats['looks']))
+                ))
+
     def clear_screen(self):
         Saga.clear_screen(self)
         for win in self.win:
             win.erase()
+            self.dirty.add(win)
 
     def output_reset(self, win=1, scroll=False):
         Saga.output_reset(self, win, scroll)
@@ -87,6 +134,7 @@ class CursesSaga(Saga):
             self.win[win].scroll
         self.win[win].move(self.win_height[win] - 1, 0)
         self.win[win].clrtoeol()
+        self.dirty.add(self.win[win])
 
     def curses_addstr(self, str, win=1):
         try:
@@ -95,29 +143,178 @@ class CursesSaga(Saga):
             pass
 
     def output_write(self, str, win=1, scroll=True):
-        lines = str.split('\n')
-
-        for line in lines[:-1]:
-            self.curses_addstr(line + '\n', win)
-            if scroll:
-                self.output_reset(win, True)
+        # The transcript window scrolls itself on newlines
+        self.curses_addstr(str, win)
+        self.dirty.add(self.win[win])
+        return self
 
-        self.curses_addstr(lines[-1], win)
-        self.win[win].refresh()
+    def output_flush(self):
+        # One physical screen update for everything written this turn
+        for win in self.dirty:
+            win.noutrefresh()
+        self.dirty.clear()
+        curses.doupdate()
+        return self
 
     def input_read(self, str='', win=1):
         self.output(str, win, False)
-        curses.doupdate()
+        self.output_flush()
         curses.echo()
         string = self.win[win].getstr()
         curses.noecho()
         self.output_reset()
+        if not isinstance(string, type('')):
+            string = string.decode(locale.getpreferredencoding(), 'replace')
         return string
 
-    def look(self):
+    def show_room(self, text):
+        if self.view_unchanged:
+            return self
+
         self.win[0].erase()
         self.win[0].move(0, 0)
-        Saga.look(self)
+        Saga.show_room(self, text)
+        return self
+
+    def load_database(self, file=None, name=None):
+        if not Saga.load_database(self, file, name):
+            return False
+
+        self.gfx = None
+        path = os.path.splitext(file.name)[0] + '.gfx'
+        if SagaGfx is not None and os.path.exists(path) and self.open_gfx(path):
+            self.width = self.win[0].getmaxyx()[1]
+        return self
+
+    def open_gfx(self, path):
+        # Pictures need 256 colours to look like anything
+        if not curses.has_colors():
+            return False
+        curses.start_color()
+        if curses.COLORS < 256:
+            return False
+
+        self.gfx = SagaGfx(path, cache_dir=None).read()
+
+        # Keep the picture's aspect ratio, two pixel rows per line
+        (height, width) = self.win[0].getmaxyx()
+        columns = int(round(
+            self.gfx.size[0] * height * 2.0 / self.gfx.size[1]
+        ))
+        columns = min(columns, width // 2)
+        self.win[0].resize(height, width - columns)
+        self.win_gfx = curses.newwin(height, columns, 0, width - columns)
+        self.win_gfx.leaveok(True)
+
+        self.cells.clear()
+        self.cells_shown = None
+        return True
+
+    # Pairs for all the colours of a picture are made before drawing it, as
+    # making a pair over again recolours the cells on screen using it.
+    # Returns True when the pairs ran out and were all made afresh
+    def allocate_pairs(self, cells):
+        needed = set()
+        for row in cells:
+            for (fg, bg) in row:
+                needed.add(fg > bg and (bg, fg) or (fg, bg))
+        missing = [colours for colours in needed if colours not in self.pairs]
+        if not len(missing):
+            return False
+
+        reset = len(self.pairs) + len(missing) >= curses.COLOR_PAIRS
+        if reset:
+            self.pairs.clear()
+            missing = list(needed)
+
+        # Cells beyond the terminal's pairs are left in the default colours
+        for (fg, bg) in sorted(missing)[:curses.COLOR_PAIRS - 1 - len(self.pairs)]:
+            pair = len(self.pairs) + 1
+            curses.init_pair(pair, fg, bg)
+            self.pairs[(fg, bg)] = pair
+        return reset
+
+    # A pair shown reversed serves for its colours the other way round
+    def colour_attr(self, fg, bg):
+        if fg > bg:
+            return curses.color_pair(self.pairs.get((bg, fg), 0)) | curses.A_REVERSE
+        return curses.color_pair(self.pairs.get((fg, bg), 0))
+
+    def convert_image(self, image, size):
+        start = time.time()
+        (rows, columns) = size
+        palette = image.getpalette() or [0] * 3
+        colours = [
+            xterm_colour(*palette[i:i + 3])
+            for i in range(0, len(palette) - 2, 3)
+        ]
+        pixels = bytearray(image.resize((columns, rows * 2)).tobytes())
+
+        cells = []
+        for y in range(0, rows):
+            top = pixels[y * 2 * columns:(y * 2 + 1) * columns]
+            bottom = pixels[(y * 2 + 1) * columns:(y * 2 + 2) * columns]
+            cells.append([
+                (colours[t % len(colours)], colours[b % len(colours)])
+                for (t, b) in zip(top, bottom)
+            ])
+
+        self.gfx_stats['conversions'] += 1
+        self.gfx_stats['convert_time'] += time.time() - start
+        return cells
+
+    def display_image(self, id):
+        if self.gfx is None:
+            return Saga.display_image(self, id)
+
+        scene = self.gfx.get_scene(self, id)
+        if not Saga.display_image(self, scene and scene[0]):
+            return
+
+        (rows, columns) = self.win_gfx.getmaxyx()
+        key = (scene, (rows, columns))
+        cells = self.cells.get(key)
+        if cells is None:
+            image = self.gfx.get_frame(scene)
+            if image is None:
+                return
+            if len(self.cells) >= self.gfx.cache_size:
+                self.cells.clear()
+            cells = self.cells[key] = self.convert_image(image, (rows, columns))
+
+        # Only redraw the cells that differ from the picture on screen
+        shown = self.cells_shown
+        if self.allocate_pairs(cells) or (shown is not None and len(shown) != len(cells)):
+            shown = None
+        drawn = 0
+        written = 0
+        last = (None, None)
+        for (y, row) in enumerate(cells):
+            for (x, cell) in enumerate(row):
+                if shown is not None and shown[y][x] == cell:
+                    continue
+                try:
+                    self.win_gfx.addstr(y, x, HALF_BLOCK, self.colour_attr(*cell))
+                except curses.error:
+                    pass    # Writing the bottom right cell scrolls
+
+                # Estimate the terminal traffic: the glyph, plus a cursor
+                # move when not following on and a 256 colour SGR on change
+                drawn += 1
+                written += 3
+                if last[0] != (y, x - 1):
+                    written += 8
+                if last[1] != cell:
+                    written += 22
+                last = ((y, x), cell)
+
+        self.cells_shown = cells
+        self.dirty.add(self.win_gfx)
+
+        self.gfx_stats['looks'] += 1
+        self.gfx_stats['cells'] += drawn
+        self.gfx_stats['bytes'] += written
+        return self
 
 
 if __name__ == '__main__':
@@ -22,16 +22,19 @@
 
 import os
 import sys
+import threading
 
 from pyscottfree import Saga, DIR_SAVE
 from sagagfx import SagaGfx
 from PIL import Image, ImageTk
 
 if sys.version_info[0] > 2:
+    import queue
     import tkinter
     import tkinter.filedialog
     import tkinter.messagebox
 else:
+    import Queue as queue
     import Tkinter as tkinter
     import tkFileDialog as filedialog
     import tkMessageBox as messagebox
@@ -47,12 +50,27 @@ __version__ = '0.3.1'
 
 
 class TkSaga(Saga):
+    RESIZE_THREAD_PIXELS = 512 * 384    # Larger canvases resize off the UI thread
+    RESIZE_POLL = 10                    # ms between checks for a finished resize
+    FRAME_INTERVAL = 200                # ms between animation frames
+
     def __init__(self, options=0, seed=None, name=None, file=None, greet=True):
         self.root = tkinter.Tk()
         self.root.title("PyScottFree")
         self.dirname = '.'
         self.gfx = None
         self.image_id = None
+        self.canvas_size = None
+        self.canvas_item = None
+        self.photo = None
+        self.scene = None               # Picture and effects from SagaGfx
+        self.tick = 0                   # Animation frame counter
+        self.ticker = None
+        self.scaled = {}                # Images keyed by (scene, frame, size)
+        self.shown = None               # Key of the image on the canvas
+        self.pending = None             # Key of the image being resized
+        self.resized = queue.Queue()
+        self.poller = None              # Timer id of the next poll_resize
         self.game_path = '.'
         self.save_path = os.path.join(os.path.expanduser(DIR_SAVE))
         self.resize_filter = Image.NEAREST
@@ -109,7 +127,7 @@ Release {0}, {1}.
         frame.pack(fill=tkinter.BOTH, expand=tkinter.YES)
 
         # Win0 - description - top,top-left
-        win0 = tkinter.Text(frame, width=40, height=10)
+        win0 = tkinter.Text(frame, width=40, height=10, wrap=tkinter.WORD)
         win0.pack(side=tkinter.LEFT, fill=tkinter.BOTH, expand=tkinter.YES)
 
         # Canvas - images - upper-right
@@ -118,7 +136,7 @@ Release {0}, {1}.
         frame.pack(side=tkinter.TOP, fill=tkinter.BOTH, expand=tkinter.YES)
 
         # Win1 - transcript - middle
-        win1 = tkinter.Text(frame, width=80, height=14)
+        win1 = tkinter.Text(frame, width=80, height=14, wrap=tkinter.WORD)
         win1.pack(side=tkinter.LEFT, fill=tkinter.BOTH, expand=tkinter.YES)
         scrollbar = tkinter.Scrollbar(frame)
         scrollbar.pack(side=tkinter.RIGHT, fill=tkinter.Y)
@@ -151,7 +169,16 @@ Release {0}, {1}.
         self.entry.focus_set()
 
     def on_canvas_configure(self, event):
-        self.display_image(self.image_id)
+        size = (event.width - 1, event.height - 1)
+        if size[0] < 1 or size[1] < 1:
+            return
+
+        # Scaled images are only good for one canvas size
+        if size != self.canvas_size:
+            self.canvas_size = size
+            self.scaled.clear()
+            self.shown = None
+        self.show_image()
 
     def exit(self, errno=0, str=None):
         Saga.exit(self, errno, str)
@@ -170,8 +197,9 @@ Release {0}, {1}.
         self.win[win].insert('end', string, ('WIN0', 'WIN1')[win])
         self.win[win].see('end')
 
+    # The text widgets wrap to their own width
     def output(self, string, win=1, scroll=True):
-        return Saga.output(self, string, win, False)
+        return Saga.output(self, string, win, False, False)
 
     def input_read(self, string='', win=1):
         return self.entry.get()
@@ -182,28 +210,129 @@ Release {0}, {1}.
         self.output(string + '\n')
         return string
 
-    def look(self):
+    def show_room(self, text):
+        if self.view_unchanged:
+            return self
         self.win[0].delete('1.0', tkinter.END)
-        Saga.look(self)
+        return Saga.show_room(self, text)
 
     def display_image(self, id):
+        scene = None
         if self.gfx is not None:
-            id = self.gfx.get_image_id(self, id)
+            scene = self.gfx.get_scene(self, id)
+            id = scene and scene[0]
 
         if not Saga.display_image(self, id):
             return
 
         self.image_id = id
+        if scene != self.scene:
+            self.scene = scene
+            self.tick = 0
+        self.show_image()
+
+        # Colour cycling and animation redraw the canvas image on each tick
+        if self.ticker is None and self.gfx is not None \
+                and self.gfx.is_animated(scene):
+            self.ticker = self.root.after(TkSaga.FRAME_INTERVAL, self.on_tick)
+
+        # Decode the pictures of the neighbouring rooms in the background
+        if self.gfx is not None and self.player_room < len(self.rooms):
+            self.gfx.prefetch(
+                [room for room in self.rooms[self.player_room].exits if room]
+            )
+
+    def on_tick(self):
+        self.ticker = None
+        if self.gfx is None or not self.gfx.is_animated(self.scene):
+            return
+
+        self.tick += 1
+        self.show_image()
+        self.ticker = self.root.after(TkSaga.FRAME_INTERVAL, self.on_tick)
+
+    def show_image(self):
+        scene = self.scene
+        if self.gfx is None or scene is None \
+                or scene[0] >= self.gfx.num_rooms + self.gfx.num_action89 + self.gfx.num_extended:
+            return
 
-        if self.gfx is not None and self.image_id < self.gfx.num_rooms + self.gfx.num_action89 + self.gfx.num_extended:
-            self.root.update_idletasks()
-            size = (
-                self.canvas.winfo_width() - 1 or self.gfx.size[0],
-                self.canvas.winfo_height() - 1 or self.gfx.size[1],
+        frame = len(scene[2]) and self.tick % len(scene[2]) or 0
+        key = (scene, frame, self.canvas_size or self.gfx.size)
+        if key == self.pending or (key == self.shown and scene[3] < 2):
+            return
+
+        if key in self.scaled:
+            return self.draw_image(key, self.scaled[key])
+
+        image = self.gfx.get_frame(scene, frame)
+        if image is None:
+            return
+
+        size = key[2]
+        if size[0] * size[1] < TkSaga.RESIZE_THREAD_PIXELS:
+            return self.draw_image(key, image.resize(size, self.resize_filter))
+
+        # Tk isn't thread safe, so only the PIL resize happens in the thread
+        self.pending = key
+        thread = threading.Thread(target=self.resize_image, args=(key, image))
+        thread.daemon = True
+        thread.start()
+        self.schedule_poll()
+
+    def resize_image(self, key, image):
+        self.resized.put((key, image.resize(key[2], self.resize_filter)))
+
+    # One poller at a time, however many resizes overlap
+    def schedule_poll(self):
+        if self.poller is not None:
+            self.root.after_cancel(self.poller)
+        self.poller = self.root.after(TkSaga.RESIZE_POLL, self.poll_resize)
+
+    def poll_resize(self):
+        self.poller = None
+        while True:
+            try:
+                (key, image) = self.resized.get_nowait()
+            except queue.Empty:
+                break
+
+            # Drop resizes for images or sizes that are no longer wanted
+            if key == self.pending:
+                self.pending = None
+                if key[2] == (self.canvas_size or self.gfx.size):
+                    self.draw_image(key, image)
+
+        # Polling stops once nothing is being resized
+        if self.pending is not None:
+            self.schedule_poll()
+
+    def draw_image(self, key, image):
+        if key not in self.scaled:
+            if len(self.scaled) >= self.gfx.cache_size:
+                self.scaled.clear()
+            self.scaled[key] = image
+        self.shown = key
+
+        # Cycling only swaps the palette of the scaled image
+        palette = self.gfx.get_palette(key[0], self.tick)
+        if palette is not None:
+            image.putpalette(palette)
+
+        # Paste into the existing PhotoImage while the size is unchanged
+        if self.photo is not None \
+                and (self.photo.width(), self.photo.height()) == image.size:
+            self.photo.paste(image)
+            return
+
+        self.photo = ImageTk.PhotoImage(image)
+        self.canvas.image = self.photo
+        if self.canvas_item is None:
+            self.canvas_item = self.canvas.create_image(
+                0, 0, anchor=tkinter.NW, image=self.photo
             )
-            pilImage = self.gfx.images[self.image_id].resize(size)
-            self.canvas.image = ImageTk.PhotoImage(pilImage)
-            self.canvas.create_image(0, 0, anchor=tkinter.NW, image=self.canvas.image)
+        else:
+            self.canvas.itemconfig(self.canvas_item, image=self.photo)
 
     def load_database(self, file=None):
         if not Saga.load_database(self, file):
@@ -211,6 +340,10 @@ Release {0}, {1}.
 
         image_path = os.path.split(file.name)[0]
         self.images = []
+        self.scaled.clear()
+        self.shown = None
+        self.pending = None
+        self.scene = None
 
         filename = self.name + '.gfx'
         path = os.path.join(image_path, filename)
@@ -220,7 +353,10 @@ Release {0}, {1}.
                 fill=tkinter.BOTH,
                 expand=tkinter.YES
             )
-            self.gfx = SagaGfx(path).read()
+            self.gfx = SagaGfx(
+                path,
+                self.option(Saga.FLAG_VERBOSE, Saga.FLAG_DEBUGGING)
+            ).read()
         else:
             self.canvas.pack_forget()
 
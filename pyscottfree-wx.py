@@ -53,8 +53,9 @@ class WxSaga(Saga):
     def output_write(self, string, win=1, scroll=True):
         self.frame.win[win].AppendText(string)
 
+    # The text controls wrap to their own width
     def output(self, string, win=1, scroll=True):
-        return Saga.output(self, string, win, False)
+        return Saga.output(self, string, win, False, False)
 
     def input_read(self, string='', win=1):
         string = self.frame.entry.GetValue()
@@ -66,9 +67,11 @@ class WxSaga(Saga):
         self.frame.win[win].AppendText(string + '\n')
         return string
 
-    def look(self):
+    def show_room(self, text):
+        if self.view_unchanged:
+            return self
         self.frame.win[0].Clear()
-        Saga.look(self)
+        return Saga.show_room(self, text)
 
 
 class MainWindow(wx.Frame):
@@ -22,15 +22,21 @@
 
 import sys
 import os
+import copy
 import getopt
+import json
 import time
 import random
 import textwrap
 
 from functools import reduce
+from collections import namedtuple, deque
 
 if sys.version_info[0] == 2:
     input = raw_input
+    from StringIO import StringIO
+else:
+    from io import StringIO
 
 __author__ = 'Jon Ruttan'
 __copyright__ = 'Copyright (C) 2016 Jon Ruttan'
@@ -40,13 +46,33 @@ __version__ = '0.8.8'
 DIR_APP = 'scottfree'
 ENV_FILE = 'SCOTTFREE_PATH'
 ENV_SAVE = 'SCOTTFREE_SAVE'
+ENV_STRINGS = 'SCOTTFREE_STRINGS'
+ENV_METRICS = 'SCOTTFREE_METRICS'
+ENV_HISTORY = 'SCOTTFREE_HISTORY'
 home = os.getenv('HOME', './')
 DIR_SAVE = '%s/.scottfree/' % home
 EXT_SAVE = '.sav'
+SLOT_DEFAULT = 'default'
 
+# Atomic where the platform allows it
+replace = getattr(os, 'replace', os.rename)
 
-def random_percent(n):
-    return random.randint(0, 99) < n
+# A parsed command; unknown is the position of the first unknown word or -1
+Command = namedtuple('Command', 'verb_id noun_id noun_text unknown')
+
+# A recorded turn; moves are (item, from, to), before and after are snapshots
+Turn = namedtuple('Turn', 'number text command fired moves before after')
+
+# Limits on a turn: action lines evaluated, output bytes and wall time in
+# seconds, each None for no limit
+Budget = namedtuple('Budget', 'lines output seconds')
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, name, limit):
+        Exception.__init__(self, name, limit)
+        self.name = name
+        self.limit = limit
 
 
 class Database:
@@ -182,9 +208,12 @@ class Saga:
     FLAG_SCOTTLIGHT = 0x2           # Authentic Scott Adams light messages
     FLAG_TRS80_STYLE = 0x4          # Display in style used on TRS-80
     FLAG_PREHISTORIC_LAMP = 0x8     # Destroy the lamp (very old databases)
+    FLAG_TIDY_ALL = 0x10            # TAKE ALL / DROP ALL skip handled items
     FLAG_WAIT_ON_EXIT = 0x20        # Wait before exiting
     FLAG_VERBOSE = 0x40             # Info from load/save
     FLAG_DEBUGGING = 0x80           # Debugging info
+    FLAG_WATCH = 0x100              # Reload the database when it changes
+    FLAG_HISTORY = 0x200            # Record turns for stepping back
 
     FLAG_DARK = 0x8000
     FLAG_LIGHT_OUT = 0x10000        # Light gone out
@@ -195,9 +224,144 @@ class Saga:
     STATE_RUN = 2                   # Database loaded, game running
     STATE_WAIT = 3                  # Waiting for external process
 
+    PARSE_CACHE_SIZE = 1024         # Parsed commands kept per game
+    HISTORY_SIZE = 1000             # Turns kept for stepping back
+
+    # Names of the action line conditions, by condition code - 1
+    CONDITIONS = [
+        'carried', 'here', 'present', 'at', 'not here', 'not carried',
+        'not at', 'flag', 'not flag', 'loaded', 'not loaded', 'not present',
+        'exists', 'not exists', 'counter <=', 'counter >', 'not moved',
+        'moved', 'counter =='
+    ]
+
+    EVENT_ROOM = 'room'             # Room, dark, exit indexes, item ids
+    EVENT_MESSAGE = 'message'       # Database message id
+    EVENT_STRING = 'string'         # Engine string name, format arguments
+    EVENT_TEXT = 'text'             # Dynamic text, eg. the typed noun
+    EVENT_INVENTORY = 'inventory'   # Carried item ids
+    EVENT_PROMPT = 'prompt'         # Engine string name of the prompt
+    EVENT_GAME_OVER = 'game over'
+
+    HOOK_LINE = 'line start'        # Line number, Action
+    HOOK_CONDITION = 'condition'    # Line, condition index, code, value, passed
+    HOOK_OPCODE = 'opcode'          # Line number, opcode
+    HOOK_ITEM = 'item moved'        # Item id, from location, to location
+    HOOK_ROOM = 'room changed'      # From room, to room
+    HOOKS = [HOOK_LINE, HOOK_CONDITION, HOOK_OPCODE, HOOK_ITEM, HOOK_ROOM]
+
+    # Engine strings; a tuple is (option flag, string without, string with)
+    STRINGS = {
+        # Names used for direction labels
+        'exit names': ['North', 'South', 'East', 'West', 'Up', 'Down'],
+
+        # Separator used for lists
+        'list separator': (FLAG_TRS80_STYLE, ' - ', '. '),
+
+        # Light out message
+        'light out': (
+            FLAG_SCOTTLIGHT,
+            'Your light has run out. ',
+            'Light has run out! '
+        ),
+
+        # Perform action responses
+        'perform_actions': [
+            "I don't understand your command. ",
+            "I can't do that yet. "
+        ],
+
+        # Rest of list is messages; dashes are filled to the display width
+        'trs80 line': '\n<{0}>\n',
+        'none': 'none',
+        'file error': "Can't open '{0}'",
+        'too dark': (
+            FLAG_YOUARE,
+            "I can't see. It is too dark!",
+            "You can't see. It is too dark!"
+        ),
+        'look': (FLAG_YOUARE, "I'm in a {0}\n", "You are {0}\n"),
+        'exits': "\nObvious exits: {0}.\n\n",
+        'also see': (FLAG_YOUARE, "I can also see: ", "You can also see: "),
+        'input': "\nTell me what to do ? ",
+        'unknown word': "You use word(s) I don't know! ",
+        'filename': "Filename [{0}]: ",
+        'save error': "Unable to create save file.\n",
+        'save ok': "Saved.\n",
+        'load error': "Unable to restore game.",
+        'game over': "The game is now over.\n",
+        'overloaded': (
+            FLAG_YOUARE,
+            "I've too much to carry ",
+            "You are carrying too much. "
+        ),
+        'dead': (FLAG_YOUARE, "I am dead.\n", "You are dead.\n"),
+        'treasures': "{0}stored {1} treasures.  On a scale of 0 to 100, that rates {2}.\n",
+        'well done': "Well done.\n",
+        'nothing': "Nothing",
+        'have': (FLAG_YOUARE, "I've ", "You have "),
+        'carry': (
+            FLAG_YOUARE,
+            "I'm carrying:\n{0}.\n",
+            "You are carrying:\n{0}.\n"
+        ),
+        'need dir': "Give me a direction too.",
+        'dark warning': "Dangerous to move in the dark! ",
+        'broke neck': (
+            FLAG_YOUARE,
+            "I fell down and broke my neck. ",
+            "You fell down and broke your neck. "
+        ),
+        'blocked': (
+            FLAG_YOUARE,
+            "I can't go in that direction. ",
+            "You can't go in that direction. "
+        ),
+        'dark': "It is dark.\n",
+        'take':  "{0}: O.K.\n",
+        'drop':  "{0}: O.K.\n",
+        'nothing taken': "Nothing taken.",
+        'nothing dropped': "Nothing dropped.\n",
+        'what': "What ? ",
+        'unable': (
+            FLAG_YOUARE,
+            "It's beyond my power to do that. ",
+            "It is beyond your power to do that. "
+        ),
+        'ok': "O.K. ",
+        'light out in': "Light runs out in {0:d} turns. ",
+        'light dim': "Your light is growing dim. ",
+        'over budget': "\n[Turn stopped, over its {0} limit of {1}]\n"
+    }
+
+    # Alternate or localized strings, see load_string_pack()
+    string_pack = os.getenv(ENV_STRINGS)
+
+    # Save backend used instead of save files, see sagasave.py
+    save_store = None
+    user = None
+
+    # Turns kept by -x, each a kilobyte or two, see README.md
+    history_size = HISTORY_SIZE
+
+    # Turn latency and counters, see sagametrics.py
+    metrics = None
+    timer = None                    # Times the phases of a turn for metrics
+
+    # Callbacks by hook, see add_hook()
+    hooks = None
+
+    # Seconds opcode 88 waits. DOC's say 2 seconds. Spectrum times at 1.5
+    pause = 2
+
+    # Limits on each turn, see Budget, and what the turn has used so far
+    budget = None
+    spent = None
+
     def __init__(self, options=0, seed=None, name=None, file=None, greet=True):
-        # Initialize the random number generator, None will use the system time
-        random.seed(seed)
+        # Each game has its own random number generator, so games sharing a
+        # process replay alike from a seed; None will use the system time
+        self.random = random.Random(seed)
 
         self.name = name
         self.state = Saga.STATE_NONE
@@ -245,6 +409,28 @@ class Saga:
         self.room_saved = [0] * 16      # Range unknown
         self.bit_flags = 0
         self.redraw = False             # Update item window
+        self.room_versions = [0] * 256  # Bumped when items enter or leave
+        self.room_cache = {}            # Room text, exits and items by view
+        self.view_shown = None
+        self.view_unchanged = False
+        self.words = None               # Verb and noun ids by word, per game
+        self.parse_cache = None         # Word ids by normalised input, per game
+        self.command = None             # Last parsed command
+        self.action_index = None        # Action line numbers by verb, per game
+        self.auto_get_ids = None        # Noun ids of the items' auto get words
+        self.carried = 0                # Number of items carried
+        self.filename = None            # Database file, for watch mode
+        self.file_stamp = None
+        self.history = None             # Recorded turns, oldest first
+        self.future = []                # Turns stepped back over, newest last
+        self.turn_start = None          # Turn being recorded
+        self.turn_moves = None          # Item moves of the turn being recorded
+        self.turn_fired = None          # Lines fired in the turn being recorded
+        self.turn_number = 0
+        self.input_text = None
+
+        if self.options and self.options & Saga.FLAG_HISTORY:
+            self.history = deque(maxlen=self.history_size)
 
         self.last_synonym = None
 
@@ -255,74 +441,11 @@ class Saga:
             # Brian Howarth interpreter also supports this
             'i': 'inventory'
         }
-        self.strings = {
-            # Names used for direction labels
-            'exit names': ['North', 'South', 'East', 'West', 'Up', 'Down'],
-
-            # Separator used for lists; second entry tied to FLAG_TRS80_STYLE
-            'list separator': [' - ', '. '],
-
-            # Light out message; second entry tied to FLAG_SCOTTLIGHT flag
-            'light out': ['Your light has run out. ', 'Light has run out! '],
-
-            # Perform action responses
-            'perform_actions': [
-                "I don't understand your command. ",
-                "I can't do that yet. "
-            ],
-
-            # Rest of list is messages; second entry tied to FLAG_YOUARE flag
-            'trs80 line': '\n<' + '-' * (self.width - 4) + '>\n',
-            'none': 'none',
-            'file error': "Can't open '{0}'",
-            'too dark': [
-                "I can't see. It is too dark!",
-                "You can't see. It is too dark!"
-            ],
-            'look': ["I'm in a {0}\n", "You are {0}\n"],
-            'exits': "\nObvious exits: {0}.\n\n",
-            'also see': ["I can also see: ", "You can also see: "],
-            'input': "\nTell me what to do ? ",
-            'unknown word': "You use word(s) I don't know! ",
-            'filename': "Filename [{0}]: ",
-            'save error': "Unable to create save file.\n",
-            'save ok': "Saved.\n",
-            'load error': "Unable to restore game.",
-            'game over': "The game is now over.\n",
-            'overloaded': [
-                "I've too much to carry ",
-                "You are carrying too much. "
-            ],
-            'dead': ["I am dead.\n", "You are dead.\n"],
-            'treasures': "{0}stored {1} treasures.  On a scale of 0 to 100, that rates {2}.\n",
-            'well done': "Well done.\n",
-            'nothing': "Nothing",
-            'have': ["I've ", "You have "],
-            'carry': ["I'm carrying:\n{0}.\n", "You are carrying:\n{0}.\n"],
-            'need dir': "Give me a direction too.",
-            'dark warning': "Dangerous to move in the dark! ",
-            'broke neck': [
-                "I fell down and broke my neck. ",
-                "You fell down and broke your neck. "
-            ],
-            'blocked': [
-                "I can't go in that direction. ",
-                "You can't go in that direction. "
-            ],
-            'dark': "It is dark.\n",
-            'take':  "{0}: O.K.\n",
-            'drop':  "{0}: O.K.\n",
-            'nothing taken': "Nothing taken.",
-            'nothing dropped': "Nothing dropped.\n",
-            'what': "What ? ",
-            'unable': [
-                "It's beyond my power to do that. ",
-                "It is beyond your power to do that. "
-            ],
-            'ok': "O.K. ",
-            'light out in': "Light runs out in {0:d} turns. ",
-            'light dim': "Your light is growing dim. "
-        }
+        self.strings = resolve_strings(
+            self.options,
+            self.width,
+            self.string_pack
+        )
 
         self.state = Saga.STATE_INIT
 
@@ -384,17 +507,29 @@ Adventure: {0.adventure}
 
     def fatal(self, str):
         self.state = Saga.STATE_ERR
+        self.count('errors')
         self.exit(1, '\n{0}.\n'.format(str))
 
+    def count(self, name, n=1):
+        if self.metrics is not None:
+            self.metrics.count(name, n)
+        return self
+
     def option(self, *options):
         return reduce(lambda x, y: x | y, options) & self.options
 
     def string(self, name, option_flag=None):
+        # Option dependent strings are resolved once, see resolve_strings();
+        # option_flag picks the variant by that option instead
         if option_flag is None:
             return self.strings[name]
-        return self.strings[name][self.options & option_flag and 1 or 0]
+        value = pack_strings(self.string_pack)[name]
+        if not isinstance(value, tuple):
+            return self.strings[name]
+        return value[self.options & option_flag and 2 or 1]
 
     def clear_screen(self):
+        self.view_shown = None
         return self
 
     def output_reset(self, win=1, scroll=False):
@@ -404,8 +539,14 @@ Adventure: {0.adventure}
         sys.stdout.write(str)
         return self
 
+    def output_flush(self):
+        sys.stdout.flush()
+        return self
+
     def output(self, obj, win=1, scroll=True, wrap=True):
         string = str(obj)
+        if self.spent is not None:
+            self.spend(0, len(string))
 
         if not string[-1].isspace():
             string += ' '
@@ -426,6 +567,45 @@ Adventure: {0.adventure}
         self.output_write(string, win, scroll)
         return self
 
+    # Events carry ids and unwrapped text; frontends and network sessions can
+    # override emit() to render them natively
+    def emit(self, event, *args):
+        return self.render_event(event, args)
+
+    def render_event(self, event, args):
+        if event == Saga.EVENT_ROOM:
+            return self.show_room(self.render_room(self.view_shown, args[2:]))
+        elif event == Saga.EVENT_MESSAGE:
+            return self.output(self.messages[args[0]] + '\n')
+        elif event == Saga.EVENT_STRING:
+            return self.output(self.render_string(*args))
+        elif event == Saga.EVENT_TEXT:
+            return self.output(args[0])
+        elif event == Saga.EVENT_INVENTORY:
+            return self.output(self.render_inventory(args[0]))
+        elif event == Saga.EVENT_GAME_OVER:
+            return self.output(self.strings['game over'])
+
+        # The prompt is shown by input()
+        return self
+
+    def render_string(self, name, *args):
+        string = self.strings[name]
+        if isinstance(string, list):
+            return string[args[0]]
+        if len(args):
+            return string.format(*args)
+        return string
+
+    def render_inventory(self, items):
+        if len(items):
+            carry = self.strings['list separator'].join(
+                [self.items[i].text for i in items]
+            )
+        else:
+            carry = self.strings['nothing']
+        return self.strings['carry'].format(carry)
+
     def input_read(self, str='', win=1):
         try:
             return input(str)
@@ -433,10 +613,19 @@ Adventure: {0.adventure}
             self.aborted()
 
     def input(self, str='', win=1):
+        if self.timer is not None:
+            self.output_flush()
+            self.timer.lap('flush').end()
         return self.input_read(str, win).strip()
 
+    def random_percent(self, n):
+        return self.random.randint(0, 99) < n
+
     def count_carried(self):
-        return reduce(lambda count, item: count + item.location == Saga.LOC_CARRIED and 1 or 0, self.items, 0)
+        return self.carried
+
+    def count_items(self, location):
+        return len([item for item in self.items if item.location == location])
 
     def test_light(self, *locations):
         if Saga.ITEM_LIGHT < len(self.items) \
@@ -540,45 +729,240 @@ Adventure: {0.adventure}
 
         if self.option(Saga.FLAG_VERBOSE, Saga.FLAG_DEBUGGING):
             print('Version {0:d}.{1:02d} of Adventure {2:d}\nLoad Complete.\n'
-                  .format(self.version / 100, self.version % 100, self.adventure))
+                  .format(self.version // 100, self.version % 100, self.adventure))
 
         # if self.option(Saga.FLAG_DEBUGGING):
         #   self.dump()
 
+        self.words = (self.index_words(self.verbs), self.index_words(self.nouns))
+        self.parse_cache = {}
+        self.index_actions()
+        self.carried = self.count_items(Saga.LOC_CARRIED)
+
+        self.filename = getattr(file, 'name', None)
+        self.file_stamp = self.stat_file()
+
         self.clear_screen()
         self.redraw = True
         self.state = Saga.STATE_RUN
         return self
 
-    def look(self):
-        if self.bit_flags & Saga.FLAG_DARK \
-                and self.items[Saga.ITEM_LIGHT].location != Saga.LOC_CARRIED \
-                and self.items[Saga.ITEM_LIGHT].location != self.player_room:
-            self.output(self.string('too dark', Saga.FLAG_YOUARE), 0, False)
+    def share_database(self, saga):
+        # Start a new game from a database already loaded by another Saga.
+        # The parsed tables are shared by reference, only the items (which
+        # hold game state) are copied.
+        if saga is None or saga.state < Saga.STATE_INIT:
+            return False
 
-            if self.options & Saga.FLAG_TRS80_STYLE:
-                self.output(self.string('trs80 line'), 0, False)
+        self.reset()
+
+        self.name = saga.name
+        self.use_tables(saga)
 
-            return
+        self.items = [copy.copy(item) for item in saga.items]
+        for item in self.items:
+            item.location = item.initial_loc
+        self.carried = self.count_items(Saga.LOC_CARRIED)
+        self.player_room = saga.player_room
+        self.light_time = self.light_refill
+
+        self.clear_screen()
+        self.redraw = True
+        self.state = Saga.STATE_RUN
+        return self
+
+    def use_tables(self, saga):
+        self.actions = saga.actions
+        self.verbs = saga.verbs
+        self.nouns = saga.nouns
+        self.rooms = saga.rooms
+        self.messages = saga.messages
+        self.max_carry = saga.max_carry
+        self.treasures = saga.treasures
+        self.word_length = saga.word_length
+        self.treasure_room = saga.treasure_room
+        self.light_refill = saga.light_refill
+        self.version = saga.version
+        self.adventure = saga.adventure
+        self.words = saga.words
+        self.parse_cache = saga.parse_cache
+        self.action_index = saga.action_index
+        self.auto_get_ids = saga.auto_get_ids
+        self.filename = saga.filename
+        self.file_stamp = saga.file_stamp
+        return self
 
+    def stat_file(self):
+        try:
+            stat = os.stat(self.filename)
+            return (stat.st_mtime, stat.st_size)
+        except (OSError, TypeError):
+            return None
+
+    # Polled every turn in watch mode
+    def check_reload(self):
+        if self.filename is None:
+            return False
+
+        stamp = self.stat_file()
+        if stamp is None or stamp == self.file_stamp:
+            return False
+
+        self.file_stamp = stamp
+        return self.reload_database()
+
+    def reload_database(self):
+        start = time.time()
+        try:
+            with open(self.filename, 'r') as file:
+                saga = Saga(
+                    self.options & ~(Saga.FLAG_VERBOSE | Saga.FLAG_DEBUGGING),
+                    None, self.name, None, False
+                )
+                saga.load_database(file, self.name)
+        except Exception as err:
+            # Most likely caught half written
+            self.output('[Reload of {0} failed: {1}]\n'.format(self.filename, err))
+            return False
+
+        problems = self.swap_database(saga)
+        self.output('[Reloaded {0} in {1:d} ms{2}]\n'.format(
+            os.path.basename(self.filename),
+            int((time.time() - start) * 1000),
+            len(problems) and ': ' + '; '.join(problems) or ''
+        ))
+        return self
+
+    # Swap in reloaded tables, keeping the game state where indices line up
+    def swap_database(self, saga):
+        problems = []
+        for (name, old, new) in [
+                ('items', self.items, saga.items),
+                ('rooms', self.rooms, saga.rooms),
+                ('messages', self.messages, saga.messages),
+                ('words', self.verbs, saga.verbs),
+                ('actions', self.actions, saga.actions)]:
+            if len(old) != len(new):
+                problems.append('{0} {1:d} -> {2:d}'.format(name, len(old), len(new)))
+
+        items = [copy.copy(item) for item in saga.items]
+        for (i, item) in enumerate(items):
+            if i < len(self.items):
+                item.location = self.items[i].location
+
+            # Carried and destroyed items stay so whatever the rooms
+            if item.location in (Saga.LOC_DESTROYED, Saga.LOC_CARRIED):
+                continue
+
+            if not 0 < item.location < len(saga.rooms) \
+                    and item.location != item.initial_loc:
+                problems.append('item {0:d} returned to room {1:d}'.format(
+                    i, item.initial_loc))
+                item.location = item.initial_loc
+
+        if not 0 < self.player_room < len(saga.rooms):
+            problems.append('player returned to room {0:d}'.format(saga.player_room))
+            self.player_room = saga.player_room
+
+        self.use_tables(saga)
+        self.items = items
+        self.carried = self.count_items(Saga.LOC_CARRIED)
+        self.room_cache = {}
+        self.room_versions = [v + 1 for v in self.room_versions]
+        self.redraw = True
+        return problems
+
+    # Everything the room description depends on
+    def room_view(self):
+        dark = bool(self.bit_flags & Saga.FLAG_DARK) \
+            and self.items[Saga.ITEM_LIGHT].location != Saga.LOC_CARRIED \
+            and self.items[Saga.ITEM_LIGHT].location != self.player_room
+        return (
+            self.player_room,
+            dark,
+            self.room_versions[self.player_room],
+            self.options,
+            self.width
+        )
+
+    def view_changed(self):
+        return self.room_view() != self.view_shown
+
+    # Exit indexes and ids of the items in the player's room
+    def room_contents(self):
         r = self.rooms[self.player_room]
-        if r.text.startswith('*'):
-            self.output(r.text[1:] + '\n', 0, False)
+        return (
+            tuple([i for (i, exit) in enumerate(r.exits) if exit != 0]),
+            tuple([
+                i for (i, item) in enumerate(self.items)
+                if item.location == self.player_room
+            ])
+        )
+
+    # The exits and items of a view, only scanned for when it isn't cached
+    def view_contents(self, view):
+        entry = self.room_cache.get(view)
+        if entry is not None:
+            return entry[1:]
+
+        if view[1]:
+            contents = ((), ())
+        else:
+            contents = self.room_contents()
+        self.cache_room(view, None, contents)
+        return contents
+
+    def cache_room(self, view, text, contents):
+        if len(self.room_cache) >= 256:
+            self.room_cache.clear()
+        self.room_cache[view] = (text,) + tuple(contents)
+        return self
+
+    def render_room(self, view=None, contents=None):
+        if view is None:
+            view = self.room_view()
+
+        entry = self.room_cache.get(view)
+        if entry is not None:
+            if entry[0] is not None:
+                return entry[0]
+            contents = entry[1:]
+        elif contents is None:
+            contents = self.view_contents(view)
+
+        parts = []
+        if view[1]:
+            parts.append(self.strings['too dark'])
+
+            if self.options & Saga.FLAG_TRS80_STYLE:
+                parts.append(self.strings['trs80 line'])
         else:
-            self.output(self.string('look', Saga.FLAG_YOUARE).format(r.text), 0, False)
+            parts.extend(self.render_room_text(view[0], *contents))
 
-        exits = []
-        for (i, exit) in enumerate(r.exits):
-            if exit != 0:
-                exits.append(self.string('exit names')[i])
+        # Separate the parts as individual calls to output would
+        text = ''.join([
+            part[-1].isspace() and part or part + ' ' for part in parts
+        ])
 
-        exits = len(exits) and ', '.join(exits) or self.string('none')
-        self.output(self.string('exits').format(exits), 0, False)
+        self.cache_room(view, text, contents)
+        return text
 
-        items = [item.text for item in [item for item in self.items if item.location == self.player_room]]
+    def render_room_text(self, room, exits, items):
+        parts = []
+        r = self.rooms[room]
+        if r.text.startswith('*'):
+            parts.append(r.text[1:] + '\n')
+        else:
+            parts.append(self.strings['look'].format(r.text))
+
+        exits = [self.strings['exit names'][i] for i in exits]
+        exits = len(exits) and ', '.join(exits) or self.strings['none']
+        parts.append(self.strings['exits'].format(exits))
+
+        items = [self.items[i].text for i in items]
         if len(items):
-            separator = self.string('list separator', Saga.FLAG_TRS80_STYLE)
-            lines = [self.string('also see', Saga.FLAG_YOUARE)]
+            separator = self.strings['list separator']
+            lines = [self.strings['also see']]
             for item in items:
                 if len(lines[-1]) + len(item) > self.width - 10:
                     lines.append('')
@@ -589,14 +973,50 @@ Adventure: {0.adventure}
             if not self.options & Saga.FLAG_TRS80_STYLE:
                 lines = lines[:-len(separator)]
 
-            self.output(lines + '\n', 0, False)
+            parts.append(lines + '\n')
 
         if self.options & Saga.FLAG_TRS80_STYLE:
-            self.output(self.string('trs80 line'), 0, False)
+            parts.append(self.strings['trs80 line'])
+
+        return parts
 
-        self.display_image(self.player_room)
+    def look(self):
+        view = self.room_view()
+        self.view_unchanged = view == self.view_shown
+        self.view_shown = view
+
+        self.emit(
+            Saga.EVENT_ROOM,
+            self.player_room,
+            view[1],
+            *self.view_contents(view)
+        )
+
+        if not view[1]:
+            self.display_image(self.player_room)
+        return self
+
+    # Frontends with a room window can skip repainting when view_unchanged
+    def show_room(self, text):
+        self.output(text, 0, False)
         return self
 
+    def move_item(self, item, location):
+        old = self.items[item].location
+        if old != location:
+            self.room_versions[old] += 1
+            self.room_versions[location] += 1
+            self.items[item].location = location
+
+            if old == Saga.LOC_CARRIED:
+                self.carried -= 1
+            elif location == Saga.LOC_CARRIED:
+                self.carried += 1
+
+            if self.turn_moves is not None:
+                self.turn_moves.append((item, old, location))
+        return old
+
     def display_image(self, id):
         if id is None:
             return False
@@ -623,9 +1043,91 @@ Adventure: {0.adventure}
 
         return -1
 
+    # Word ids by truncated lower case word, as which_word() would find them
+    def index_words(self, list):
+        index = {}
+        id = 0
+        for (i, str) in enumerate(list):
+            if not len(str):
+                continue
+
+            if str.startswith('*'):
+                str = str[1:]
+            else:
+                id = i
+
+            index.setdefault(str[:self.word_length].lower(), id)
+        return index
+
+    def word_id(self, word, index):
+        if not word:
+            return -1
+        return index.get(word[:self.word_length].lower(), -1)
+
+    def index_actions(self):
+        # Lines with a verb, in table order, so a command only visits its own
+        self.action_index = {}
+        for (i, action) in enumerate(self.actions):
+            verb_id = action.vocab // 150
+            if verb_id != 0:
+                self.action_index.setdefault(verb_id, []).append(i)
+
+        (verbs, nouns) = self.words
+        self.auto_get_ids = [None] * len(self.items)
+        for (i, item) in enumerate(self.items):
+            if len(item.auto_get) and not item.auto_get.startswith('*'):
+                self.auto_get_ids[i] = self.word_id(item.auto_get, nouns)
+        return self
+
+    def parse_words(self, verb, noun=None):
+        if noun is None and len(verb) == 1:
+            verb = self.shortforms.get(verb.lower(), verb)
+
+        (verbs, nouns) = self.words
+        noun_id = self.word_id(verb, nouns)
+        # The Scott Adams system has a hack to avoid typing 'go'
+        if noun_id >= 1 and noun_id <= 6:
+            return (1, noun_id, -1)
+
+        verb_id = self.word_id(verb, verbs)
+        noun_id = self.word_id(noun, nouns)
+        if verb_id == -1:
+            unknown = 0
+        elif noun and noun_id == -1:
+            unknown = 1
+        else:
+            unknown = -1
+        return (verb_id, noun_id, unknown)
+
+    def parse_command(self, verb, noun=None):
+        # A missing noun and an empty one differ over shortforms
+        key = (
+            verb[:self.word_length].lower(),
+            (noun or '')[:self.word_length].lower(),
+            noun is None
+        )
+
+        ids = self.parse_cache.get(key)
+        if ids is None:
+            ids = self.parse_words(verb, noun)
+            if len(self.parse_cache) >= Saga.PARSE_CACHE_SIZE:
+                self.parse_cache.clear()
+            self.parse_cache[key] = ids
+
+        return Command(ids[0], ids[1], noun, ids[2])
+
     def get_input(self):
-        buf = self.input(self.string('input'))
+        self.emit(Saga.EVENT_PROMPT, 'input')
+        buf = self.input(self.strings['input'])
+        if self.timer is not None:
+            self.timer.begin()
         self.output_reset()
+        self.input_text = buf
+
+        # Pick up edits to the database before parsing with its words
+        if self.options & Saga.FLAG_WATCH and self.check_reload():
+            self.look()
+            self.redraw = False
 
         if not len(buf):
             return None
@@ -642,36 +1144,255 @@ Adventure: {0.adventure}
                 'save': lambda filename: self.save_game(filename),
                 'quit': lambda verb: self.exit(1, '\nUser exit\n')
             }
+            if self.history is not None:
+                actions.update({
+                    'back': lambda count: self.step_back(count),
+                    'forward': lambda count: self.step_forward(count),
+                    'history': lambda count: self.show_history(count),
+                    'why': lambda line: self.show_why(line)
+                })
             if verb[1:].lower() in actions:
                 actions[verb[1:].lower()](noun)
                 return False
 
-        if(noun is None and len(verb) == 1):
-            for (k, v) in self.shortforms.items():
-                if k == verb.lower():
-                    verb = v
-                    break
-
-        noun_id = self.which_word(verb, self.nouns)
-        # The Scott Adams system has a hack to avoid typing 'go'
-        if noun_id >= 1 and noun_id <= 6:
-            verb_id = 1
-        else:
-            verb_id = self.which_word(verb, self.verbs)
-            noun_id = self.which_word(noun, self.nouns)
-
-        if verb_id == -1:
-            self.output(self.string('unknown word'))
+        self.command = self.parse_command(verb, noun)
+        if self.timer is not None:
+            self.timer.lap('parse')
+        if self.command.verb_id == -1:
+            self.emit(Saga.EVENT_STRING, 'unknown word')
             return False
 
         self.noun_text = noun   # Needed by GET/DROP hack
-        return (verb_id, noun_id)
+        return self.command[:2]
+
+    def save_state(self):
+        lines = [
+            '{0:d} {1:d}'.format(self.counters[i], self.room_saved[i])
+            for i in range(0, 16)
+        ]
+
+        lines.append('{0:d} {1:d} {2:d} {3:d} {4:d} {5:d}'.format(
+            self.bit_flags,
+            self.bit_flags & Saga.FLAG_DARK and 1 or 0,
+            self.player_room,
+            self.current_counter,
+            self.saved_room,
+            self.light_time
+        ))
+
+        lines.extend(['{0:d}'.format(item.location) for item in self.items])
+        return '\n'.join(lines) + '\n'
+
+    def restore_state(self, file):
+        database = Database(file)
+
+        for i in range(0, 16):
+            self.counters[i] = database.read_number()
+            self.room_saved[i] = database.read_number()
+
+        self.bit_flags = database.read_number()
+        dark_flag = database.read_number()
+        self.player_room = database.read_number()
+        self.current_counter = database.read_number()
+        self.saved_room = database.read_number()
+        self.light_time = database.read_number()
+
+        # Backward compatibility
+        if dark_flag:
+            self.bit_flags |= Saga.FLAG_DARK
+
+        for item in self.items:
+            # Database reads 255 as -1
+            location = database.read_number()
+            item.location = location == -1 and Saga.LOC_CARRIED or location
+        self.carried = self.count_items(Saga.LOC_CARRIED)
+
+        self.room_versions = [v + 1 for v in self.room_versions]
+        return self
+
+    # The state a turn can change besides item locations
+    def snapshot(self):
+        return (
+            self.player_room,
+            self.bit_flags,
+            self.current_counter,
+            self.saved_room,
+            self.light_time,
+            tuple(self.counters),
+            tuple(self.room_saved)
+        )
+
+    def use_snapshot(self, snapshot):
+        (
+            self.player_room,
+            self.bit_flags,
+            self.current_counter,
+            self.saved_room,
+            self.light_time
+        ) = snapshot[:5]
+        self.counters = list(snapshot[5])
+        self.room_saved = list(snapshot[6])
+        return self
+
+    # Recording keeps to a snapshot per turn and an append per line fired or
+    # item moved, so it can stay on for long runs
+    def start_turn(self):
+        self.future = []
+        self.turn_moves = []
+        self.turn_fired = []
+        self.turn_start = (self.input_text, self.command, self.snapshot())
+        return self
+
+    def end_turn(self):
+        self.turn_number += 1
+        self.history.append(Turn(
+            self.turn_number,
+            self.turn_start[0],
+            self.turn_start[1],
+            self.turn_fired,
+            self.turn_moves,
+            self.turn_start[2],
+            self.snapshot()
+        ))
+        self.turn_start = self.turn_moves = self.turn_fired = None
+        return self
+
+    def undo_turn(self, turn):
+        for (item, old, new) in reversed(turn.moves):
+            self.move_item(item, old)
+        return self.use_snapshot(turn.before)
+
+    def redo_turn(self, turn):
+        for (item, old, new) in turn.moves:
+            self.move_item(item, new)
+        return self.use_snapshot(turn.after)
+
+    def step_count(self, count):
+        try:
+            return count is not None and max(int(count), 1) or 1
+        except ValueError:
+            return 1
+
+    def step_back(self, count=None):
+        steps = 0
+        while steps < self.step_count(count) and len(self.history):
+            turn = self.history.pop()
+            self.undo_turn(turn)
+            self.future.append(turn)
+            steps += 1
+
+        number = len(self.future) and self.future[-1].number or self.turn_number + 1
+        self.output('[Back {0:d} turns to before turn {1:d}]\n'.format(steps, number))
+        return self.look()
+
+    def step_forward(self, count=None):
+        steps = 0
+        while steps < self.step_count(count) and len(self.future):
+            turn = self.future.pop()
+            self.redo_turn(turn)
+            self.history.append(turn)
+            steps += 1
+
+        self.output('[Forward {0:d} turns to after turn {1:d}]\n'.format(
+            steps, len(self.history) and self.history[-1].number or 0))
+        return self.look()
+
+    def describe_turn(self, turn):
+        parts = []
+        if len(turn.fired):
+            parts.append('lines ' + ', '.join([str(i) for i in turn.fired]))
+        parts.extend([
+            'item {0:d} {1:d}->{2:d}'.format(*move) for move in turn.moves
+        ])
+
+        (before, after) = (turn.before, turn.after)
+        if before[0] != after[0]:
+            parts.append('room {0:d}->{1:d}'.format(before[0], after[0]))
+        changed = before[1] ^ after[1]
+        for bit in range(0, 32):
+            if changed & (1 << bit):
+                parts.append('flag {0:d} {1}'.format(
+                    bit, after[1] & (1 << bit) and 'set' or 'cleared'))
+        if before[2] != after[2]:
+            parts.append('counter {0:d}->{1:d}'.format(before[2], after[2]))
+        for (i, (old, new)) in enumerate(zip(before[5], after[5])):
+            if old != new:
+                parts.append('counter {0:d} {1:d}->{2:d}'.format(i, old, new))
+
+        return '#{0:d} {1}: {2}'.format(
+            turn.number, turn.text, len(parts) and '; '.join(parts) or 'no change')
+
+    def show_history(self, count=None):
+        count = count is not None and self.step_count(count) or 10
+        turns = list(self.history)[-count:]
+        lines = [self.describe_turn(turn) for turn in turns]
+        if len(self.future):
+            lines.append('({0:d} turns ahead, :forward to replay)'.format(
+                len(self.future)))
+        self.output('[{0}]\n'.format(
+            len(lines) and '\n '.join(lines) or 'No turns recorded'))
+        return self
+
+    def explain_line(self, i, fired=()):
+        if i < 0 or i >= len(self.actions):
+            return 'line {0:d}: no such line'.format(i)
+
+        action = self.actions[i]
+        (vv, nv) = divmod(action.vocab, 150)
+        words = vv and '{0} {1}'.format(self.verbs[vv], self.nouns[nv]) \
+            or '{0:d}%'.format(nv)
+        if i in fired:
+            return 'line {0:d} ({1}): fired'.format(i, words)
+
+        (failed, params) = self.check_conditions(action.condition)
+        if failed == -1:
+            return 'line {0:d} ({1}): conditions pass, not reached'.format(i, words)
+
+        (dv, cv) = divmod(action.condition[failed], 20)
+        return 'line {0:d} ({1}): condition {2:d} failed, {3} {4:d}'.format(
+            i, words, failed + 1, Saga.CONDITIONS[cv - 1], dv)
+
+    # Conditions are checked as they stood at the start of the last turn
+    def show_why(self, line=None):
+        turn = len(self.history) and self.history[-1] or None
+        if line is None and (turn is None or turn.command is None):
+            self.output('[No turns recorded]\n')
+            return self
+
+        if turn is not None:
+            self.undo_turn(turn)
+        try:
+            if line is not None:
+                try:
+                    lines = [int(line)]
+                except ValueError:
+                    lines = []
+            else:
+                lines = [
+                    i for i in self.action_index.get(turn.command.verb_id, ())
+                    if self.actions[i].vocab % 150 in (0, turn.command.noun_id)
+                ]
+
+            text = [
+                self.explain_line(i, turn is not None and turn.fired or ())
+                for i in lines
+            ]
+        finally:
+            if turn is not None:
+                self.redo_turn(turn)
+
+        self.output('[{0}]\n'.format(
+            len(text) and '\n '.join(text) or 'No lines for this command'))
+        return self
 
     def save_game(self, filename=None):
+        if self.save_store is not None:
+            return self.save_slot(filename)
+
         default = os.path.join(DIR_SAVE, self.name + EXT_SAVE)
 
         if filename is None:
-            filename = self.input(self.string('filename').format(default)).strip()
+            filename = self.input(self.strings['filename'].format(default)).strip()
 
         if not len(filename):
             filename = default
@@ -680,78 +1401,96 @@ Adventure: {0.adventure}
             print('Saving to "{0}"'.format(filename))
 
         try:
-            file = open(filename, 'w')
-
-            for i in range(0, 16):
-                file.write('{0:d} {1:d}\n'.format(self.counters[i], self.room_saved[i]))
-
-            file.write('{0:d} {1:d} {2:d} {3:d} {4:d} {5:d}\n'.format(self.bit_flags,
-                       self.bit_flags & Saga.FLAG_DARK and 1 or 0,
-                       self.player_room,
-                       self.current_counter,
-                       self.saved_room,
-                       self.light_time))
-
-            for item in self.items:
-                file.write('{0:d}\n'.format(item.location))
+            # Replace the old save only once the new one is complete
+            with open(filename + '.tmp', 'w') as file:
+                file.write(self.save_state())
+            replace(filename + '.tmp', filename)
 
-            file.close()
-            self.output(self.string('save ok'))
-        except IOError:
-            self.output(self.string('save error'))
+            self.emit(Saga.EVENT_STRING, 'save ok')
+            self.count('saves')
+        except (IOError, OSError):
+            self.emit(Saga.EVENT_STRING, 'save error')
+            self.count('errors')
 
         return self
 
     def load_game(self, filename=None):
+        if self.save_store is not None:
+            return self.load_slot(filename)
+
         default = os.path.join(DIR_SAVE, self.name + EXT_SAVE)
 
         if filename is None:
-            filename = self.input(self.string('filename').format(default)).strip()
+            filename = self.input(self.strings['filename'].format(default)).strip()
 
         if not len(filename):
             filename = default
 
         try:
             with open(filename, 'r') as file:
-                database = Database(file)
-
                 if self.options & Saga.FLAG_VERBOSE:
                     print('Loading from "{0}"'.format(filename))
 
-                for i in range(0, 16):
-                    self.counters[i] = database.read_number()
-                    self.room_saved[i] = database.read_number()
+                self.restore_state(file)
 
-                self.bit_flags = database.read_number()
-                dark_flag = database.read_number()
-                self.player_room = database.read_number()
-                self.current_counter = database.read_number()
-                self.saved_room = database.read_number()
-                self.light_time = database.read_number()
+            if self.options & Saga.FLAG_VERBOSE:
+                print('Loaded.')
+        except IOError:
+            self.fatal(self.strings['load error'])
 
-                # Backward compatibility
-                if dark_flag:
-                    self.bit_flags |= Saga.FLAG_DARK
+        return self
 
-                for item in self.items:
-                    item.location = database.read_number()
+    # Saves kept by a save_store are named by user, game and slot
+    def save_slot(self, slot=None):
+        if slot is None:
+            slot = self.input(self.strings['filename'].format(SLOT_DEFAULT)).strip()
 
-            if self.options & Saga.FLAG_VERBOSE:
-                print('Loaded.')
+        if not len(slot):
+            slot = SLOT_DEFAULT
+
+        try:
+            self.save_store.save(self.user, self.name, slot, self.save_state())
+            self.emit(Saga.EVENT_STRING, 'save ok')
+            self.count('saves')
         except IOError:
-            self.fatal(self.string('load error'))
+            self.emit(Saga.EVENT_STRING, 'save error')
+            self.count('errors')
+
+        return self
+
+    def load_slot(self, slot=None):
+        if slot is None:
+            slot = self.input(self.strings['filename'].format(SLOT_DEFAULT)).strip()
+
+        if not len(slot):
+            slot = SLOT_DEFAULT
+
+        try:
+            data = self.save_store.load(self.user, self.name, slot)
+        except IOError:
+            data = None
+
+        if data is None:
+            self.emit(Saga.EVENT_STRING, 'load error')
+            self.count('errors')
+        else:
+            self.restore_state(StringIO(data))
+            self.redraw = True
 
         return self
 
     def done_game(self):
-        self.output(self.string('game over'))
+        self.emit(Saga.EVENT_GAME_OVER)
         self.exit(0)
 
-    def perform_line(self, action):
-        continuation = 0
+    # The index of the first condition to fail, or -1, and the parameters
+    def check_conditions(self, conditions):
+        if self.spent is not None:
+            self.spend(1)
+
         params = [None] * 5
         param_id = 0
-        for i in action.condition:
+        for (n, i) in enumerate(conditions):
             (dv, cv) = divmod(i, 20)
 
             #if self.options & Saga.FLAG_DEBUGGING:
@@ -784,206 +1523,209 @@ Adventure: {0.adventure}
                 # Only seen in Brian Howarth games so far
                 lambda: self.current_counter != dv
             ][cv - 1]():
-                return 0
+                return (n, params)
+        return (-1, params)
+
+    def perform_line(self, action):
+        (failed, params) = self.check_conditions(action.condition)
+        if failed != -1:
+            return 0
 
         # Actions
-        param_id = 0
-        for action in action.action:
-            for act in divmod(action, 150):
-                #if self.options & Saga.FLAG_DEBUGGING:
-                #   sys.stderr.write('Action - {0}\n'.format(act))
-
-                if act >= 1 and act < 52:
-                    self.output(self.messages[act] + '\n')
-                elif act > 101:
-                    self.output(self.messages[act - 50] + '\n')
-                elif act == 0:  # NOP
-                    pass
-                elif act == 52:
-                    if self.count_carried() == self.max_carry:
-                        self.output(self.string('overloaded', Saga.FLAG_YOUARE))
-                    else:
-                        if self.items[params[param_id]].location == self.player_room:
-                            self.redraw = True
-                        self.items[params[param_id]].location = Saga.LOC_CARRIED
-                        param_id += 1
-                elif act == 53:
-                    self.redraw = True
-                    self.items[params[param_id]].location = self.player_room
-                    param_id += 1
-                elif act == 54:
-                    self.redraw = True
-                    self.player_room = params[param_id]
-                    param_id += 1
-                elif act == 55 or act == 59:
+        opcodes = divmod(action.action[0], 150) + divmod(action.action[1], 150)
+        return 1 + self.perform_opcodes(opcodes, params)[1]
+
+    # Runs opcodes taking their parameters from params[param_id:], returns the
+    # next param_id and 1 when the following lines are to be run (opcode 73)
+    def perform_opcodes(self, opcodes, params, param_id=0):
+        continuation = 0
+        for act in opcodes:
+            #if self.options & Saga.FLAG_DEBUGGING:
+            #   sys.stderr.write('Action - {0}\n'.format(act))
+
+            if act >= 1 and act < 52:
+                self.emit(Saga.EVENT_MESSAGE, act)
+            elif act > 101:
+                self.emit(Saga.EVENT_MESSAGE, act - 50)
+            elif act == 0:  # NOP
+                pass
+            elif act == 52:
+                if self.count_carried() == self.max_carry:
+                    self.emit(Saga.EVENT_STRING, 'overloaded')
+                else:
                     if self.items[params[param_id]].location == self.player_room:
                         self.redraw = True
-                    self.items[params[param_id]].location = 0
-                    param_id += 1
-                elif act == 56:
-                    self.bit_flags |= Saga.FLAG_DARK
-                elif act == 57:
-                    self.bit_flags &= ~Saga.FLAG_DARK
-                elif act == 58:
-                    self.bit_flags |= (1 << params[param_id])
-                    param_id += 1
-                elif act == 60:
-                    self.bit_flags &= ~(1 << params[param_id])
+                    self.move_item(params[param_id], Saga.LOC_CARRIED)
                     param_id += 1
-                elif act == 61:
-                    self.output(self.string('dead', Saga.FLAG_YOUARE))
-                    self.bit_flags &= ~Saga.FLAG_DARK
-                    self.player_room = len(self.rooms) - 1   # It seems to be what the code says!
-                    self.look()
-                elif act == 62:
-                    # Bug fix for some systems - before it could get parameters wrong
-                    self.items[params[param_id]].location = params[param_id + 1]
-                    param_id += 2
+            elif act == 53:
+                self.redraw = True
+                self.move_item(params[param_id], self.player_room)
+                param_id += 1
+            elif act == 54:
+                self.redraw = True
+                self.player_room = params[param_id]
+                param_id += 1
+            elif act == 55 or act == 59:
+                if self.items[params[param_id]].location == self.player_room:
                     self.redraw = True
-                elif act == 63:
+                self.move_item(params[param_id], 0)
+                param_id += 1
+            elif act == 56:
+                self.bit_flags |= Saga.FLAG_DARK
+            elif act == 57:
+                self.bit_flags &= ~Saga.FLAG_DARK
+            elif act == 58:
+                self.bit_flags |= (1 << params[param_id])
+                param_id += 1
+            elif act == 60:
+                self.bit_flags &= ~(1 << params[param_id])
+                param_id += 1
+            elif act == 61:
+                self.emit(Saga.EVENT_STRING, 'dead')
+                self.bit_flags &= ~Saga.FLAG_DARK
+                self.player_room = len(self.rooms) - 1   # It seems to be what the code says!
+                self.look()
+            elif act == 62:
+                # Bug fix for some systems - before it could get parameters wrong
+                self.move_item(params[param_id], params[param_id + 1])
+                param_id += 2
+                self.redraw = True
+            elif act == 63:
+                self.done_game()
+            elif act == 64:
+                self.look()
+            elif act == 65:
+                treasures = reduce(
+                    lambda count, item:
+                        count + (item.location == self.treasure_room and
+                                 item.text.startswith('*') and 1 or 0),
+                    self.items, 0)
+                self.emit(
+                    Saga.EVENT_STRING,
+                    'treasures',
+                    self.strings['have'],
+                    treasures,
+                    treasures * 100 / self.treasures
+                )
+
+                if treasures == self.treasures:
+                    self.emit(Saga.EVENT_STRING, 'well done')
                     self.done_game()
-                elif act == 64:
-                    self.look()
-                elif act == 65:
-                    treasures = reduce(
-                        lambda count, item:
-                            count + (item.location == self.treasure_room and
-                                     item.text.startswith('*') and 1 or 0),
-                        self.items, 0)
-                    self.output(self.string('treasures').format(
-                            self.string('have', Saga.FLAG_YOUARE),
-                            treasures,
-                            treasures * 100 / self.treasures
-                        ))
-
-                    if treasures == self.treasures:
-                        self.output(self.string('well done'))
-                        self.done_game()
-                elif act == 66:
-                    carry = [item.text for item in [item for item in self.items if item.location == Saga.LOC_CARRIED]]
-                    if len(carry):
-                        carry = self.string(
-                            'list separator',
-                            Saga.FLAG_TRS80_STYLE
-                        ).join(carry)
-                    else:
-                        carry = self.string('nothing')
-
-                    self.output(
-                        self.string('carry', Saga.FLAG_YOUARE)
-                        .format(carry)
-                    )
-                elif act == 67:
-                    self.bit_flags |= 1
-                elif act == 68:
-                    self.bit_flags &= ~1
-                elif act == 69:
-                    self.light_time = self.light_refill
-                    if self.test_light(self.player_room):
-                        self.redraw = True
+            elif act == 66:
+                self.emit(Saga.EVENT_INVENTORY, [
+                    i for (i, item) in enumerate(self.items)
+                    if item.location == Saga.LOC_CARRIED
+                ])
+            elif act == 67:
+                self.bit_flags |= 1
+            elif act == 68:
+                self.bit_flags &= ~1
+            elif act == 69:
+                self.light_time = self.light_refill
+                if self.test_light(self.player_room):
+                    self.redraw = True
 
-                    self.items[Saga.ITEM_LIGHT].location = Saga.LOC_CARRIED
-                    self.bit_flags &= ~Saga.FLAG_DARK
-                elif act == 70:
-                    self.clear_screen()  # pdd.
-                    self.output_reset()
-                elif act == 71:
-                    self.save_game()
-                elif act == 72:
-                    i = params[param_id:param_id + 2]
-                    param_id += 2
-                    if self.items[i[0]].location == self.player_room \
-                            or self.items[i[1]].location == self.player_room:
-                        self.redraw = True
+                self.move_item(Saga.ITEM_LIGHT, Saga.LOC_CARRIED)
+                self.bit_flags &= ~Saga.FLAG_DARK
+            elif act == 70:
+                self.clear_screen()  # pdd.
+                self.output_reset()
+            elif act == 71:
+                self.save_game()
+            elif act == 72:
+                i = params[param_id:param_id + 2]
+                param_id += 2
+                if self.items[i[0]].location == self.player_room \
+                        or self.items[i[1]].location == self.player_room:
+                    self.redraw = True
 
-                    (self.items[i[0]].location, self.items[i[1]].location) \
-                        = (self.items[i[1]].location, self.items[i[0]].location)
-                elif act == 73:
-                    continuation = 1
-                elif act == 74:
-                    if self.items[params[param_id]].location == self.player_room:
-                        self.redraw = True
-                    self.items[params[param_id]].location = Saga.LOC_CARRIED
-                    param_id += 1
-                elif act == 75:
-                    i = params[param_id:param_id + 2]
-                    param_id += 2
-                    if self.items[i[0]].location == self.player_room \
-                            or self.items[i[1]].location == self.player_room:
-                        self.redraw = True
-                    self.items[i[0]].location = self.items[i[1]].location
-                elif act == 76:     # Looking at adventure ..
-                    self.look()
-                elif act == 77:
-                    if self.current_counter >= 0:
-                        self.current_counter -= 1
-                elif act == 78:
-                    self.output(self.current_counter)
-                elif act == 79:
-                    self.current_counter = params[param_id]
-                    param_id += 1
-                elif act == 80:
-                    (self.player_room, self.saved_room) \
-                            = (self.saved_room, self.player_room)
+                self.move_item(
+                    i[1],
+                    self.move_item(i[0], self.items[i[1]].location)
+                )
+            elif act == 73:
+                continuation = 1
+            elif act == 74:
+                if self.items[params[param_id]].location == self.player_room:
                     self.redraw = True
-                elif act == 81:
-                    # This is somewhat guessed. Claymorgue always
-                    # seems to do select counter n, thing, select counter n,
-                    # but uses one value that always seems to exist. Trying
-                    # a few options I found this gave sane results on aging
-                    (self.current_counter, self.counters[params[param_id]]) \
-                            = (self.counters[params[param_id]], self.current_counter)
-                    param_id += 1
-                elif act == 82:
-                    self.current_counter += params[param_id]
-                    param_id += 1
-                elif act == 83:
-                    self.current_counter -= params[param_id]
-                    # Note: This seems to be needed. I don't yet
-                    # know if there is a maximum value to limit too
-                    if self.current_counter < -1:
-                        self.current_counter = -1
-                    param_id += 1
-                elif act == 84:
-                    self.output(self.noun_text)
-                elif act == 85:
-                    self.output(self.noun_text)
-                    self.output('\n')
-                elif act == 86:
-                    self.output('\n')
-                elif act == 87:
-                    # Changed this to swap location<->roomflag[x]
-                    # not roomflag 0 and x
-                    (self.player_room, self.room_saved[params[param_id]]) \
-                            = (self.room_saved[params[param_id]], self.player_room)
-                    param_id += 1
+                self.move_item(params[param_id], Saga.LOC_CARRIED)
+                param_id += 1
+            elif act == 75:
+                i = params[param_id:param_id + 2]
+                param_id += 2
+                if self.items[i[0]].location == self.player_room \
+                        or self.items[i[1]].location == self.player_room:
                     self.redraw = True
-                elif act == 88:
-# JR-Not sure if this is necessary
-#                   if self.options & Saga.FLAG_USE_CURSES:
-#                       for win in self.win:
-#                           win.refresh()
-
-                    time.sleep(2)   # DOC's say 2 seconds. Spectrum times at 1.5
-                elif act == 89:
-                    # SAGA draw picture n
-                    # Spectrum Seas of Blood - start combat ?
-                    # Poking this into older spectrum games causes a crash
-                    self.display_image(len(self.rooms) - 1 + params[param_id])
-                    param_id += 1
-                else:
-                    sys.stderr.write(
-                        'Unknown action {0:d} [Param begins {1:d} {2:d}]\n'
-                        .format(act, params[param_id], params[param_id + 1])
-                    )
+                self.move_item(i[0], self.items[i[1]].location)
+            elif act == 76:     # Looking at adventure ..
+                self.look()
+            elif act == 77:
+                if self.current_counter >= 0:
+                    self.current_counter -= 1
+            elif act == 78:
+                self.emit(Saga.EVENT_TEXT, self.current_counter)
+            elif act == 79:
+                self.current_counter = params[param_id]
+                param_id += 1
+            elif act == 80:
+                (self.player_room, self.saved_room) \
+                        = (self.saved_room, self.player_room)
+                self.redraw = True
+            elif act == 81:
+                # This is somewhat guessed. Claymorgue always
+                # seems to do select counter n, thing, select counter n,
+                # but uses one value that always seems to exist. Trying
+                # a few options I found this gave sane results on aging
+                (self.current_counter, self.counters[params[param_id]]) \
+                        = (self.counters[params[param_id]], self.current_counter)
+                param_id += 1
+            elif act == 82:
+                self.current_counter += params[param_id]
+                param_id += 1
+            elif act == 83:
+                self.current_counter -= params[param_id]
+                # Note: This seems to be needed. I don't yet
+                # know if there is a maximum value to limit too
+                if self.current_counter < -1:
+                    self.current_counter = -1
+                param_id += 1
+            elif act == 84:
+                self.emit(Saga.EVENT_TEXT, self.noun_text)
+            elif act == 85:
+                self.emit(Saga.EVENT_TEXT, self.noun_text)
+                self.emit(Saga.EVENT_TEXT, '\n')
+            elif act == 86:
+                self.emit(Saga.EVENT_TEXT, '\n')
+            elif act == 87:
+                # Changed this to swap location<->roomflag[x]
+                # not roomflag 0 and x
+                (self.player_room, self.room_saved[params[param_id]]) \
+                        = (self.room_saved[params[param_id]], self.player_room)
+                param_id += 1
+                self.redraw = True
+            elif act == 88:
+                # Show what has been written before pausing
+                self.output_flush()
+                time.sleep(self.pause)
+            elif act == 89:
+                # SAGA draw picture n
+                # Spectrum Seas of Blood - start combat ?
+                # Poking this into older spectrum games causes a crash
+                self.display_image(len(self.rooms) - 1 + params[param_id])
+                param_id += 1
+            else:
+                sys.stderr.write(
+                    'Unknown action {0:d} [Param begins {1:d} {2:d}]\n'
+                    .format(act, params[param_id], params[param_id + 1])
+                )
 
-        return 1 + continuation
+        return (param_id, continuation)
 
     def perform_actions(self, verb_id, noun_id, enable_sysfunc=True):
         dark = bool(self.bit_flags & Saga.FLAG_DARK)
 
         if verb_id == 1 and noun_id == -1:
-            self.output(self.string('need dir'))
+            self.emit(Saga.EVENT_STRING, 'need dir')
             return 0
 
         if verb_id == 1 and noun_id in range(1, 7):
@@ -991,7 +1733,7 @@ Adventure: {0.adventure}
                 dark = False
 
             if dark:
-                self.output(self.string('dark warning'))
+                self.emit(Saga.EVENT_STRING, 'dark warning')
 
             room = self.rooms[self.player_room].exits[noun_id - 1]
             if room != 0:
@@ -1000,52 +1742,16 @@ Adventure: {0.adventure}
                 return 0
 
             if dark:
-                self.output(self.string('broke neck', Saga.FLAG_YOUARE))
+                self.emit(Saga.EVENT_STRING, 'broke neck')
                 self.exit(0)
 
-            self.output(self.string('blocked', Saga.FLAG_YOUARE))
+            self.emit(Saga.EVENT_STRING, 'blocked')
             return 0
 
-        fl = -1
-        do_again = False
-        for action in self.actions:
-            #if self.options & Saga.FLAG_DEBUGGING:
-            #   sys.stderr.write(action.to_string())
-
-            vv = nv = action.vocab
-
-            if vv != 0:
-                do_again = False
-
-            # Think this is now right. If a line we run has an action73
-            # run all following lines with vocab of 0, 0
-            if verb_id != 0 and do_again and vv != 0:
-                break
-            # Oops.. added this minor cockup fix 1.11
-            if verb_id != 0 and not do_again and fl == 0:
-                break
-
-            nv %= 150
-            vv /= 150
-
-            #if self.options & Saga.FLAG_DEBUGGING:
-            #   sys.stderr.write('Verb: {0}, Noun: {1}, Action(Verb: {2}, Noun: {3})\n'.format(verb_id, noun_id, vv, nv))
-
-            if vv == verb_id or (do_again and action.vocab == 0):
-                if (vv == 0 and random_percent(nv)) \
-                        or do_again \
-                        or (vv != 0 and (nv == noun_id or nv == 0)):
-                    if fl == -1:
-                        fl = -2
-
-                    f2 = self.perform_line(action)
-                    if f2 > 0:
-                        # ahah finally figured it out !
-                        fl = 0
-                        if f2 == 2:
-                            do_again = True
-                        if verb_id != 0 and not do_again:
-                            return 0
+        if verb_id != 0:
+            fl = self.perform_verb(verb_id, noun_id)
+        else:
+            fl = self.perform_occurrences()
 
         if fl != 0 and enable_sysfunc:
             if self.test_light(self.player_room, Saga.LOC_CARRIED):
@@ -1056,83 +1762,279 @@ Adventure: {0.adventure}
                 if verb_id == 10:
                     if self.noun_text is not None and self.noun_text.lower() == 'all':
                         if dark:
-                            self.output(self.string('dark'))
+                            self.emit(Saga.EVENT_STRING, 'dark')
                             return 0
 
-                        f = 0
-                        for item in self.items:
-                            if item.location == self.player_room \
-                                    and len(item.auto_get) \
-                                    and not item.auto_get.startswith('*'):
-                                noun_id = self.which_word(item.auto_get, self.nouns)
-                                # Recursively check each items table code
-                                self.perform_actions(verb_id, noun_id, False)
-                                if self.count_carried() == self.max_carry:
-                                    self.output(self.string('overloaded', Saga.FLAG_YOUARE))
-                                    return 0
-
-                                item.location = Saga.LOC_CARRIED
-                                self.redraw = True
-                                self.output(self.string('take').format(item.text))
-                                f = 1
-
-                        if f == 0:
-                            self.output(self.string('nothing taken'))
-                        return 0
+                        return self.get_all(verb_id)
 
                     if noun_id == -1:
-                        self.output(self.string('what'))
+                        self.emit(Saga.EVENT_STRING, 'what')
                         return 0
 
                     if self.count_carried() == self.max_carry:
-                        self.output(self.string('overloaded', Saga.FLAG_YOUARE))
+                        self.emit(Saga.EVENT_STRING, 'overloaded')
                         return 0
 
                     i = self.match_up_item(self.noun_text, self.player_room)
                     if i == -1:
-                        self.output(self.string('unable', Saga.FLAG_YOUARE))
+                        self.emit(Saga.EVENT_STRING, 'unable')
                         return 0
 
-                    self.items[i].location = Saga.LOC_CARRIED
-                    self.output('O.K. ')
+                    self.move_item(i, Saga.LOC_CARRIED)
+                    self.emit(Saga.EVENT_STRING, 'ok')
                     self.redraw = True
                     return 0
 
                 if verb_id == 18:
                     if self.noun_text is not None and self.noun_text.lower() == 'all':
-                        f = 0
-                        for item in self.items:
-                            if item.location == Saga.LOC_CARRIED \
-                                    and len(item.auto_get) \
-                                    and not item.auto_get.startswith('*'):
-                                noun_id = self.which_word(item.auto_get, self.nouns)
-                                self.perform_actions(verb_id, noun_id, False)
-                                item.location = self.player_room
-                                self.output(self.string('drop').format(item.text))
-                                self.redraw = True
-                                f = 1
-
-                        if f == 0:
-                            self.output(self.string('nothing dropped'))
-                        return 0
+                        return self.drop_all(verb_id)
 
                     if noun_id == -1:
-                        self.output(self.string('what'))
+                        self.emit(Saga.EVENT_STRING, 'what')
                         return 0
 
                     i = self.match_up_item(self.noun_text, Saga.LOC_CARRIED)
                     if i == -1:
-                        self.output(self.string('unable', Saga.FLAG_YOUARE))
+                        self.emit(Saga.EVENT_STRING, 'unable')
                         return 0
 
-                    self.items[i].location = self.player_room
-                    self.output(self.string('ok'))
+                    self.move_item(i, self.player_room)
+                    self.emit(Saga.EVENT_STRING, 'ok')
                     self.redraw = True
                     return 0
 
         return fl
 
+    def perform_verb(self, verb_id, noun_id):
+        fl = -1
+        actions = self.actions
+        for i in self.action_index.get(verb_id, ()):
+            nv = actions[i].vocab % 150
+            if nv != noun_id and nv != 0:
+                continue
+
+            fl = -2
+            f2 = self.perform_line(actions[i])
+            if f2 and self.turn_fired is not None:
+                self.turn_fired.append(i)
+
+            if f2 == 1:
+                return 0
+
+            if f2 == 2:
+                # Run the following lines with vocab of 0, 0
+                i += 1
+                while i < len(actions) and actions[i].vocab == 0:
+                    # Draw as the full table scan did, so seeded games replay
+                    self.random_percent(0)
+                    if self.perform_line(actions[i]) and self.turn_fired is not None:
+                        self.turn_fired.append(i)
+                    i += 1
+                return 0
+
+        return fl
+
+    # Lines without a verb, run by chance every turn
+    def perform_occurrences(self):
+        fl = -1
+        do_again = False
+        for (i, action) in enumerate(self.actions):
+            #if self.options & Saga.FLAG_DEBUGGING:
+            #   sys.stderr.write(action.to_string())
+
+            # Any line but 0, 0 ends a continuation, chance lines included
+            if action.vocab != 0:
+                do_again = False
+
+            (vv, nv) = divmod(action.vocab, 150)
+            if vv != 0:
+                continue
+
+            # If a line we run has an action73 run all following lines with
+            # vocab of 0, 0
+            if self.random_percent(nv) or do_again:
+                if fl == -1:
+                    fl = -2
+
+                f2 = self.perform_line(action)
+                if f2 > 0:
+                    if self.turn_fired is not None:
+                        self.turn_fired.append(i)
+
+                    # ahah finally figured it out !
+                    fl = 0
+                    if f2 == 2:
+                        do_again = True
+
+        return fl
+
+    # Hooks let tools watch the action lines run. While any are registered
+    # the traced_ methods below stand in for the plain ones on the instance,
+    # so games without hooks run exactly the untraced code
+    def add_hook(self, hook, callback):
+        if self.hooks is None:
+            self.hooks = dict((name, []) for name in Saga.HOOKS)
+            self.line_numbers = {}
+            self.traced_room = self.player_room
+            self.perform_actions = self.traced_perform_actions
+            self.perform_line = self.traced_perform_line
+            self.move_item = self.traced_move_item
+        self.hooks[hook].append(callback)
+        return self
+
+    def remove_hook(self, hook, callback):
+        if self.hooks is None:
+            return self
+
+        self.hooks[hook].remove(callback)
+        if not any(self.hooks.values()):
+            self.hooks = None
+            del self.perform_actions
+            del self.perform_line
+            del self.move_item
+        return self
+
+    def call_hooks(self, hook, *args):
+        for callback in self.hooks[hook]:
+            callback(self, *args)
+        return self
+
+    def line_number(self, action):
+        line = self.line_numbers.get(id(action))
+        if line is None:
+            # Built on first use and again after the database changes
+            self.line_numbers = dict(
+                (id(a), i) for (i, a) in enumerate(self.actions)
+            )
+            line = self.line_numbers.get(id(action), -1)
+        return line
+
+    def check_room(self):
+        if self.player_room != self.traced_room:
+            (old, self.traced_room) = (self.traced_room, self.player_room)
+            self.call_hooks(Saga.HOOK_ROOM, old, self.player_room)
+        return self
+
+    def traced_perform_actions(self, verb_id, noun_id, enable_sysfunc=True):
+        ret = self.__class__.perform_actions(self, verb_id, noun_id, enable_sysfunc)
+        self.check_room()
+        return ret
+
+    def traced_perform_line(self, action):
+        line = self.line_number(action)
+        self.call_hooks(Saga.HOOK_LINE, line, action)
+
+        (failed, params) = self.check_conditions(action.condition)
+        if len(self.hooks[Saga.HOOK_CONDITION]):
+            # Conditions after the first to fail are not evaluated
+            for (i, c) in enumerate(action.condition):
+                (dv, cv) = divmod(c, 20)
+                if cv != 0:
+                    self.call_hooks(Saga.HOOK_CONDITION, line, i, cv, dv, i != failed)
+                if i == failed:
+                    break
+        if failed != -1:
+            return 0
+
+        param_id = 0
+        continuation = 0
+        for act in divmod(action.action[0], 150) + divmod(action.action[1], 150):
+            (param_id, more) = self.perform_opcodes((act,), params, param_id)
+            continuation = continuation or more
+            self.call_hooks(Saga.HOOK_OPCODE, line, act)
+            self.check_room()
+        return 1 + continuation
+
+    def traced_move_item(self, item, location):
+        old = self.__class__.move_item(self, item, location)
+        if old != location:
+            self.call_hooks(Saga.HOOK_ITEM, item, old, location)
+        return old
+
+    def get_all(self, verb_id):
+        tidy = self.options & Saga.FLAG_TIDY_ALL
+        taken = False
+        for (i, noun_id) in enumerate(self.auto_get_ids):
+            item = self.items[i]
+            if noun_id is None or item.location != self.player_room:
+                continue
+
+            # Recursively check each items table code
+            handled = self.perform_actions(verb_id, noun_id, False) == 0
+
+            # As on the Spectrum the item is taken even when the table code
+            # handled it, unless tidying up
+            if tidy and (handled or item.location != self.player_room):
+                continue
+
+            if self.count_carried() == self.max_carry:
+                self.emit(Saga.EVENT_STRING, 'overloaded')
+                return 0
+
+            self.move_item(i, Saga.LOC_CARRIED)
+            self.redraw = True
+            self.emit(Saga.EVENT_STRING, 'take', item.text)
+            taken = True
+
+        if not taken:
+            self.emit(Saga.EVENT_STRING, 'nothing taken')
+        return 0
+
+    def drop_all(self, verb_id):
+        tidy = self.options & Saga.FLAG_TIDY_ALL
+        dropped = False
+        for (i, noun_id) in enumerate(self.auto_get_ids):
+            item = self.items[i]
+            if noun_id is None or item.location != Saga.LOC_CARRIED:
+                continue
+
+            handled = self.perform_actions(verb_id, noun_id, False) == 0
+            if tidy and (handled or item.location != Saga.LOC_CARRIED):
+                continue
+
+            self.move_item(i, self.player_room)
+            self.emit(Saga.EVENT_STRING, 'drop', item.text)
+            self.redraw = True
+            dropped = True
+
+        if not dropped:
+            self.emit(Saga.EVENT_STRING, 'nothing dropped')
+        return 0
+
+    def start_budget(self):
+        if self.budget is not None:
+            self.spent = [
+                0,
+                0,
+                self.budget.seconds is not None and time.time() + self.budget.seconds
+            ]
+        return self
+
+    def spend(self, lines=0, output=0):
+        spent = self.spent
+        budget = self.budget
+        spent[0] += lines
+        spent[1] += output
+        if budget.lines is not None and spent[0] > budget.lines:
+            raise BudgetExceeded('lines', budget.lines)
+        if budget.output is not None and spent[1] > budget.output:
+            raise BudgetExceeded('output', budget.output)
+        if spent[2] and time.time() > spent[2]:
+            raise BudgetExceeded('seconds', budget.seconds)
+        return self
+
+    # The rest of the turn is abandoned, leaving the game as it stood
+    def over_budget(self, err):
+        self.spent = None
+        self.count('budget_' + err.name)
+        self.emit(Saga.EVENT_STRING, 'over budget', err.name, err.limit)
+        return self
+
     def game_loop(self, iterations=-1):
+        if self.metrics is not None and self.timer is None:
+            self.timer = self.metrics.timer()
+        timer = self.timer
+
         while iterations:
             if self.state is Saga.STATE_RUN:
                 if iterations != -1:
@@ -1141,15 +2043,32 @@ Adventure: {0.adventure}
                 if self.redraw:
                     self.look()
                     self.redraw = False
+                if timer is not None:
+                    timer.lap('look')
+
+                # The automatic lines and the command each get a budget
+                if self.budget is not None:
+                    self.start_budget()
+                try:
+                    self.perform_actions(0, 0)
+                except BudgetExceeded as err:
+                    self.over_budget(err)
+                self.spent = None
+                if timer is not None:
+                    timer.lap('auto')
 
-                self.perform_actions(0, 0)
                 if self.redraw:
                     self.look()
                     self.redraw = False
+                if timer is not None:
+                    timer.lap('look')
 
                 self.state = Saga.STATE_WAIT
 
             if self.state is Saga.STATE_WAIT:
+                if self.turn_start is not None:
+                    self.end_turn()
+
                 input = self.get_input()
                 if input is None:
                     break
@@ -1158,9 +2077,18 @@ Adventure: {0.adventure}
 
                 self.state = Saga.STATE_RUN
                 (verb, noun) = input
-                ret = self.perform_actions(verb, noun)
+                if self.history is not None:
+                    self.start_turn()
+                if self.budget is not None:
+                    self.start_budget()
+                try:
+                    ret = self.perform_actions(verb, noun)
+                except BudgetExceeded as err:
+                    self.over_budget(err)
+                    ret = 0
+                self.spent = None
                 if ret < 0:
-                    self.output(self.string('perform_actions')[abs(ret) - 1])
+                    self.emit(Saga.EVENT_STRING, 'perform_actions', abs(ret) - 1)
 
                 # Brian Howarth games seem to use -1 for forever
                 if not self.test_light(Saga.LOC_DESTROYED) and self.light_time != - 1:
@@ -1168,24 +2096,76 @@ Adventure: {0.adventure}
                     if self.light_time < 1:
                         self.bit_flags |= Saga.FLAG_LIGHT_OUT
                         if self.test_light(Saga.LOC_CARRIED, self.player_room):
-                            self.output(self.string('light out', Saga.FLAG_SCOTTLIGHT))
+                            self.emit(Saga.EVENT_STRING, 'light out')
 
                         if self.options & Saga.FLAG_PREHISTORIC_LAMP:
-                            self.items[Saga.ITEM_LIGHT].location = Saga.LOC_DESTROYED
+                            self.move_item(Saga.ITEM_LIGHT, Saga.LOC_DESTROYED)
 
                     elif self.light_time < 25:
                         if self.test_light(Saga.LOC_CARRIED, self.player_room):
                             if(self.options & Saga.FLAG_SCOTTLIGHT):
-                                self.output(
-                                    self.string('light out in')
-                                    .format(self.light_time)
+                                self.emit(
+                                    Saga.EVENT_STRING,
+                                    'light out in',
+                                    self.light_time
                                 )
                             elif(self.light_time % 5 == 0):
-                                self.output(self.string('light dim'))
+                                self.emit(Saga.EVENT_STRING, 'light dim')
+
+                if timer is not None:
+                    timer.lap('command')
 
         return self
 
 
+# String packs are JSON objects mapping string names to replacement text, or
+# to a pair of texts for the strings that depend on an option flag
+string_packs = {}
+
+
+def load_string_pack(path):
+    if path not in string_packs:
+        with open(path, 'r') as file:
+            string_packs[path] = json.load(file)
+    return string_packs[path]
+
+
+# Saga.STRINGS with a pack's replacements, option dependent strings still
+# holding both variants
+def pack_strings(pack=None):
+    strings = dict(Saga.STRINGS)
+    if pack is not None:
+        for (name, value) in load_string_pack(pack).items():
+            default = strings.get(name)
+            if isinstance(default, tuple) and isinstance(value, list):
+                value = (default[0],) + tuple(value)
+            strings[name] = value
+    return strings
+
+
+# Tables are resolved once for the same options, width and pack; every Saga
+# gets its own copy, so changing one game's strings leaves the others alone
+string_tables = {}
+
+
+def resolve_strings(options, width, pack=None):
+    options &= Saga.FLAG_YOUARE | Saga.FLAG_SCOTTLIGHT | Saga.FLAG_TRS80_STYLE
+    key = (options, width, pack)
+    strings = string_tables.get(key)
+    if strings is not None:
+        return copy.deepcopy(strings)
+
+    strings = pack_strings(pack)
+    for (name, value) in strings.items():
+        if isinstance(value, tuple):
+            strings[name] = value[options & value[0] and 2 or 1]
+
+    strings['trs80 line'] = strings['trs80 line'].format('-' * (width - 4))
+
+    string_tables[key] = strings
+    return copy.deepcopy(strings)
+
+
 def usage(argv):
         sys.stderr.write('''Usage: {0} [options] <gamename> [savedgame]
 Options:
@@ -1196,6 +2176,10 @@ Options:
   -v  Verbose info on file operations
   -d  Debugging info
   -p  Force lamp destruction when empty
+  -a  TAKE ALL / DROP ALL leave alone the items the game's own actions
+      handled, rather than taking or dropping every item as the Spectrum does
+  -e  Reload the database whenever it is edited, keeping the game state
+  -x  Record turns for the :back, :forward, :history and :why commands
   -s  Generate authentic Scott Adams driver light messages rather than
       other driver style ones (Light goes out in %%d turns..)
   -t  Generate TRS80 style display (terminal width is 64 characters; a
@@ -1211,7 +2195,7 @@ def get_options(argv):
     seed = None
 
     try:
-        opts, args = getopt.getopt(argv[1:], 'hyivdstpwcr:', ['help'])
+        opts, args = getopt.getopt(argv[1:], 'hyivdstpaexwcr:', ['help'])
     except getopt.GetoptError as err:
         # print help information and exit:
         sys.stderr.write(str(err)) # will print something like "option -a not recognized"
@@ -1236,6 +2220,12 @@ def get_options(argv):
             options |= Saga.FLAG_TRS80_STYLE
         elif opt == '-p':
             options |= Saga.FLAG_PREHISTORIC_LAMP
+        elif opt == '-a':
+            options |= Saga.FLAG_TIDY_ALL
+        elif opt == '-e':
+            options |= Saga.FLAG_WATCH
+        elif opt == '-x':
+            options |= Saga.FLAG_HISTORY
         elif opt == '-w':
             options |= Saga.FLAG_WAIT_ON_EXIT
         elif opt == '-r':
@@ -1268,6 +2258,10 @@ def main(argv, obj_type=Saga):
     if not os.path.exists(filename):
         filename = os.path.join(filepath, filename)
 
+    history_size = os.getenv(ENV_HISTORY)
+    if history_size is not None:
+        Saga.history_size = max(int(history_size), 1)
+
     name = os.path.splitext(os.path.basename(filename))[0]
 
     # Try to open the file and initialize the interpreter
@@ -1284,7 +2278,19 @@ def main(argv, obj_type=Saga):
         if saga.input('Found saved game "{0}" Restore [Y/n]? '.format(savename)).lower() != 'n':
             saga.load_game(savename)
 
-    saga.game_loop()
+    # Scripted and batch runs can dump metrics to a JSON file
+    metrics_file = os.getenv(ENV_METRICS)
+    if metrics_file is None:
+        saga.game_loop()
+        return
+
+    from sagametrics import Metrics, JSONExporter
+    saga.metrics = Metrics().count('sessions')
+    exporter = JSONExporter(metrics_file).start(saga.metrics)
+    try:
+        saga.game_loop()
+    finally:
+        exporter.stop(saga.metrics)
 
 if __name__ == '__main__':
     main(sys.argv)
@@ -0,0 +1,526 @@
+#!/usr/bin/env python
+#
+#   PyScottFree
+#
+#   A free Scott Adams style adventure interpreter
+#
+#   Copyright:
+#       This software is placed under the GNU license.
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version
+#   2 of the License, or (at your option) any later version.
+#
+#   Batch simulation: many independent states of one game stepped together
+#   through the same commands, for Monte Carlo analysis.
+#
+#   BatchSaga keeps the state as NumPy arrays with a row per state and runs
+#   each action line for all rows at once: its conditions become masks over
+#   the rows and its opcodes are applied to the rows that pass. Lines it
+#   can't vectorise, and GET ALL / DROP ALL, run on the scalar engine a row
+#   at a time. ScalarBatch steps a Saga per row and is the reference;
+#   batch() picks BatchSaga when NumPy is installed.
+#
+#   No text is produced, only the state changes. The save game opcode does
+#   nothing and meta-commands (:save etc) are ignored.
+#
+
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from collections import namedtuple
+
+from pyscottfree import Saga
+from sagaenv import EnvSaga, SagaEnv, GameEnded
+
+__author__ = 'Jon Ruttan'
+__copyright__ = 'Copyright (C) 2016 Jon Ruttan'
+__license__ = 'Distributed under the GNU software license'
+__version__ = '0.1.0'
+
+# Parameters taken by each opcode
+PARAMS = {
+    52: 1, 53: 1, 54: 1, 55: 1, 58: 1, 59: 1, 60: 1, 62: 2, 72: 2, 74: 1,
+    75: 2, 79: 1, 81: 1, 82: 1, 83: 1, 87: 1, 89: 1
+}
+
+# Opcodes that only produce output, or nothing at all here
+QUIET = set([0, 64, 66, 70, 71, 73, 76, 78, 84, 85, 86, 88, 89])
+
+# An action line compiled for the batch engine; ops are (opcode, params)
+# and vector is False for lines run on the scalar engine
+Line = namedtuple('Line', 'vocab conditions ops continuation vector')
+
+
+def compile_line(action):
+    conditions = []
+    params = []
+    for c in action.condition:
+        (dv, cv) = divmod(c, 20)
+        if cv == 0:
+            params.append(dv)
+        else:
+            conditions.append((cv, dv))
+
+    ops = []
+    vector = True
+    param_id = 0
+    overload = False
+    for act in divmod(action.action[0], 150) + divmod(action.action[1], 150):
+        count = PARAMS.get(act, 0)
+        if count and overload:
+            # An overloaded GET skips its parameter, the rest would shift
+            vector = False
+        if act == 52:
+            overload = True
+        if param_id + count > len(params) or (act > 89 and act < 102):
+            vector = False
+        ops.append((act, tuple(params[param_id:param_id + count])))
+        param_id += count
+
+    return Line(
+        action.vocab,
+        conditions,
+        [op for op in ops if op[0] not in QUIET and not 1 <= op[0] <= 51
+         and op[0] < 102],
+        73 in [op[0] for op in ops],
+        vector
+    )
+
+
+# Splits a command as Saga.get_input() does
+def split_command(command):
+    words = command.split(' ')
+    return (words[0], len(words) > 1 and words[1] or None)
+
+
+# Runs lines for one row at a time, dropping the text
+class RowSaga(EnvSaga):
+    def output_write(self, str, win=1, scroll=True):
+        return self
+
+
+# The reference: a Saga per row
+class ScalarBatch:
+    def __init__(self, template, seeds):
+        self.template = template
+        self.reset(seeds)
+
+    def reset(self, seeds):
+        self.envs = [
+            SagaEnv(None, self.template.options, template=self.template)
+            for seed in seeds
+        ]
+        self.observations = [env.reset(seed) for (env, seed) in zip(self.envs, seeds)]
+        self.turns = 0
+        return self
+
+    def step(self, command):
+        self.observations = [
+            env.saga.ended and observation or env.step(command)[0]
+            for (env, observation) in zip(self.envs, self.observations)
+        ]
+        self.turns += 1
+        return self
+
+    def observe(self):
+        return self.observations
+
+    def outcomes(self):
+        return [
+            (env.saga.ended, env.saga.dead, env.saga.won) for env in self.envs
+        ]
+
+
+class BatchSaga:
+    def __init__(self, template, seeds, exact=False):
+        self.template = template
+        self.exact = exact              # Draw from a Saga's generator per row
+        self.options = template.options
+        self.lines = [compile_line(action) for action in template.actions]
+        self.initial = numpy.array([item.initial_loc for item in template.items])
+        self.treasure = numpy.array([
+            item.text.startswith('*') for item in template.items
+        ])
+        self.exits = numpy.array([room.exits for room in template.rooms])
+        self.light = Saga.ITEM_LIGHT < len(template.items) and Saga.ITEM_LIGHT or None
+
+        # Automatic lines and whether continuation stops before each, as it
+        # does at every line but 0, 0
+        self.occurrences = []
+        reset = True
+        for (i, line) in enumerate(self.lines):
+            if line.vocab != 0:
+                reset = True
+            if line.vocab // 150 != 0:
+                continue
+            self.occurrences.append((i, line.vocab % 150, reset))
+            reset = False
+
+        self.scratch = RowSaga(self.options, None, template.name)
+        self.scratch.share_database(template)
+        self.fallbacks = 0
+        self.reset(seeds)
+
+    def reset(self, seeds):
+        n = self.n = len(seeds)
+        template = self.template
+        self.loc = numpy.tile(self.initial, (n, 1))
+        self.room = numpy.full(n, template.player_room, dtype=numpy.int64)
+        self.flags = numpy.zeros(n, dtype=numpy.int64)
+        self.counters = numpy.zeros((n, 16), dtype=numpy.int64)
+        self.counter = numpy.zeros(n, dtype=numpy.int64)
+        self.saved_room = numpy.zeros(n, dtype=numpy.int64)
+        self.room_saved = numpy.zeros((n, 16), dtype=numpy.int64)
+        self.light_time = numpy.full(n, template.light_refill, dtype=numpy.int64)
+        self.ended = numpy.zeros(n, dtype=bool)
+        self.dead = numpy.zeros(n, dtype=bool)
+        self.won = numpy.zeros(n, dtype=bool)
+        self.turns = 0
+
+        if self.exact:
+            self.randoms = [random.Random(seed) for seed in seeds]
+        else:
+            self.rng = numpy.random.RandomState(seeds[0])
+            self.scratch.random = random.Random(seeds[0])
+
+        self.perform_occurrences()
+        return self
+
+    def carried(self):
+        return (self.loc == Saga.LOC_CARRIED).sum(axis=1)
+
+    def lit(self):
+        if self.light is None:
+            return numpy.zeros(self.n, dtype=bool)
+        loc = self.loc[:, self.light]
+        return (loc == self.room) | (loc == Saga.LOC_CARRIED)
+
+    def observe(self):
+        return numpy.column_stack([
+            self.room,
+            self.carried(),
+            self.light_time,
+            self.counter,
+            self.flags,
+            self.counters,
+            self.loc
+        ])
+
+    def outcomes(self):
+        return list(zip(self.ended, self.dead, self.won))
+
+    # Rolls of random_percent() for the rows, 100 never succeeds
+    def rolls(self, rows):
+        if not self.exact:
+            return self.rng.randint(0, 100, self.n)
+        rolls = numpy.full(self.n, 100)
+        for r in numpy.nonzero(rows)[0]:
+            rolls[r] = self.randoms[r].randint(0, 99)
+        return rolls
+
+    def condition(self, cv, dv):
+        loc = self.loc
+        if cv == 1:
+            return loc[:, dv] == Saga.LOC_CARRIED
+        elif cv == 2:
+            return loc[:, dv] == self.room
+        elif cv == 3:
+            return (loc[:, dv] == Saga.LOC_CARRIED) | (loc[:, dv] == self.room)
+        elif cv == 4:
+            return self.room == dv
+        elif cv == 5:
+            return loc[:, dv] != self.room
+        elif cv == 6:
+            return loc[:, dv] != Saga.LOC_CARRIED
+        elif cv == 7:
+            return self.room != dv
+        elif cv == 8:
+            return self.flags & (1 << dv) != 0
+        elif cv == 9:
+            return self.flags & (1 << dv) == 0
+        elif cv == 10:
+            return self.carried() != 0
+        elif cv == 11:
+            return self.carried() == 0
+        elif cv == 12:
+            return (loc[:, dv] != Saga.LOC_CARRIED) & (loc[:, dv] != self.room)
+        elif cv == 13:
+            return loc[:, dv] != 0
+        elif cv == 14:
+            return loc[:, dv] == 0
+        elif cv == 15:
+            return self.counter <= dv
+        elif cv == 16:
+            return self.counter > dv
+        elif cv == 17:
+            return loc[:, dv] == self.initial[dv]
+        elif cv == 18:
+            return loc[:, dv] != self.initial[dv]
+        return self.counter == dv
+
+    # Runs a line for the rows in mask, returning the rows it fired for
+    def perform_line(self, i, mask):
+        line = self.lines[i]
+        rows = mask & ~self.ended
+        for (cv, dv) in line.conditions:
+            if not rows.any():
+                return rows
+            rows &= self.condition(cv, dv)
+
+        if not rows.any():
+            return rows
+        if line.vector:
+            self.perform_opcodes(line.ops, rows.copy())
+        else:
+            action = self.template.actions[i]
+            self.perform_rows(rows, lambda saga: saga.perform_line(action))
+        return rows
+
+    def perform_opcodes(self, ops, m):
+        loc = self.loc
+        for (act, p) in ops:
+            if act == 52:
+                take = m & (self.carried() != self.template.max_carry)
+                loc[take, p[0]] = Saga.LOC_CARRIED
+            elif act == 53:
+                loc[m, p[0]] = self.room[m]
+            elif act == 54:
+                self.room[m] = p[0]
+            elif act == 55 or act == 59:
+                loc[m, p[0]] = Saga.LOC_DESTROYED
+            elif act == 56:
+                self.flags[m] |= Saga.FLAG_DARK
+            elif act == 57:
+                self.flags[m] &= ~Saga.FLAG_DARK
+            elif act == 58:
+                self.flags[m] |= 1 << p[0]
+            elif act == 60:
+                self.flags[m] &= ~(1 << p[0])
+            elif act == 61:
+                self.dead[m] = True
+                self.flags[m] &= ~Saga.FLAG_DARK
+                self.room[m] = len(self.template.rooms) - 1
+            elif act == 62:
+                loc[m, p[0]] = p[1]
+            elif act == 63:
+                self.ended[m] = True
+                m = m & ~self.ended
+            elif act == 65:
+                stored = ((loc == self.template.treasure_room) & self.treasure).sum(axis=1)
+                won = m & (stored == self.template.treasures)
+                self.won[won] = True
+                self.ended[won] = True
+                m = m & ~self.ended
+            elif act == 67:
+                self.flags[m] |= 1
+            elif act == 68:
+                self.flags[m] &= ~1
+            elif act == 69:
+                self.light_time[m] = self.template.light_refill
+                loc[m, Saga.ITEM_LIGHT] = Saga.LOC_CARRIED
+                self.flags[m] &= ~Saga.FLAG_DARK
+            elif act == 72:
+                (a, b) = (loc[m, p[0]], loc[m, p[1]])
+                (loc[m, p[0]], loc[m, p[1]]) = (b, a)
+            elif act == 74:
+                loc[m, p[0]] = Saga.LOC_CARRIED
+            elif act == 75:
+                loc[m, p[0]] = loc[m, p[1]]
+            elif act == 77:
+                self.counter[m & (self.counter >= 0)] -= 1
+            elif act == 79:
+                self.counter[m] = p[0]
+            elif act == 80:
+                (self.room[m], self.saved_room[m]) = (self.saved_room[m], self.room[m])
+            elif act == 81:
+                (self.counter[m], self.counters[m, p[0]]) \
+                    = (self.counters[m, p[0]], self.counter[m])
+            elif act == 82:
+                self.counter[m] += p[0]
+            elif act == 83:
+                self.counter[m] -= p[0]
+                self.counter[m & (self.counter < -1)] = -1
+            elif act == 87:
+                (self.room[m], self.room_saved[m, p[0]]) \
+                    = (self.room_saved[m, p[0]], self.room[m])
+        return self
+
+    # Runs func on the scalar engine for each row in mask
+    def perform_rows(self, mask, func):
+        saga = self.scratch
+        for r in numpy.nonzero(mask)[0]:
+            self.fallbacks += 1
+            for (i, item) in enumerate(saga.items):
+                item.location = int(self.loc[r, i])
+            saga.carried = saga.count_items(Saga.LOC_CARRIED)
+            saga.player_room = int(self.room[r])
+            saga.bit_flags = int(self.flags[r])
+            saga.counters = [int(n) for n in self.counters[r]]
+            saga.current_counter = int(self.counter[r])
+            saga.saved_room = int(self.saved_room[r])
+            saga.room_saved = [int(n) for n in self.room_saved[r]]
+            saga.light_time = int(self.light_time[r])
+            saga.ended = saga.dead = saga.won = False
+            if self.exact:
+                saga.random = self.randoms[r]
+
+            try:
+                func(saga)
+            except GameEnded:
+                pass
+
+            self.loc[r] = [item.location for item in saga.items]
+            self.room[r] = saga.player_room
+            self.flags[r] = saga.bit_flags
+            self.counters[r] = saga.counters
+            self.counter[r] = saga.current_counter
+            self.saved_room[r] = saga.saved_room
+            self.room_saved[r] = saga.room_saved
+            self.light_time[r] = saga.light_time
+            self.ended[r] |= saga.ended
+            self.dead[r] |= saga.dead
+            self.won[r] |= saga.won
+        return self
+
+    def perform_verb(self, verb_id, noun_id, rows):
+        fl = numpy.full(self.n, -1)
+        lines = [
+            i for i in self.template.action_index.get(verb_id, ())
+            if self.lines[i].vocab % 150 in (noun_id, 0)
+        ]
+        if len(lines):
+            fl[rows] = -2
+
+        pending = rows.copy()
+        for i in lines:
+            fired = self.perform_line(i, pending)
+            pending &= ~fired
+            fl[fired] = 0
+            if self.lines[i].continuation:
+                j = i + 1
+                while j < len(self.lines) and self.lines[j].vocab == 0:
+                    # As Saga.perform_verb() draws
+                    if self.exact:
+                        self.rolls(fired & ~self.ended)
+                    self.perform_line(j, fired)
+                    j += 1
+            if not pending.any():
+                break
+        return fl
+
+    def perform_actions(self, verb_id, noun_id, noun_text):
+        rows = ~self.ended
+        if verb_id == 1 and noun_id == -1:
+            return self
+
+        if verb_id == 1 and noun_id in range(1, 7):
+            dark = (self.flags & Saga.FLAG_DARK != 0) & ~self.lit()
+            to = self.exits[self.room, noun_id - 1]
+            moved = rows & (to != 0)
+            self.room[moved] = to[moved]
+            fell = rows & (to == 0) & dark
+            self.ended[fell] = True
+            self.dead[fell] = True
+            return self
+
+        if verb_id == 0:
+            return self.perform_rows(rows, lambda saga: saga.perform_actions(0, 0))
+
+        if (verb_id == 10 or verb_id == 18) \
+                and noun_text is not None and noun_text.lower() == 'all':
+            def perform(saga):
+                saga.noun_text = noun_text
+                saga.perform_actions(verb_id, noun_id)
+            return self.perform_rows(rows, perform)
+
+        rows &= self.perform_verb(verb_id, noun_id, rows) != 0
+        rows &= ~self.ended
+        if (verb_id != 10 and verb_id != 18) or noun_id == -1 or not rows.any():
+            return self
+
+        # The items match_up_item() could pick, in the order it tries them
+        scratch = self.scratch
+        word = scratch.map_synonym(noun_text) or noun_text
+        size = self.template.word_length
+        items = [
+            i for (i, item) in enumerate(self.template.items)
+            if item.auto_get and item.auto_get[:size].lower() == word[:size].lower()
+        ]
+        if verb_id == 10:
+            rows &= self.carried() != self.template.max_carry
+            for i in items:
+                hit = rows & (self.loc[:, i] == self.room)
+                self.loc[hit, i] = Saga.LOC_CARRIED
+                rows &= ~hit
+        else:
+            for i in items:
+                hit = rows & (self.loc[:, i] == Saga.LOC_CARRIED)
+                self.loc[hit, i] = self.room[hit]
+                rows &= ~hit
+        return self
+
+    def perform_occurrences(self):
+        do_again = numpy.zeros(self.n, dtype=bool)
+        for (i, chance, reset) in self.occurrences:
+            if reset:
+                do_again[:] = False
+            rows = ~self.ended
+            fired = self.perform_line(i, rows & ((self.rolls(rows) < chance) | do_again))
+            if self.lines[i].continuation:
+                do_again |= fired
+        return self
+
+    def burn_light(self):
+        rows = ~self.ended & (self.light_time != -1)
+        if self.light is not None:
+            rows &= self.loc[:, self.light] != Saga.LOC_DESTROYED
+        self.light_time[rows] -= 1
+        out = rows & (self.light_time < 1)
+        self.flags[out] |= Saga.FLAG_LIGHT_OUT
+        if self.options & Saga.FLAG_PREHISTORIC_LAMP and self.light is not None:
+            self.loc[out, self.light] = Saga.LOC_DESTROYED
+        return self
+
+    # One turn of Saga.game_loop() for every row still playing
+    def step(self, command):
+        if not len(command) or command.startswith(':'):
+            return self
+
+        (verb, noun) = split_command(command)
+        parsed = self.scratch.parse_command(verb, noun)
+        if parsed.verb_id == -1:
+            return self
+
+        self.perform_actions(parsed.verb_id, parsed.noun_id, noun)
+        self.burn_light()
+        self.perform_occurrences()
+        self.turns += 1
+        return self
+
+
+def batch(template, seeds, exact=False):
+    if numpy is None:
+        return ScalarBatch(template, seeds)
+    return BatchSaga(template, seeds, exact)
+
+
+# Commands made of the game's own words, for tests and benchmarks
+def random_commands(template, count, seed=0):
+    rng = random.Random(seed)
+    verbs = [w for w in template.verbs if len(w) and not w.startswith('*')]
+    nouns = [w for w in template.nouns if len(w) and not w.startswith('*')]
+    directions = ['n', 's', 'e', 'w', 'u', 'd']
+    commands = []
+    for i in range(0, count):
+        if rng.random() < 0.3:
+            commands.append(rng.choice(directions))
+        else:
+            commands.append('{0} {1}'.format(rng.choice(verbs), rng.choice(nouns)))
+    return commands
+
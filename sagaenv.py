@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+#
+#   PyScottFree
+#
+#   A free Scott Adams style adventure interpreter
+#
+#   Copyright:
+#       This software is placed under the GNU license.
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version
+#   2 of the License, or (at your option) any later version.
+#
+#   Environments for automated players, in the style of OpenAI Gym:
+#
+#   env = SagaEnv('adv01.dat')
+#   observation = env.reset(seed=1)
+#   (observation, reward, done, info) = env.step('get lamp')
+#
+#   The observation is a list of ints, see SagaEnv.observe(). The reward is
+#   the number of treasures newly stored. Episodes end when the game is over,
+#   the player dies or after max_steps steps.
+#
+#   VecSagaEnv steps many environments at once in worker processes, which
+#   write their observations straight into a shared memory buffer.
+#
+
+import os
+import time
+import ctypes
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyscottfree import Saga
+
+__author__ = 'Jon Ruttan'
+__copyright__ = 'Copyright (C) 2016 Jon Ruttan'
+__license__ = 'Distributed under the GNU software license'
+__version__ = '0.1.0'
+
+# Observation fields ahead of the counters and the item locations
+FIELDS = ['room', 'carried', 'light_time', 'counter', 'bit_flags']
+
+
+class AwaitInput(Exception):
+    pass
+
+
+class GameEnded(Exception):
+    pass
+
+
+# A Saga driven by step(), which never touches the terminal, the save files
+# or the process
+class EnvSaga(Saga):
+    pause = 0
+
+    def __init__(self, options=0, seed=None, name=None, file=None, greet=False):
+        self.text = []
+        self.next_command = None
+        self.ended = False
+        self.dead = False
+        self.won = False
+        Saga.__init__(self, options, seed, name, file, greet)
+
+    def emit(self, event, *args):
+        if event == Saga.EVENT_PROMPT:
+            return self
+        if event == Saga.EVENT_STRING:
+            if args[0] in ('dead', 'broke neck'):
+                self.dead = True
+            elif args[0] == 'well done':
+                self.won = True
+        return Saga.emit(self, event, *args)
+
+    def output_write(self, str, win=1, scroll=True):
+        self.text.append(str)
+        return self
+
+    def output_flush(self):
+        return self
+
+    # The turn is timed at the prompt, so resuming with the command skips it
+    def input(self, str='', win=1):
+        if self.next_command is None:
+            return Saga.input(self, str, win)
+        return self.input_read(str, win).strip()
+
+    def input_read(self, str='', win=1):
+        if self.next_command is None:
+            raise AwaitInput()
+        (command, self.next_command) = (self.next_command, None)
+        return command
+
+    def exit(self, errno=0, errstr=None):
+        self.ended = True
+        raise GameEnded(errno)
+
+    def display_image(self, id):
+        return self
+
+    def load_database(self, file=None, name=None):
+        return False
+
+    def save_game(self, filename=None):
+        self.emit(Saga.EVENT_STRING, 'save error')
+        return self
+
+    def load_game(self, filename=None):
+        self.emit(Saga.EVENT_STRING, 'load error')
+        return self
+
+    # Runs the game up to its next prompt, returning the text written
+    def advance(self, command=None):
+        self.text = []
+        self.next_command = command
+        try:
+            self.game_loop()
+        except (AwaitInput, GameEnded):
+            pass
+        return ''.join(self.text)
+
+
+def load_template(filename, options=0):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    template = Saga(options, None, name, None, False)
+    with open(filename, 'r') as file:
+        template.load_database(file, name)
+    template.name = name
+    return template
+
+
+class SagaEnv:
+    def __init__(self, filename=None, options=0, max_steps=1000, template=None):
+        if template is None:
+            template = load_template(filename, options)
+
+        self.template = template
+        self.options = options
+        self.max_steps = max_steps
+        self.saga = None
+        self.steps = 0
+        self.stored = 0
+        self.size = len(FIELDS) + 16 + len(template.items)
+
+    def observe(self):
+        saga = self.saga
+        return [
+            saga.player_room,
+            saga.count_carried(),
+            saga.light_time,
+            saga.current_counter,
+            saga.bit_flags
+        ] + saga.counters + [item.location for item in saga.items]
+
+    def count_stored(self):
+        saga = self.saga
+        return len([
+            item for item in saga.items
+            if item.location == saga.treasure_room and item.text.startswith('*')
+        ])
+
+    def reset(self, seed=None):
+        self.saga = EnvSaga(self.options, seed, self.template.name)
+        self.saga.share_database(self.template)
+        self.steps = 0
+        self.text = self.saga.advance()
+        self.stored = self.count_stored()
+        return self.observe()
+
+    def step(self, command):
+        saga = self.saga
+        text = saga.advance(command)
+        self.steps += 1
+
+        stored = self.count_stored()
+        reward = stored - self.stored
+        self.stored = stored
+
+        done = saga.ended or saga.dead or self.steps >= self.max_steps
+        info = {
+            'text': text,
+            'steps': self.steps,
+            'stored': stored,
+            'won': saga.won,
+            'dead': saga.dead,
+            'light_out': bool(saga.bit_flags & Saga.FLAG_LIGHT_OUT),
+            'truncated': not (saga.ended or saga.dead) and done
+        }
+        return (self.observe(), reward, done, info)
+
+
+def work(conn, filename, options, max_steps, first, count, stride,
+         observations, rewards, dones):
+    template = load_template(filename, options)
+    envs = [
+        SagaEnv(None, options, max_steps, template) for i in range(0, count)
+    ]
+    size = envs[0].size
+    seeds = [None] * count
+    episodes = [0] * count
+
+    def write(i, observation):
+        start = (first + i) * size
+        observations[start:start + size] = observation
+
+    while True:
+        (request, args) = conn.recv()
+        if request == 'reset':
+            for (i, env) in enumerate(envs):
+                seeds[i] = args[i]
+                episodes[i] = 0
+                write(i, env.reset(seeds[i]))
+                rewards[first + i] = 0
+                dones[first + i] = 0
+            conn.send(None)
+        elif request == 'step':
+            infos = []
+            for (i, env) in enumerate(envs):
+                (observation, reward, done, info) = env.step(args[i])
+                if done:
+                    # Start the next episode, seeded games stay reproducible
+                    episodes[i] += 1
+                    info['final_observation'] = observation
+                    observation = env.reset(
+                        seeds[i] is not None and seeds[i] + episodes[i] * stride or None
+                    )
+                write(i, observation)
+                rewards[first + i] = reward
+                dones[first + i] = done and 1 or 0
+                infos.append(info)
+            conn.send(infos)
+        else:
+            break
+    conn.close()
+
+
+# With numpy the observations, rewards and dones returned are views of the
+# shared buffers, overwritten by the next step; without it they are copies
+class VecSagaEnv:
+    def __init__(self, filename, num_envs, options=0, max_steps=1000, workers=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = max(min(workers, num_envs), 1)
+
+        self.num_envs = num_envs
+        self.size = SagaEnv(filename, options, max_steps).size
+        # 64 bit, as the bit flags use all 32 bits
+        self.observations = multiprocessing.RawArray(
+            ctypes.c_int64, num_envs * self.size
+        )
+        self.rewards = multiprocessing.RawArray('d', num_envs)
+        self.dones = multiprocessing.RawArray('b', num_envs)
+        self.steps = 0
+        self.elapsed = 0.0
+
+        self.workers = []
+        for w in range(0, workers):
+            (first, last) = (num_envs * w // workers, num_envs * (w + 1) // workers)
+            (conn, child) = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=work, args=(
+                child, filename, options, max_steps, first, last - first, num_envs,
+                self.observations, self.rewards, self.dones
+            ))
+            process.daemon = True
+            process.start()
+            self.workers.append((conn, process, first, last))
+
+    def views(self):
+        if numpy is None:
+            observations = self.observations[:]
+            return (
+                [observations[i * self.size:(i + 1) * self.size]
+                 for i in range(0, self.num_envs)],
+                self.rewards[:],
+                [bool(done) for done in self.dones]
+            )
+
+        return (
+            numpy.frombuffer(self.observations, dtype=numpy.int64)
+                .reshape(self.num_envs, self.size),
+            numpy.frombuffer(self.rewards, dtype=numpy.float64),
+            numpy.frombuffer(self.dones, dtype=numpy.int8).view(numpy.bool_)
+        )
+
+    def reset(self, seed=None):
+        for (conn, process, first, last) in self.workers:
+            conn.send(('reset', [
+                seed is not None and seed + i or None for i in range(first, last)
+            ]))
+        for (conn, process, first, last) in self.workers:
+            conn.recv()
+        return self.views()[0]
+
+    def step(self, commands):
+        start = time.time()
+        for (conn, process, first, last) in self.workers:
+            conn.send(('step', list(commands[first:last])))
+        infos = []
+        for (conn, process, first, last) in self.workers:
+            infos.extend(conn.recv())
+
+        self.steps += self.num_envs
+        self.elapsed += time.time() - start
+        return self.views() + (infos,)
+
+    def steps_per_second(self):
+        return self.elapsed and self.steps / self.elapsed or 0.0
+
+    def close(self):
+        for (conn, process, first, last) in self.workers:
+            conn.send(('close', None))
+            process.join()
+        self.workers = []
+        return self
@@ -2,15 +2,139 @@
 
 import os
 import sys
+import getopt
 import struct
+import hashlib
+import threading
+import multiprocessing
+
+from collections import OrderedDict
 from PIL import Image, ImageDraw
 
+if sys.version_info[0] > 2:
+    import queue
+else:
+    import Queue as queue
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+ENV_CACHE = 'SCOTTFREE_GFX_CACHE'
+home = os.getenv('HOME', './')
+DIR_CACHE = os.getenv(ENV_CACHE, '%s/.scottfree/gfx/' % home)
+EXT_CACHE = '.png'
+
+BYTE = struct.Struct('>B')
+WORD = struct.Struct('>h')
+RGB = struct.Struct('>BBB')
+OFFSET = struct.Struct('>BH')     # 24 bit big-endian offset
+
+# Runs are at most 127 pixels, so any run is a slice of one of these
+RUNS = [bytes(bytearray((n,))) * 127 for n in range(0, 256)]
+
 
 def error(errno=0, string='Error'):
     sys.stderr.write(string + '\n')
     sys.exit(errno)
 
 
+# Raised for damaged image data, which may be read on the prefetch thread
+class GfxError(Exception):
+    pass
+
+
+# Bitmap pixels are run-length encoded: a byte below 128 is a single pixel,
+# otherwise the next byte is repeated (byte - 128) times. Both decoders return
+# the pixels and the position following the image data; data ending early
+# leaves the rest of the image 0.
+def rle_decode(data, pos, size):
+    bitmap = bytearray(size)
+    end = len(data)
+    i = 0
+    while i < size and pos < end:
+        n = data[pos]
+        pos += 1
+        if n < 128:
+            bitmap[i] = n
+            i += 1
+        elif pos == end:
+            # A run header cut off by the end of the data
+            break
+        else:
+            j = n - 128
+            bitmap[i:i+j] = RUNS[data[pos]][:j]
+            pos += 1
+            i += j
+
+    # A run overflowing the image grows the buffer; drop the excess
+    del bitmap[size:]
+    return bitmap, pos
+
+
+def rle_decode_numpy(data, pos, size):
+    # Images are mostly under two bytes per pixel; those that aren't, having
+    # empty runs, are decoded by rle_decode()
+    window = numpy.frombuffer(data, numpy.uint8, min(len(data) - pos, 2 * size), pos)
+    length = len(window)
+    if not length:
+        return bytearray(size), pos
+    index = numpy.arange(length)
+
+    # After a byte below 128 the next byte is always a control byte, so
+    # within a stretch of high bytes the run headers are every other byte
+    high = window >= 128
+    last_low = numpy.maximum.accumulate(numpy.where(high, -1, index))
+    header = high & ((index - last_low) % 2 == 1)
+    value = numpy.zeros(length, bool)
+    value[1:] = header[:-1]
+
+    control = numpy.flatnonzero(header | ~(high | value))
+    is_run = header[control]
+    counts = numpy.where(is_run, window[control].astype(numpy.intp) - 128, 1)
+    values = numpy.where(
+        is_run,
+        window[numpy.minimum(control + 1, length - 1)],
+        window[control]
+    )
+    if len(control) and is_run[-1] and control[-1] == length - 1:
+        # A run header at the end of the window has no value in it
+        counts[-1] = 0
+
+    # Only decode the tokens needed to fill the image
+    filled = numpy.cumsum(counts)
+    tokens = min(int(numpy.searchsorted(filled, size)) + 1, len(control))
+    consumed = int(control[tokens - 1]) + (is_run[tokens - 1] and 2 or 1)
+    if length < len(data) - pos and (filled[tokens - 1] < size or consumed > length):
+        return rle_decode(data, pos, size)
+    bitmap = numpy.zeros(size, numpy.uint8)
+    pixels = numpy.repeat(values[:tokens], counts[:tokens])[:size]
+    bitmap[:len(pixels)] = pixels
+
+    return bitmap, min(pos + consumed, len(data))
+
+
+def condition_count(what):
+    count = what - 80
+    if count < 0:
+        count %= 10
+    return count
+
+
+# A condition is compiled to (item, in room, carried, negated)
+def compile_condition(loc, obj):
+    negate = loc > 80
+    loc %= 80
+    return (
+        obj,
+        loc in (SagaGfx.LOC_ROOM, SagaGfx.LOC_ROOM_OR_INVENTORY),
+        loc in (SagaGfx.LOC_INVENTORY, SagaGfx.LOC_ROOM_OR_INVENTORY),
+        negate
+    )
+
+
 class SagaGfx:
     STATE_ERR = -1
     STATE_NONE = 0
@@ -26,7 +150,7 @@ class SagaGfx:
     LOC_ROOM_OR_INVENTORY = 3
     LOC_NOT_ROOM = 81
     LOC_NOT_INVENTORY = 82
-    LOC_NOT_ROOM_OR_INVENTORY = 3
+    LOC_NOT_ROOM_OR_INVENTORY = 83
 
 
     PIC = 8
@@ -38,16 +162,28 @@ class SagaGfx:
     FILL = 0xc1
     NEWPIC = 0xff
 
-    def __init__(self, path=None):
+    def __init__(self, path=None, verbose=False, cache_size=32, cache_dir=DIR_CACHE):
         self.state = SagaGfx.STATE_NONE
-        self.file = None
+        self.verbose = verbose
+        self.cache_dir = cache_dir      # Exported rasters, see export()
+        self.cache_path = None
+        self.digest = None
+        self.data = None
+        self.pos = 0
+        self.data_start = None
+        self.palette_end = None
+        self.cache_size = cache_size    # Decoded images kept in memory
+        self.lock = threading.RLock()
+        self.prefetch_queue = None
         self.size = None
         self.num_rooms = None
         self.num_action89 = None
         self.num_room_exts = None
         self.offsets = None
         self.logic = None
+        self.selections = None
         self.images = None
+        self.composites = None
         self.palette = None
         self.state = SagaGfx.STATE_INIT
 
@@ -55,194 +191,281 @@ class SagaGfx:
             self.open(path)
 
     def open(self, path):
-        if self.state > SagaGfx.STATE_INIT:
-            self.file.close()
-
-        self.file = open(path, 'rb')
+        # The whole file is read once and parsed from memory
+        with open(path, 'rb') as file:
+            self.data = bytearray(file.read())
+        self.pos = 0
         self.state = SagaGfx.STATE_INFO
 
+        # Exported rasters are stored under the hash of the source file, so
+        # they are only used while the file is unchanged
+        self.digest = hashlib.sha1(self.data).hexdigest()
+        self.cache_path = None
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, self.digest)
+            if os.path.isdir(path):
+                self.cache_path = path
+
+    def log(self, string):
+        if self.verbose:
+            print(string)
+
+    def read_byte(self):
+        byte = self.data[self.pos]
+        self.pos += 1
+        return byte
+
+    def read_word(self):
+        word = WORD.unpack_from(self.data, self.pos)[0]
+        self.pos += WORD.size
+        return word
+
+    def read_rgb(self):
+        rgb = RGB.unpack_from(self.data, self.pos)
+        self.pos += RGB.size
+        return rgb
+
     def is_line_drawings(self):
         # Use darkness pic offset as LDP Flag
         return self.offsets[0] == 0
 
     # Info Hunk
     def read_info(self):
-        if self.state is not SagaGfx.STATE_INFO:
+        if self.state != SagaGfx.STATE_INFO:
             return False
 
         # Width and Height in pixels
-        self.size = (
-            struct.unpack('>h', self.file.read(2))[0],
-            struct.unpack('>h', self.file.read(2))[0]
-        )
+        self.size = (self.read_word(), self.read_word())
 
         # Number of rooms (+1 if showPIC starts with 0)
-        self.num_rooms = struct.unpack('>B', self.file.read(1))[0]
+        self.num_rooms = self.read_byte()
 
         # Number of Action89 images
-        self.num_action89 = struct.unpack('>B', self.file.read(1))[0]
+        self.num_action89 = self.read_byte()
 
         # Number of extended (conditional) room images
-        self.num_extended = struct.unpack('>B', self.file.read(1))[0]
+        self.num_extended = self.read_byte()
 
         self.state += 1
 
-        print("Size: %s" % str(self.size))
-        print("Rooms: %d" % self.num_rooms)
-        print("Action89 Rooms: %d" % self.num_action89)
-        print("Extended Rooms: %d" % self.num_extended)
+        self.log("Size: %s" % str(self.size))
+        self.log("Rooms: %d" % self.num_rooms)
+        self.log("Action89 Rooms: %d" % self.num_action89)
+        self.log("Extended Rooms: %d" % self.num_extended)
 
         return self
 
     # Offset Hunk
     def read_offset(self):
-        if self.state is not SagaGfx.STATE_OFFSET:
+        if self.state != SagaGfx.STATE_OFFSET:
             return self
 
-        count = struct.unpack('>B', self.file.read(1))[0]
+        count = self.read_byte()
         self.offsets = []
         for _ in range(0, count):
-            self.offsets.append(struct.unpack('>i', b'\0' + self.file.read(3))[0])
+            (high, low) = OFFSET.unpack_from(self.data, self.pos)
+            self.pos += OFFSET.size
+            self.offsets.append(high << 16 | low)
 
         self.state += 1
 
-        print("Offsets: %d (%s)" % (len(self.offsets), str(self.offsets)))
-        print("Line Drawing: %s" % (self.is_line_drawings() and 'Yes' or 'No'))
+        self.log("Offsets: %d (%s)" % (len(self.offsets), str(self.offsets)))
+        self.log("Line Drawing: %s" % (self.is_line_drawings() and 'Yes' or 'No'))
 
         return self
 
     # Logic Hunk
     def read_logic(self):
-        if self.state is not SagaGfx.STATE_LOGIC:
+        if self.state != SagaGfx.STATE_LOGIC:
             return self
 
-        print("Tell %d" % self.file.tell())
-        count = struct.unpack('>h', self.file.read(2))[0]
+        self.log("Tell %d" % self.pos)
+        count = self.read_word()
         self.logic = {}
         while count:
-            room = struct.unpack('>B', self.file.read(1))[0]
-            ppr = struct.unpack('>B', self.file.read(1))[0]
+            room = self.read_byte()
+            ppr = self.read_byte()
             count -= 2
-            logic = dict(ppr=ppr, what=[], loc=[], obj=[], pnr=[])
+            rules = []
             for i in range(0, ppr):
-                w = struct.unpack('>B', self.file.read(1))[0]
+                what = self.read_byte()
                 count -= 1
-                logic['what'].append(w)
-
-                kk = w - 80
-                while kk < 0:
-                    kk += 10
-                loc = []
-                obj = []
-                for k in range(0, kk):
-                    loc.append(struct.unpack('>B', self.file.read(1))[0])
-                    obj.append(struct.unpack('>B', self.file.read(1))[0])
-                    count -= 2
 
-                logic['loc'].append(loc)
-                logic['obj'].append(obj)
+                conditions = []
+                for k in range(0, condition_count(what)):
+                    loc = self.read_byte()
+                    obj = self.read_byte()
+                    count -= 2
+                    conditions.append(compile_condition(loc, obj))
 
-                logic['pnr'].append(struct.unpack('>B', self.file.read(1))[0])
+                pnr = self.read_byte()
                 count -= 1
 
-            self.logic[room] = logic
+                rules.append((what // 10, pnr, tuple(conditions)))
 
+            # Only the locations of these items can change the selection
+            items = tuple(sorted(set(
+                condition[0] for rule in rules for condition in rule[2]
+            )))
+            self.logic[room] = (items, rules)
+
+        self.selections = {}
         self.state += 1
 
-        print("Logic: %s" % self.logic)
+        self.log("Logic: %s" % self.logic)
 
         return self
 
-    def get_image_id(self, saga, id):
-        if self.state <= SagaGfx.STATE_LOGIC or id not in self.logic:
-            return id
-
-        for i in range(0, self.logic[id]['ppr']):
-            ii = self.logic[id]['what'][i] - 80
-            while ii < 0:
-                ii += 10
-            yes = 0
-            for j in range(0, ii):
-                loc = self.logic[id]['loc'][i][j]
-                obj = self.logic[id]['obj'][i][j]
-
-                if loc == SagaGfx.LOC_ROOM:
-                    if saga.items[obj].location is saga.player_room:
-                        yes += 1
-                elif loc == SagaGfx.LOC_INVENTORY:
-                    if saga.items[obj].location is 255:
-                        yes += 1
-                elif loc == SagaGfx.LOC_INVENTORY:
-                    if saga.items[obj].location in (saga.player_room, 255):
-                        yes += 1
-                elif loc == SagaGfx.LOC_NOT_ROOM:
-                    if saga.items[obj].location is not saga.player_room:
-                        yes += 1
-                elif loc == SagaGfx.LOC_NOT_INVENTORY:
-                    if saga.items[obj].location is not 255:
-                        yes += 1
-                elif loc == SagaGfx.LOC_NOT_INVENTORY:
-                    if saga.items[obj].location not in (saga.player_room, 255):
-                        yes += 1
-
-            if yes >= ii:
-                pnr = self.logic[id]['pnr'][i]
-                if pnr is 0:  # No picture
-                    id = None
+    # A scene is (image id, overlay ids, animation frame ids, colours cycled)
+    def select_image(self, id, rules, room):
+        overlays = ()
+        frames = ()
+        cycle = 0
+        for (action, pnr, conditions) in rules:
+            for (obj, location, in_room, carried, negate) in conditions:
+                found = (in_room and location == room) \
+                        or (carried and location == 255)
+                if found == negate:
                     break
-                elif pnr is 255:  # Do nothing
+            else:
+                if pnr == 0:    # No picture
+                    return None
+                elif pnr == 255:    # Do nothing
                     break
 
                 # Last pic
-
-                action = int(self.logic[id]['what'][i] / 10)
-                if action is SagaGfx.PIC:
+                if action == SagaGfx.PIC:
                     id = pnr
-                elif action is SagaGfx.COC:
-                    print('colour cycling, not implemented yet')
-                elif action is SagaGfx.OVL:
-                    print('overlay image, not implemented yet')
-                elif action is SagaGfx.ANI:
-                    print('animation, not implemented yet')
-                elif action is SagaGfx.GOT:
-                    print('GO_TREE for "Robin of Sherwood", not implemented yet')
+                elif action == SagaGfx.COC:
+                    cycle = pnr
+                elif action == SagaGfx.OVL:
+                    overlays += (pnr,)
+                elif action == SagaGfx.ANI:
+                    frames += (pnr,)
+                elif action == SagaGfx.GOT:
+                    self.log('GO_TREE for "Robin of Sherwood", not implemented yet')
 
-        return id
+        return (id, overlays, frames, cycle)
+
+    def get_scene(self, saga, id):
+        if id is None:
+            return None
+
+        if self.state <= SagaGfx.STATE_LOGIC or id not in self.logic:
+            return (id, (), (), 0)
+
+        (items, rules) = self.logic[id]
+        locations = tuple(saga.items[obj].location for obj in items)
+        key = (id, saga.player_room, locations)
+        if key in self.selections:
+            return self.selections[key]
+
+        # Substitute the item locations into the compiled conditions
+        where = dict(zip(items, locations))
+        rules = [
+            (action, pnr, [
+                (obj, where[obj], in_room, carried, negate)
+                for (obj, in_room, carried, negate) in conditions
+            ])
+            for (action, pnr, conditions) in rules
+        ]
+
+        if len(self.selections) > 4096:
+            self.selections.clear()
+        scene = self.selections[key] = \
+            self.select_image(id, rules, saga.player_room)
+        return scene
+
+    def get_image_id(self, saga, id):
+        scene = self.get_scene(saga, id)
+        return scene and scene[0]
+
+    def is_animated(self, scene):
+        return scene is not None and (len(scene[2]) > 0 or scene[3] > 1)
+
+    # The picture for one frame of a scene, with its overlays composited
+    def get_frame(self, scene, frame=0):
+        (id, overlays, frames, cycle) = scene
+        layers = overlays
+        if len(frames):
+            layers += (frames[frame % len(frames)],)
+        if not len(layers):
+            return self.get_image(id)
+
+        key = (id, layers)
+        with self.lock:
+            image = self.composites.pop(key, None)
+
+        if image is None:
+            image = self.get_image(id)
+            if image is None:
+                return None
+
+            image = image.copy()
+            for layer in layers:
+                overlay = self.get_image(layer)
+                if overlay is None:
+                    continue
+
+                # Palette entry 0 is transparent in an overlay
+                mask = Image.frombytes('L', overlay.size, overlay.tobytes()) \
+                    .point([0] + [255] * 255)
+                image.paste(overlay, (0, 0), mask)
+
+        with self.lock:
+            self.composites[key] = image
+            while len(self.composites) > self.cache_size:
+                self.composites.popitem(last=False)
+
+        return image
+
+    # Colour cycling rotates palette entries 1 to n, the pixels are untouched
+    def get_palette(self, scene, tick):
+        cycle = scene[3]
+        image = self.get_frame(scene)
+        if cycle < 2 or image is None:
+            return None
+
+        palette = image.getpalette()
+        cycle = min(cycle, len(palette) // 3 - 1)
+        shift = tick % cycle * 3
+        colours = palette[3:3 + cycle * 3]
+        return palette[:3] + colours[shift:] + colours[:shift] \
+            + palette[3 + cycle * 3:]
 
     # Line Drawing
-    def read_next_line_drawing(self, index):
-        if self.palette is None:
-            self.palette = []
-            colours = struct.unpack('>B', self.file.read(1))[0]
-            # print('Palette Size %d' % colours)
-            for i in range(0, colours):
-                r, g, b = (
-                    struct.unpack('>B', self.file.read(1))[0],
-                    struct.unpack('>B', self.file.read(1))[0],
-                    struct.unpack('>B', self.file.read(1))[0]
-                )
-                # print('Palette %d: (%x %x %x)' % (i, r, g, b))
-                self.palette.extend((r, g, b))
-            # pprint(palette)
-
-            # Image 0 is darkness (black)
-            # NOTE: Palette entry 0 is assumed to be black
-            image = Image.new('P', self.size, 0)
-            image.putpalette(self.palette)
-            self.images.append(image)
-
-        magic = struct.unpack('>B', self.file.read(1))[0]
-        if magic is not SagaGfx.NEWPIC:
-            print('Wanted NEWPIC (0x%x), got 0x%x' % (SagaGfx.NEWPIC, magic))
+    def read_palette(self):
+        self.palette = []
+        colours = self.read_byte()
+        # print('Palette Size %d' % colours)
+        for i in range(0, colours):
+            r, g, b = self.read_rgb()
+            # print('Palette %d: (%x %x %x)' % (i, r, g, b))
+            self.palette.extend((r, g, b))
+        # pprint(palette)
+
+    def read_line_drawing(self, index, pos):
+        # The palette sits in front of the first picture
+        if pos == self.data_start:
+            pos = self.palette_end
+
+        data = self.data
+        end = len(data)
+        if pos + 3 > end:
+            return None
+
+        magic = data[pos]
+        if magic != SagaGfx.NEWPIC:
+            self.log('Wanted NEWPIC (0x%x), got 0x%x' % (SagaGfx.NEWPIC, magic))
             # error(1, 'Wanted NEWPIC (0x%x), got 0x%x' % (SagaGfx.NEWPIC, magic))
-            return
+            return None
 
-        i = struct.unpack('>B', self.file.read(1))[0]
-        if i is not index:
-            error(1, 'Wanted image %d, got %d' % (index, i))
-            return
+        i = data[pos + 1]
+        if i != index:
+            raise GfxError('Wanted image %d, got %d' % (index, i))
 
-        colour = struct.unpack('>B', self.file.read(1))[0]
+        colour = data[pos + 2]
+        pos += 3
         # print('Background colour: %d (0x%x)' % (colour, COLOURS[colour]))
 
         image = Image.new('P', self.size, colour)
@@ -252,24 +475,23 @@ class SagaGfx:
         colour = colour == 0 and 7 or 0
 
         x1, y1 = 0, 0
-        while True:
-            command = struct.unpack('>B', self.file.read(1))[0]
-            if command is SagaGfx.NEWPIC:
-                self.file.seek(self.file.tell() - 1)
+        while pos < end:
+            command = data[pos]
+            if command == SagaGfx.NEWPIC:
                 break
 
-            if command is SagaGfx.MOVE:
-                y1 = struct.unpack('>B', self.file.read(1))[0]
-                x1 = struct.unpack('>B', self.file.read(1))[0]
+            if command == SagaGfx.MOVE:
+                y1, x1 = data[pos + 1], data[pos + 2]
+                pos += 3
                 # print('Move: (%d, %d)' % (x1, y1))
-            elif command is SagaGfx.FILL:
-                colour = struct.unpack('>B', self.file.read(1))[0]
-                y2 = struct.unpack('>B', self.file.read(1))[0]
-                x2 = struct.unpack('>B', self.file.read(1))[0]
+            elif command == SagaGfx.FILL:
+                colour, y2, x2 = data[pos + 1], data[pos + 2], data[pos + 3]
+                pos += 4
                 # print('Fill: %d @ (%d, %d)' % (colour, x2, y2))
                 ImageDraw.floodfill(image, (x2, y2), colour)
             else:
-                x2 = struct.unpack('>B', self.file.read(1))[0]
+                x2 = data[pos + 1]
+                pos += 2
                 y2 = command
                 # print('Draw: %d @ %s %s' % (colour, (x1, y1), (x2, y2)))
                 draw.line((x1, y1, x2, y2), fill=colour)
@@ -278,69 +500,122 @@ class SagaGfx:
         # image.show()
 
         # pprint(list(image.getdata()))
-        self.images.append(image)
+        return image
 
-    def read_next_bitmap(self):
+    def read_bitmap(self, pos):
+        data = self.data
         palette = []
-        ncol = struct.unpack('>B', self.file.read(1))[0]
+        ncol = data[pos]
+        pos += 1
         for _ in range(0, ncol):
-            palette.extend((
-                    struct.unpack('>B', self.file.read(1))[0],
-                    struct.unpack('>B', self.file.read(1))[0],
-                    struct.unpack('>B', self.file.read(1))[0],
-                ))
+            palette.extend(RGB.unpack_from(data, pos))
+            pos += RGB.size
         # pprint(palette)
 
-        data_size = struct.unpack('>h', self.file.read(2))[0]
+        data_size = WORD.unpack_from(data, pos)[0]
+        pos += WORD.size
         size = self.size[0] * self.size[1]
-        bitmap = [0] * size
-        i = 0
-        while i < size:
-            byte = self.file.read(1)
-            if len(byte) != 1:
-                break
-            n = struct.unpack('>B', byte)[0]
-            if n < 128:
-                j = 1
-                bitmap[i] = n
-            else:
-                j = n - 128
-                n = struct.unpack('>B', self.file.read(1))[0]
-                bitmap[i:i+j] = [n] * j
-            i += j
+        decode = numpy is not None and rle_decode_numpy or rle_decode
+        bitmap, pos = decode(data, pos, size)
 
         # pprint(bitmap)
-        bytes = ''.join(chr(x) for x in bitmap).encode()
-        image = Image.frombytes('P', self.size, bytes)
+        image = Image.frombuffer('P', self.size, bitmap, 'raw', 'P', 0, 1)
         image.putpalette(palette)
 
         # pprint(list(image.getdata()))
-        self.images.append(image)
+        return image
+
+    def read_image(self, index):
+        if index is None or index < 0 or index >= len(self.offsets):
+            return None
+
+        # If a room has no picture, offset is set to zero.
+        if self.offsets[index] == 0:
+            if index == 0 and self.is_line_drawings():
+                # Image 0 is darkness (black)
+                # NOTE: Palette entry 0 is assumed to be black
+                image = Image.new('P', self.size, 0)
+                image.putpalette(self.palette)
+                return image
+            return None
+
+        if self.cache_path is not None:
+            path = os.path.join(self.cache_path, '%d%s' % (index, EXT_CACHE))
+            if os.path.exists(path):
+                image = Image.open(path)
+                image.load()
+                return image
+
+        self.log("Reading item %d" % index)
+
+        try:
+            if self.is_line_drawings():
+                return self.read_line_drawing(index, self.offsets[index])
 
-    # Data Hunk
-    def read_data(self):
-        if self.state is not SagaGfx.STATE_DATA:
+            return self.read_bitmap(self.offsets[index])
+        except (IndexError, struct.error) as err:
+            raise GfxError('Image %d is damaged: %s' % (index, err))
+
+    # Images are decoded on first use and kept in a least recently used cache
+    def get_image(self, index):
+        with self.lock:
+            image = self.images.pop(index, None)
+
+        if image is None:
+            image = self.read_image(index)
+            if image is None:
+                return None
+
+        with self.lock:
+            self.images[index] = image
+            while len(self.images) > self.cache_size:
+                self.images.popitem(last=False)
+
+        return image
+
+    def prefetch(self, indexes):
+        if self.state != SagaGfx.STATE_OK:
             return self
 
-        self.images = []
-        for offset in range(0, len(self.offsets)):
-            # If a room has no picture, offset is set to zero.
-            if self.offsets[offset] is 0:
-                continue
+        if self.prefetch_queue is None:
+            self.prefetch_queue = queue.Queue()
+            thread = threading.Thread(target=self.prefetch_worker)
+            thread.daemon = True
+            thread.start()
 
-            print("Reading item %d" % offset)
+        with self.lock:
+            indexes = [index for index in indexes if index not in self.images]
+        for index in indexes:
+            self.prefetch_queue.put(index)
 
-            if self.file.tell() != self.offsets[offset]:
-                print("tell %d should be %d adjusting..." %
-                      (self.file.tell(), self.offsets[offset]))
-                self.file.seek(self.offsets[offset])
+        return self
 
-            if self.is_line_drawings():
-                self.read_next_line_drawing(offset)
+    def prefetch_worker(self):
+        while True:
+            index = self.prefetch_queue.get()
+            with self.lock:
+                if index in self.images:
+                    continue
 
-            else:
-                self.read_next_bitmap()
+            try:
+                self.get_image(index)
+            except (GfxError, IOError, OSError) as err:
+                # Showing the picture raises it again, on the frontend's thread
+                self.log('Prefetch of image %d failed: %s' % (index, err))
 
+    # Data Hunk
+    def read_data(self):
+        if self.state != SagaGfx.STATE_DATA:
+            return self
+
+        # The offsets index the data hunk, images are read from it on demand
+        self.data_start = self.palette_end = self.pos
+        if self.is_line_drawings():
+            self.read_palette()
+            self.palette_end = self.pos
+
+        self.images = OrderedDict()
+        self.composites = OrderedDict()
         self.state += 1
 
         return self
@@ -350,3 +625,98 @@ class SagaGfx:
                 .read_offset() \
                 .read_logic() \
                 .read_data()
+
+    def export(self, cache_dir=DIR_CACHE, jobs=None):
+        # Rasterise every image into the cache across a process pool
+        path = os.path.join(cache_dir, self.digest)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        indexes = range(0, len(self.offsets))
+        if jobs is None:
+            jobs = multiprocessing.cpu_count()
+        chunks = [(self.data, indexes[i::jobs], path) for i in range(0, jobs)]
+
+        pool = multiprocessing.Pool(jobs)
+        try:
+            count = sum(pool.map(export_images, chunks))
+        finally:
+            pool.close()
+            pool.join()
+
+        self.log("Exported %d images to %s" % (count, path))
+        self.cache_path = path
+        return count
+
+
+def export_images(args):
+    (data, indexes, path) = args
+
+    gfx = SagaGfx(cache_dir=None)
+    gfx.data = data
+    gfx.state = SagaGfx.STATE_INFO
+    gfx.read()
+
+    count = 0
+    for index in indexes:
+        image = gfx.read_image(index)
+        if image is None:
+            continue
+
+        # Write then rename so readers never see a partial file
+        filename = os.path.join(path, '%d%s' % (index, EXT_CACHE))
+        temp = '%s.%d' % (filename, os.getpid())
+        # Keep 8 bit pixels, small palettes would otherwise truncate them
+        image.save(temp, 'PNG', bits=8)
+        os.rename(temp, filename)
+        count += 1
+
+    return count
+
+
+def usage(argv):
+    sys.stderr.write('''Usage: {0} [options] <file.gfx>...
+Rasterise every image of each file into the image cache.
+Options:
+  -h  Print this message and exit
+  -v  Verbose info on file operations
+  -j  Number of processes (default: one per CPU)
+  -c  Cache directory (default: {1})
+'''.format(argv[0], DIR_CACHE))
+
+
+def main(argv):
+    verbose = False
+    jobs = None
+    cache_dir = DIR_CACHE
+
+    try:
+        opts, args = getopt.getopt(argv[1:], 'hvj:c:', ['help'])
+    except getopt.GetoptError as err:
+        sys.stderr.write(str(err) + '\n')
+        usage(argv)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            usage(argv)
+            sys.exit(0)
+        elif opt == '-v':
+            verbose = True
+        elif opt == '-j':
+            jobs = int(arg)
+        elif opt == '-c':
+            cache_dir = arg
+
+    if not len(args):
+        usage(argv)
+        sys.exit(2)
+
+    for path in args:
+        gfx = SagaGfx(path, verbose, cache_dir=None).read()
+        count = gfx.export(cache_dir, jobs)
+        print('%s: %d images -> %s' % (path, count, gfx.cache_path))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+#
+#   PyScottFree
+#
+#   A free Scott Adams style adventure interpreter
+#
+#   Copyright:
+#       This software is placed under the GNU license.
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version
+#   2 of the License, or (at your option) any later version.
+#
+
+import os
+import sys
+import time
+import threading
+
+from collections import OrderedDict
+
+from pyscottfree import Saga, DIR_APP, ENV_FILE
+
+__author__ = 'Jon Ruttan'
+__copyright__ = 'Copyright (C) 2016 Jon Ruttan'
+__license__ = 'Distributed under the GNU software license'
+__version__ = '0.1.0'
+
+EXT_DATABASE = '.dat'
+
+
+def estimate_size(obj, seen=None):
+    # Rough deep size of a loaded database, good enough for budgeting
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for (key, value) in obj.items():
+            size += estimate_size(key, seen) + estimate_size(value, seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for value in obj:
+            size += estimate_size(value, seen)
+    elif hasattr(obj, '__dict__'):
+        size += estimate_size(obj.__dict__, seen)
+
+    return size
+
+
+# A plain database name, which can only be found in the library's directories
+def is_game_name(name):
+    return hasattr(name, 'startswith') and len(name) > 0 and '..' not in name \
+        and '\0' not in name and '/' not in name and '\\' not in name \
+        and os.path.basename(name) == name and not os.path.isabs(name)
+
+
+class LibraryEntry:
+    def __init__(self, name, saga):
+        self.name = name
+        self.saga = saga
+        self.size = estimate_size([
+            saga.items, saga.actions, saga.verbs, saga.nouns,
+            saga.rooms, saga.messages
+        ])
+        self.refs = 0
+        self.last_used = time.time()
+
+
+class SagaLibrary:
+    def __init__(self, paths=None, budget=64 << 20, options=0, local=True):
+        if paths is None:
+            paths = [os.getenv(ENV_FILE, DIR_APP)]
+        elif isinstance(paths, str):
+            paths = [paths]
+
+        self.paths = paths
+        self.budget = budget            # Bytes of parsed data kept resident
+        self.options = options          # Options used to parse the databases
+        self.local = local              # Names may be paths to any database
+        self.entries = OrderedDict()    # Least recently used first
+        self.loading = {}               # Set when a game has loaded, by name
+        self.size = 0
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    def find(self, name):
+        if self.local:
+            if os.path.exists(name):
+                return name
+        elif not is_game_name(name):
+            return None
+
+        for path in self.paths:
+            for filename in (name, name + EXT_DATABASE):
+                filename = os.path.join(path, filename)
+                if os.path.exists(filename):
+                    return filename
+
+        return None
+
+    def load(self, name):
+        filename = self.find(name)
+        if filename is None:
+            raise IOError("Can't find game '{0}'".format(name))
+
+        start = time.time()
+        saga = Saga(self.options, None, name, None, False)
+        with open(filename, 'r') as file:
+            saga.load_database(file, name)
+        saga.name = name
+        with self.lock:
+            self.load_time += time.time() - start
+
+        return LibraryEntry(name, saga)
+
+    # Games are loaded outside the lock, so other games are served meanwhile;
+    # sessions asking for a game being loaded wait for it
+    def acquire(self, name):
+        while True:
+            with self.lock:
+                entry = self.entries.pop(name, None)
+                if entry is not None:
+                    self.hits += 1
+                    return self.use(name, entry)
+
+                loading = self.loading.get(name)
+                if loading is None:
+                    self.misses += 1
+                    loading = self.loading[name] = threading.Event()
+                    break
+            loading.wait()
+
+        entry = None
+        try:
+            entry = self.load(name)
+        finally:
+            with self.lock:
+                del self.loading[name]
+                if entry is not None:
+                    self.size += entry.size
+                    saga = self.use(name, entry)
+            loading.set()
+        return saga
+
+    def use(self, name, entry):
+        # Re-insert to mark as most recently used
+        self.entries[name] = entry
+        entry.refs += 1
+        entry.last_used = time.time()
+
+        self.evict()
+        return entry.saga
+
+    def release(self, name):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry.refs < 1:
+                return False
+
+            entry.refs -= 1
+            entry.last_used = time.time()
+            self.evict()
+            return True
+
+    def evict(self, budget=None):
+        if budget is None:
+            budget = self.budget
+
+        with self.lock:
+            for name in list(self.entries.keys()):
+                if self.size <= budget:
+                    break
+
+                entry = self.entries[name]
+                if entry.refs:
+                    continue
+
+                del self.entries[name]
+                self.size -= entry.size
+                self.evictions += 1
+
+        return self
+
+    def open(self, name, obj_type=Saga, options=None, seed=None):
+        if options is None:
+            options = self.options
+        session = obj_type(options, seed, name, None, False)
+        session.share_database(self.acquire(name))
+        session.library_name = name
+        return session
+
+    # Closing a session again, or one the library didn't open, does nothing
+    def close(self, session):
+        with self.lock:
+            name = getattr(session, 'library_name', None)
+            session.library_name = None
+        return name is not None and self.release(name)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'games': len(self.entries),
+                'sessions': sum(entry.refs for entry in self.entries.values()),
+                'size': self.size,
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'load_time': self.load_time,
+            }
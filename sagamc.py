@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+#
+#   PyScottFree
+#
+#   A free Scott Adams style adventure interpreter
+#
+#   Copyright:
+#       This software is placed under the GNU license.
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version
+#   2 of the License, or (at your option) any later version.
+#
+#   Monte Carlo analysis of a game's random occurrences: plays a walkthrough
+#   script under many seeds in a pool of worker processes and reports how
+#   often it wins, dies or runs out of light, how many turns it takes, and
+#   which random lines fired in the games won and lost.
+#
+
+import sys
+import json
+import time
+import getopt
+import multiprocessing
+
+from collections import namedtuple
+
+from pyscottfree import Saga
+from sagaenv import EnvSaga, load_template
+
+__author__ = 'Jon Ruttan'
+__copyright__ = 'Copyright (C) 2016 Jon Ruttan'
+__license__ = 'Distributed under the GNU software license'
+__version__ = '0.1.0'
+
+# The outcome of playing the script under one seed; light_out is the turn
+# the light ran out or None, fired counts the random lines' firings by line
+Outcome = namedtuple('Outcome', 'seed won dead ended turns light_out fired')
+
+# Set in each worker by start_worker()
+worker = None
+
+
+# The script's commands, one per line, skipping blank lines and # comments
+def read_script(file):
+    return [
+        line.strip() for line in file
+        if len(line.strip()) and not line.strip().startswith('#')
+    ]
+
+
+# Automatic lines that fire by chance rather than every turn
+def random_lines(template):
+    return [
+        i for (i, action) in enumerate(template.actions)
+        if action.vocab // 150 == 0 and 0 < action.vocab % 150 < 100
+    ]
+
+
+def play(template, commands, seed, lines):
+    saga = EnvSaga(template.options, seed, template.name)
+    saga.share_database(template)
+    saga.turn_fired = []
+
+    turns = 0
+    light_out = None
+    saga.advance()
+    for command in commands:
+        if saga.ended:
+            break
+        saga.advance(command)
+        turns += 1
+        if light_out is None and saga.bit_flags & Saga.FLAG_LIGHT_OUT:
+            light_out = turns
+
+    fired = {}
+    for i in saga.turn_fired:
+        if i in lines:
+            fired[i] = fired.get(i, 0) + 1
+    return Outcome(seed, saga.won, saga.dead, saga.ended, turns, light_out, fired)
+
+
+def start_worker(filename, options, commands):
+    global worker
+    template = load_template(filename, options)
+    worker = (template, commands, set(random_lines(template)))
+
+
+def play_seeds(seeds):
+    (template, commands, lines) = worker
+    return [play(template, commands, seed, lines) for seed in seeds]
+
+
+def percentile(values, quantile):
+    if not len(values):
+        return 0
+    values = sorted(values)
+    return values[min(int(quantile * len(values)), len(values) - 1)]
+
+
+class Analysis:
+    def __init__(self, template, commands):
+        self.template = template
+        self.commands = commands
+        self.lines = random_lines(template)
+        self.outcomes = []
+        self.elapsed = 0.0
+        self.workers = 0
+
+    # Plays the seeds, chunks at a time, in a pool of worker processes
+    def run(self, filename, seeds, workers=None, chunk=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if chunk is None:
+            chunk = max(len(seeds) // (workers * 8), 1)
+        chunks = [seeds[i:i + chunk] for i in range(0, len(seeds), chunk)]
+
+        start = time.time()
+        pool = multiprocessing.Pool(workers, start_worker, (
+            filename, self.template.options, self.commands
+        ))
+        try:
+            for outcomes in pool.imap_unordered(play_seeds, chunks):
+                self.outcomes.extend(outcomes)
+        finally:
+            pool.close()
+            pool.join()
+
+        self.outcomes.sort(key=lambda outcome: outcome.seed)
+        self.elapsed += time.time() - start
+        self.workers = workers
+        return self
+
+    # Plays the seeds in this process
+    def run_here(self, seeds):
+        start = time.time()
+        lines = set(self.lines)
+        for seed in seeds:
+            self.outcomes.append(play(self.template, self.commands, seed, lines))
+        self.elapsed += time.time() - start
+        self.workers = 0
+        return self
+
+    def summary(self):
+        outcomes = self.outcomes
+        games = len(outcomes)
+        won = [outcome for outcome in outcomes if outcome.won]
+        turns = [outcome.turns for outcome in outcomes]
+        light_out = [
+            outcome.light_out for outcome in outcomes if outcome.light_out is not None
+        ]
+
+        def rate(count):
+            return games and float(count) / games or 0.0
+
+        lines = []
+        for i in self.lines:
+            fired = [outcome for outcome in outcomes if i in outcome.fired]
+            unfired = games - len(fired)
+            fired_won = len([outcome for outcome in fired if outcome.won])
+            lines.append({
+                'line': i,
+                'chance': self.template.actions[i].vocab % 150,
+                'games': rate(len(fired)),
+                'mean': rate(sum(outcome.fired[i] for outcome in fired)),
+                'won_fired': float(fired_won) / len(fired) if fired else None,
+                'won_unfired':
+                    float(len(won) - fired_won) / unfired if unfired else None
+            })
+
+        return {
+            'game': self.template.name,
+            'games': games,
+            'commands': len(self.commands),
+            'won': rate(len(won)),
+            'dead': rate(len([outcome for outcome in outcomes if outcome.dead])),
+            'ended': rate(len([outcome for outcome in outcomes if outcome.ended])),
+            'light_out': rate(len(light_out)),
+            'turns': dict(
+                (str(q), percentile(turns, q)) for q in (0.0, 0.5, 0.9, 1.0)
+            ),
+            'light_out_turns': dict(
+                (str(q), percentile(light_out, q)) for q in (0.0, 0.5, 1.0)
+            ),
+            'lost_seeds': [outcome.seed for outcome in outcomes if not outcome.won],
+            'lines': lines,
+            'workers': self.workers,
+            'seconds': self.elapsed,
+            'games_per_second': self.elapsed and games / self.elapsed or 0.0,
+            'turns_per_second': self.elapsed and sum(turns) / self.elapsed or 0.0
+        }
+
+
+def report(summary, file=sys.stdout, seeds=10):
+    def percent(value):
+        return value is None and '-' or '{0:.1f}%'.format(value * 100)
+
+    file.write('{0}: {1:d} games of {2:d} commands\n\n'.format(
+        summary['game'], summary['games'], summary['commands']))
+    for name in ('won', 'dead', 'ended', 'light_out'):
+        file.write('{0:<12} {1:>7}\n'.format(name, percent(summary[name])))
+
+    file.write('\n{0:<12} {1:>7} {2:>7} {3:>7} {4:>7}\n'.format(
+        'turns', 'min', 'median', '90%', 'max'))
+    file.write('{0:<12} {1:>7d} {2:>7d} {3:>7d} {4:>7d}\n'.format(
+        '', *[summary['turns'][str(q)] for q in (0.0, 0.5, 0.9, 1.0)]))
+    if summary['light_out']:
+        file.write('{0:<12} {1:>7d} {2:>7d} {3:>7} {4:>7d}\n'.format(
+            'light out', summary['light_out_turns']['0.0'],
+            summary['light_out_turns']['0.5'], '',
+            summary['light_out_turns']['1.0']))
+
+    if len(summary['lines']):
+        file.write('\n{0:<12} {1:>7} {2:>7} {3:>7} {4:>10} {5:>10}\n'.format(
+            'random line', 'chance', 'games', 'mean', 'won fired', 'won not'))
+        for line in summary['lines']:
+            file.write('{0:<12d} {1:>6d}% {2:>7} {3:>7.2f} {4:>10} {5:>10}\n'.format(
+                line['line'], line['chance'], percent(line['games']), line['mean'],
+                percent(line['won_fired']), percent(line['won_unfired'])))
+
+    lost = summary['lost_seeds']
+    if len(lost) and len(lost) < summary['games']:
+        file.write('\nSeeds not won: {0}{1}\n'.format(
+            ' '.join(str(seed) for seed in lost[:seeds]),
+            len(lost) > seeds and ' ...' or ''))
+
+    file.write('\n{0:.1f} games/s, {1:.0f} turns/s ({2:d} workers, {3:.1f}s)\n'.format(
+        summary['games_per_second'], summary['turns_per_second'],
+        summary['workers'], summary['seconds']))
+    return file
+
+
+def usage(argv):
+    sys.stderr.write('''Usage: {0} [options] <gamename> <script>
+Play a walkthrough script (one command per line) under many seeds and
+report the outcomes.
+Options:
+  -h  Print this message and exit
+  -n  Number of seeds (default: 1000)
+  -r  First seed (default: 0)
+  -w  Worker processes (default: one per CPU, 0 plays in this process)
+  -j  Write the summary as JSON to a file
+  -y  Generate 'You are', 'You are carrying' type messages for games that
+      use these instead (eg Robin Of Sherwood)
+  -s  Generate authentic Scott Adams driver light messages rather than
+      other driver style ones (Light goes out in %d turns..)
+  -p  Use for prehistoric databases which don't use bit 16
+'''.format(argv[0]))
+
+
+def main(argv):
+    options = 0
+    count = 1000
+    first = 0
+    workers = None
+    json_file = None
+
+    try:
+        opts, args = getopt.getopt(argv[1:], 'hn:r:w:j:ysp', ['help'])
+    except getopt.GetoptError as err:
+        sys.stderr.write(str(err) + '\n')
+        usage(argv)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            usage(argv)
+            sys.exit(0)
+        elif opt == '-n':
+            count = int(arg)
+        elif opt == '-r':
+            first = int(arg)
+        elif opt == '-w':
+            workers = int(arg)
+        elif opt == '-j':
+            json_file = arg
+        elif opt == '-y':
+            options |= Saga.FLAG_YOUARE
+        elif opt == '-s':
+            options |= Saga.FLAG_SCOTTLIGHT
+        elif opt == '-p':
+            options |= Saga.FLAG_PREHISTORIC_LAMP
+
+    if len(args) < 2:
+        usage(argv)
+        sys.exit(2)
+
+    template = load_template(args[0], options)
+    with open(args[1], 'r') as file:
+        commands = read_script(file)
+
+    seeds = list(range(first, first + count))
+    analysis = Analysis(template, commands)
+    if workers == 0:
+        analysis.run_here(seeds)
+    else:
+        analysis.run(args[0], seeds, workers)
+
+    summary = analysis.summary()
+    report(summary)
+    if json_file is not None:
+        with open(json_file, 'w') as file:
+            json.dump(summary, file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
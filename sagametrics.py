@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+#
+#   PyScottFree
+#
+#   A free Scott Adams style adventure interpreter
+#
+#   Copyright:
+#       This software is placed under the GNU license.
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version
+#   2 of the License, or (at your option) any later version.
+#
+#   Runtime metrics: turn phase latency histograms and event counters, with
+#   exporters for Prometheus and for a JSON file.
+#
+#   Set Saga.metrics (or a session's metrics) to a Metrics and the game loop
+#   times each phase of a turn:
+#
+#   parse       Input received to command parsed
+#   command     The command's action lines, movement and the light
+#   auto        Automatic action lines run after each command
+#   look        Redrawing the room
+#   flush       Writing out the turn's output
+#   turn        Input received to the next prompt
+#
+
+import os
+import sys
+import json
+import time
+import threading
+
+from abc import ABCMeta, abstractmethod
+
+if sys.version_info[0] > 2:
+    from abc import ABC
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+else:
+    ABC = ABCMeta('ABC', (object,), {})
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+__author__ = 'Jon Ruttan'
+__copyright__ = 'Copyright (C) 2016 Jon Ruttan'
+__license__ = 'Distributed under the GNU software license'
+__version__ = '0.1.0'
+
+PHASES = ['parse', 'command', 'auto', 'look', 'flush', 'turn']
+COUNTERS = [
+    'turns', 'sessions', 'saves', 'errors',
+    # Turns stopped by a session budget, by the limit reached
+    'budget_lines', 'budget_output', 'budget_seconds'
+]
+QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# Atomic where the platform allows it
+replace = getattr(os, 'replace', os.rename)
+
+
+# Counts of values in microseconds in log linear buckets, as in HdrHistogram:
+# values below 2 * SUB_BUCKETS have a bucket each, above that every power of
+# two is split into SUB_BUCKETS buckets, so a value is kept to within 1/32
+class Histogram:
+    SUB_BITS = 5
+    SUB_BUCKETS = 1 << SUB_BITS
+
+    def __init__(self):
+        self.counts = [0] * (self.SUB_BUCKETS * 2)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def index(self, value):
+        shift = value.bit_length() - self.SUB_BITS - 1
+        if shift <= 0:
+            return value
+        return (shift << self.SUB_BITS) + (value >> shift)
+
+    # The highest value counted in a bucket
+    def value(self, index):
+        shift = (index >> self.SUB_BITS) - 1
+        if shift <= 0:
+            return index
+        return ((index - (shift << self.SUB_BITS) + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(int(value), 0)
+        i = self.index(value)
+        if i >= len(self.counts):
+            self.counts.extend([0] * (i + 1 - len(self.counts)))
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        return self
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for (i, n) in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, quantile):
+        if not self.count:
+            return 0
+        target = max(int(quantile * self.count + 0.5), 1)
+        seen = 0
+        for (i, n) in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self.value(i), self.max)
+        return self.max
+
+    def mean(self):
+        return self.count and float(self.total) / self.count or 0.0
+
+
+class TurnTimer:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.start = self.last = clock()
+
+    def begin(self):
+        self.start = self.last = clock()
+        return self
+
+    # Time since the last lap goes to the phase's histogram
+    def lap(self, phase):
+        now = clock()
+        self.metrics.observe(phase, now - self.last)
+        self.last = now
+        return self
+
+    def end(self):
+        self.metrics.observe('turn', clock() - self.start)
+        self.metrics.count('turns')
+        return self
+
+
+# Shared by every session of a server, so updates are made under a lock
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict((name, 0) for name in COUNTERS)
+        self.histograms = dict((name, Histogram()) for name in PHASES)
+        self.started = time.time()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        return self
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds * 1000000)
+        return self
+
+    def timer(self):
+        return TurnTimer(self)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'time': time.time(),
+                'uptime': time.time() - self.started,
+                'counters': dict(self.counters),
+                'latency_us': dict(
+                    (name, {
+                        'count': histogram.count,
+                        'mean': histogram.mean(),
+                        'max': histogram.max,
+                        'quantiles': dict(
+                            (str(q), histogram.percentile(q)) for q in QUANTILES
+                        )
+                    }) for (name, histogram) in self.histograms.items()
+                )
+            }
+
+
+class Exporter(ABC):
+    @abstractmethod
+    def export(self, metrics):
+        pass
+
+
+# The Prometheus text exposition format, latency as summaries in seconds
+class PrometheusExporter(Exporter):
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, prefix='scottfree'):
+        self.prefix = prefix
+
+    def export(self, metrics):
+        snapshot = metrics.snapshot()
+        lines = []
+        for name in sorted(snapshot['counters']):
+            metric = '{0}_{1}_total'.format(self.prefix, name)
+            lines.append('# TYPE {0} counter'.format(metric))
+            lines.append('{0} {1:d}'.format(metric, snapshot['counters'][name]))
+
+        metric = '{0}_phase_seconds'.format(self.prefix)
+        lines.append('# TYPE {0} summary'.format(metric))
+        with metrics.lock:
+            for name in sorted(metrics.histograms):
+                histogram = metrics.histograms[name]
+                for q in QUANTILES:
+                    lines.append('{0}{{phase="{1}",quantile="{2}"}} {3:.6f}'.format(
+                        metric, name, q, histogram.percentile(q) / 1e6))
+                lines.append('{0}_sum{{phase="{1}"}} {2:.6f}'.format(
+                    metric, name, histogram.total / 1e6))
+                lines.append('{0}_count{{phase="{1}"}} {2:d}'.format(
+                    metric, name, histogram.count))
+
+        metric = '{0}_uptime_seconds'.format(self.prefix)
+        lines.append('# TYPE {0} gauge'.format(metric))
+        lines.append('{0} {1:.3f}'.format(metric, snapshot['uptime']))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, metrics, address):
+        server = MetricsServer(address, self, metrics)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = self.server.exporter.export(self.server.metrics).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', self.server.exporter.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(HTTPServer):
+    allow_reuse_address = True
+
+    def __init__(self, address, exporter, metrics):
+        HTTPServer.__init__(self, address, MetricsHandler)
+        self.exporter = exporter
+        self.metrics = metrics
+
+
+# Writes a snapshot to a file every interval seconds and when stopped
+class JSONExporter(Exporter):
+    def __init__(self, path, interval=60):
+        self.path = os.path.expanduser(path)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def export(self, metrics):
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as file:
+            json.dump(metrics.snapshot(), file, indent=1, sort_keys=True)
+        replace(temp, self.path)
+        return self
+
+    def start(self, metrics):
+        def run():
+            while not self.stopped.wait(self.interval):
+                self.export(metrics)
+
+        self.thread = threading.Thread(target=run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self, metrics):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        return self.export(metrics)
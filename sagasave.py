@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+#
+#   PyScottFree
+#
+#   A free Scott Adams style adventure interpreter
+#
+#   Copyright:
+#       This software is placed under the GNU license.
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version
+#   2 of the License, or (at your option) any later version.
+#
+
+import os
+import re
+import sys
+import time
+import sqlite3
+import threading
+
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+
+if sys.version_info[0] > 2:
+    from abc import ABC
+else:
+    ABC = ABCMeta('ABC', (object,), {})
+
+from pyscottfree import DIR_SAVE, EXT_SAVE, replace
+
+__author__ = 'Jon Ruttan'
+__copyright__ = 'Copyright (C) 2016 Jon Ruttan'
+__license__ = 'Distributed under the GNU software license'
+__version__ = '0.1.0'
+
+USER_DEFAULT = 'player'
+
+
+# A save store keeps the text of Saga.save_state() by user, game and slot
+class SaveStore(ABC):
+    @abstractmethod
+    def save(self, user, game, slot, data):
+        pass
+
+    @abstractmethod
+    def load(self, user, game, slot):
+        pass
+
+    @abstractmethod
+    def slots(self, user, game):
+        pass
+
+    @abstractmethod
+    def delete(self, user, game, slot):
+        pass
+
+    def flush(self):
+        return self
+
+    def close(self):
+        return self.flush()
+
+
+# The save file format, one file per slot under a directory per user
+class FileSaveStore(SaveStore):
+    SAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+    def __init__(self, path=DIR_SAVE):
+        self.path = os.path.expanduser(path)
+
+    def filename(self, user, game, slot):
+        return os.path.join(
+            self.path,
+            self.SAFE.sub('_', user or USER_DEFAULT),
+            '{0}-{1}{2}'.format(
+                self.SAFE.sub('_', game), self.SAFE.sub('_', slot), EXT_SAVE)
+        )
+
+    def save(self, user, game, slot, data):
+        filename = self.filename(user, game, slot)
+        try:
+            directory = os.path.dirname(filename)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # Another thread made it first
+                    if not os.path.isdir(directory):
+                        raise
+
+            # Write beside the old save and swap it in once complete
+            temp = '{0}.{1}.tmp'.format(filename, threading.current_thread().ident)
+            with open(temp, 'w') as file:
+                file.write(data)
+            replace(temp, filename)
+        except OSError as err:
+            raise IOError(str(err))
+        return self
+
+    def load(self, user, game, slot):
+        try:
+            with open(self.filename(user, game, slot), 'r') as file:
+                return file.read()
+        except IOError:
+            return None
+
+    def slots(self, user, game):
+        prefix = self.SAFE.sub('_', game) + '-'
+        directory = os.path.dirname(self.filename(user, game, ''))
+        if not os.path.exists(directory):
+            return []
+        return sorted([
+            name[len(prefix):-len(EXT_SAVE)] for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith(EXT_SAVE)
+        ])
+
+    def delete(self, user, game, slot):
+        try:
+            os.remove(self.filename(user, game, slot))
+            return True
+        except OSError:
+            return False
+
+
+# Saves waiting for a commit, and whether it went through
+class SaveBatch:
+    def __init__(self):
+        self.saves = OrderedDict()
+        self.since = None
+        self.done = threading.Event()
+        self.error = None
+
+
+# Saves are group committed: a save returns once the commit holding it is
+# on disk, and the saves made while one commit is being written all go in
+# the next. A commit may wait up to batch_time for batch_size saves.
+class SQLiteSaveStore(SaveStore):
+    # The sqlite3 module keeps these prepared per connection
+    SQL_CREATE = '''CREATE TABLE IF NOT EXISTS saves (
+        user TEXT NOT NULL,
+        game TEXT NOT NULL,
+        slot TEXT NOT NULL,
+        data TEXT NOT NULL,
+        saved REAL NOT NULL,
+        PRIMARY KEY (user, game, slot)
+    )'''
+    SQL_SAVE = 'INSERT OR REPLACE INTO saves VALUES (?, ?, ?, ?, ?)'
+    SQL_LOAD = 'SELECT data FROM saves WHERE user = ? AND game = ? AND slot = ?'
+    SQL_SLOTS = 'SELECT slot FROM saves WHERE user = ? AND game = ? ORDER BY slot'
+    SQL_DELETE = 'DELETE FROM saves WHERE user = ? AND game = ? AND slot = ?'
+
+    def __init__(self, path, batch_size=64, batch_time=0.0):
+        self.path = os.path.expanduser(path)
+        self.batch_size = batch_size    # Saves per commit
+        self.batch_time = batch_time    # Seconds a commit may wait for saves
+        self.local = threading.local()  # A connection per worker thread
+        self.connections = []
+        self.lock = threading.Lock()    # Held while changing the batches
+        self.filled = threading.Condition(self.lock)
+        self.writer = threading.Lock()  # Held while writing, SQLite has one writer
+        self.batch = SaveBatch()        # Saves waiting for the next commit
+        self.writing = None             # Saves being committed
+
+        directory = os.path.dirname(self.path)
+        if len(directory) and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        db = self.connection()
+        db.execute(self.SQL_CREATE)
+        db.commit()
+
+    def connection(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+            with self.lock:
+                self.connections.append(db)
+        return db
+
+    def key(self, user, game, slot):
+        return (user or USER_DEFAULT, game, slot)
+
+    def save(self, user, game, slot, data):
+        db = self.connection()
+        with self.lock:
+            batch = self.batch
+            # Repeated saves to a slot within a batch are written once
+            batch.saves[self.key(user, game, slot)] = (data, time.time())
+            if batch.since is None:
+                batch.since = time.time()
+            if len(batch.saves) >= self.batch_size:
+                self.filled.notify_all()
+
+        self.commit(db, batch)
+        if batch.error is not None:
+            raise IOError(batch.error)
+        return self
+
+    # Returns once the batch is committed, by this thread or another
+    def commit(self, db, batch):
+        with self.writer:
+            if batch.done.is_set():
+                return self
+
+            with self.lock:
+                # Only the open batch can still be waiting, so it's this one
+                deadline = batch.since + self.batch_time
+                while len(batch.saves) < self.batch_size and time.time() < deadline:
+                    self.filled.wait(deadline - time.time())
+                self.batch = SaveBatch()
+                self.writing = batch
+
+            rows = [key + value for (key, value) in batch.saves.items()]
+            try:
+                db.executemany(self.SQL_SAVE, rows)
+                db.commit()
+            except sqlite3.Error as err:
+                db.rollback()
+                batch.error = str(err)
+
+            with self.lock:
+                self.writing = None
+            batch.done.set()
+        return self
+
+    def load(self, user, game, slot):
+        key = self.key(user, game, slot)
+        with self.lock:
+            for batch in (self.batch, self.writing):
+                if batch is not None and key in batch.saves:
+                    return batch.saves[key][0]
+
+        row = self.connection().execute(self.SQL_LOAD, key).fetchone()
+        return row and row[0] or None
+
+    def slots(self, user, game):
+        self.flush()
+        return [row[0] for row in self.connection().execute(
+            self.SQL_SLOTS, self.key(user, game, None)[:2])]
+
+    def delete(self, user, game, slot):
+        key = self.key(user, game, slot)
+        db = self.connection()
+        # Saves made before the delete are committed first
+        self.flush()
+        with self.writer:
+            try:
+                deleted = db.execute(self.SQL_DELETE, key).rowcount > 0
+                db.commit()
+            except sqlite3.Error as err:
+                db.rollback()
+                raise IOError(str(err))
+        return deleted
+
+    # Commits any saves still waiting, as when a save has to wait for its
+    # batch to fill
+    def flush(self):
+        with self.lock:
+            batch = self.batch
+            if not len(batch.saves):
+                return self
+            batch.since = 0
+            self.filled.notify_all()
+        return self.commit(self.connection(), batch)
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            for db in self.connections:
+                db.close()
+            self.connections = []
+        self.local = threading.local()
+        return self
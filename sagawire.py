@@ -0,0 +1,572 @@
+#!/usr/bin/env python
+#
+#   PyScottFree
+#
+#   A free Scott Adams style adventure interpreter
+#
+#   Copyright:
+#       This software is placed under the GNU license.
+#
+#   This program is free software; you can redistribute it and/or
+#   modify it under the terms of the GNU General Public License
+#   as published by the Free Software Foundation; either version
+#   2 of the License, or (at your option) any later version.
+#
+#   Wire protocol, one JSON value per line:
+#
+#   client: {"game": name, "options": flags, "mode": "ids" or "text",
+#            "tables": digest of a cached copy of the tables or null}
+#   server: ["tables", digest, tables or null if the client's copy matches]
+#           (ids mode only)
+#   server: the output of a turn, a list of [event code, args...] in ids
+#           mode or a string of text in text mode
+#   client: the typed command, as plain text
+#
+#   ... and so on, alternating, until the server sends
+#   ["exit", errno, output of the last turn] and closes the connection.
+#
+
+import os
+import sys
+import json
+import socket
+import getopt
+import hashlib
+import threading
+
+if sys.version_info[0] > 2:
+    import socketserver
+else:
+    import SocketServer as socketserver
+
+from pyscottfree import Saga, Room, Item, Budget, DIR_SAVE
+from sagalibrary import SagaLibrary, is_game_name
+from sagasave import SQLiteSaveStore
+from sagametrics import Metrics, PrometheusExporter, JSONExporter
+
+__author__ = 'Jon Ruttan'
+__copyright__ = 'Copyright (C) 2016 Jon Ruttan'
+__license__ = 'Distributed under the GNU software license'
+__version__ = '0.1.0'
+
+PORT = 7880
+
+# Per turn limits for each session, so one game can't starve the others
+BUDGET = Budget(lines=20000, output=1 << 16, seconds=5.0)
+DIR_TABLES = os.path.join(DIR_SAVE, 'wire')
+
+MODE_IDS = 'ids'                # Events by id, string tables sent once
+MODE_TEXT = 'text'              # Rendered text, as on a terminal
+
+# Event kinds in the order of their wire codes
+EVENTS = [
+    Saga.EVENT_ROOM,
+    Saga.EVENT_MESSAGE,
+    Saga.EVENT_STRING,
+    Saga.EVENT_TEXT,
+    Saga.EVENT_INVENTORY,
+    Saga.EVENT_PROMPT,
+    Saga.EVENT_GAME_OVER
+]
+EVENT_CODES = dict((event, i) for (i, event) in enumerate(EVENTS))
+
+# Options a client may choose, the rest are the server's business
+CLIENT_OPTIONS = Saga.FLAG_YOUARE | Saga.FLAG_SCOTTLIGHT \
+    | Saga.FLAG_TRS80_STYLE | Saga.FLAG_PREHISTORIC_LAMP
+
+
+def encode(obj):
+    return (json.dumps(obj, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def decode(line):
+    return json.loads(line.decode('utf-8'))
+
+
+# Everything a client needs to render the events of one game
+def string_tables(saga):
+    return {
+        'options': saga.options & CLIENT_OPTIONS,
+        'width': saga.width,
+        'messages': saga.messages,
+        'rooms': [room.text for room in saga.rooms],
+        'items': [item.text for item in saga.items],
+        'strings': sorted([name, value] for (name, value) in saga.strings.items())
+    }
+
+
+# The fields of a client's first line, which may hold anything at all
+def read_hello(line):
+    hello = decode(line)
+    if not isinstance(hello, dict):
+        raise ValueError('Bad hello')
+
+    game = hello.get('game')
+    if not is_game_name(game):
+        raise ValueError('Bad game name')
+
+    options = hello.get('options', 0)
+    if type(options) is not int:
+        raise ValueError('Bad options')
+
+    mode = hello.get('mode', MODE_IDS)
+    if mode not in (MODE_IDS, MODE_TEXT):
+        raise ValueError('Bad mode')
+
+    user = hello.get('user')
+    if user is not None and not hasattr(user, 'startswith'):
+        raise ValueError('Bad user')
+
+    return (game, options & CLIENT_OPTIONS, mode, user, hello.get('tables'))
+
+
+def tables_digest(tables):
+    return hashlib.sha1(
+        json.dumps(tables, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+
+
+class WireSession(Saga):
+    def __init__(self, options=0, seed=None, name=None, file=None, greet=False):
+        self.rfile = None
+        self.wfile = None
+        self.mode = MODE_IDS
+        self.string_ids = {}
+        self.pending = []
+        self.bytes_sent = 0
+        Saga.__init__(self, options, seed, name, file, greet)
+
+    def connect(self, rfile, wfile, mode=MODE_IDS):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.mode = mode
+        return self
+
+    # Only the digest is sent when the client already has these tables
+    def send_tables(self, digest, tables, cached=None):
+        self.string_ids = dict(
+            (name, i) for (i, (name, value)) in enumerate(tables['strings'])
+        )
+        return self.send([
+            'tables',
+            digest,
+            cached != digest and tables or None
+        ])
+
+    def send(self, obj):
+        data = encode(obj)
+        self.wfile.write(data)
+        self.wfile.flush()
+        self.bytes_sent += len(data)
+        return self
+
+    def flush_turn(self):
+        self.send(self.turn())
+        return self
+
+    def turn(self):
+        turn = self.pending
+        if self.mode == MODE_TEXT:
+            turn = ''.join(turn)
+        self.pending = []
+        return turn
+
+    def emit(self, event, *args):
+        if self.mode == MODE_TEXT:
+            return Saga.emit(self, event, *args)
+
+        if event == Saga.EVENT_STRING or event == Saga.EVENT_PROMPT:
+            args = (self.string_ids[args[0]],) + args[1:]
+        self.pending.append([EVENT_CODES[event]] + list(args))
+        if self.spent is not None:
+            self.spend(0, len(encode(self.pending[-1])))
+        return self
+
+    def output_write(self, str, win=1, scroll=True):
+        self.pending.append(str)
+        return self
+
+    def output_flush(self):
+        # The client renders whole turns
+        return self
+
+    # The turn is sent with the prompt by input_read(), and timed there
+    def input(self, str='', win=1):
+        return self.input_read(str, win).strip()
+
+    def input_read(self, str='', win=1):
+        if self.mode == MODE_TEXT:
+            self.pending.append(str)
+        elif not len(self.pending) \
+                or self.pending[-1][0] != EVENT_CODES[Saga.EVENT_PROMPT]:
+            # Prompts other than the turn's, eg. for a filename
+            self.pending.append([EVENT_CODES[Saga.EVENT_TEXT], str])
+        self.flush_turn()
+        if self.timer is not None:
+            self.timer.lap('flush').end()
+
+        line = self.rfile.readline()
+        if not line:
+            self.exit(0)
+        return line.decode('utf-8')
+
+    def exit(self, errno=0, errstr=None):
+        # The last turn goes with the exit so the client doesn't prompt
+        self.send(['exit', errno, self.turn()])
+        raise SystemExit(errno)
+
+    # Sessions share the library's database and must not touch server files,
+    # games are only saved to the server's save store
+    def load_database(self, file=None, name=None):
+        return False
+
+    def save_game(self, filename=None):
+        if self.save_store is None:
+            self.emit(Saga.EVENT_STRING, 'save error')
+            return self
+        return self.save_slot(filename)
+
+    def load_game(self, filename=None):
+        if self.save_store is None:
+            self.emit(Saga.EVENT_STRING, 'load error')
+            return self
+        return self.load_slot(filename)
+
+
+class WireHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            (game, options, mode, user, cached) = read_hello(self.rfile.readline())
+            session = self.server.library.open(game, WireSession, options)
+            session.save_store = self.server.save_store
+            session.metrics = self.server.metrics
+            session.budget = self.server.budget
+            session.user = user
+        except (ValueError, KeyError, IOError) as err:
+            if self.server.metrics is not None:
+                self.server.metrics.count('errors')
+            self.wfile.write(encode(['error', str(err)]))
+            return
+
+        if session.metrics is not None:
+            session.metrics.count('sessions')
+
+        try:
+            session.connect(self.rfile, self.wfile, mode)
+            if mode == MODE_IDS:
+                (digest, tables) = self.server.get_tables(session)
+                session.send_tables(digest, tables, cached)
+
+            session.game_loop()
+            session.exit(0)
+        except (SystemExit, socket.error):
+            pass
+        finally:
+            self.server.library.close(session)
+            if session.save_store is not None:
+                session.save_store.flush()
+            with self.server.lock:
+                self.server.bytes_sent += session.bytes_sent
+
+
+class SagaWireServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, library=None, save_store=None, metrics=None,
+                 budget=BUDGET):
+        socketserver.TCPServer.__init__(self, address, WireHandler)
+        self.library = library is not None and library or SagaLibrary()
+        # Clients only name games in the library's directories
+        self.library.local = False
+        self.save_store = save_store
+        self.metrics = metrics
+        self.budget = budget
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+
+    def get_tables(self, session):
+        key = (session.name, session.options, session.width, session.string_pack)
+        with self.lock:
+            if key not in self.tables:
+                tables = string_tables(session)
+                self.tables[key] = (tables_digest(tables), tables)
+            return self.tables[key]
+
+
+# Reference client, renders the events with the engine's terminal renderer
+class SagaClient(Saga):
+    def __init__(self, options=0, cache_dir=DIR_TABLES):
+        self.cache_dir = cache_dir
+        self.sock = None
+        self.mode = MODE_IDS
+        self.prompt = ''
+        self.string_names = []
+        self.bytes_received = 0
+        self.turns = 0
+        Saga.__init__(self, options, None, None, None, False)
+
+    def cache_path(self, game, options):
+        return os.path.join(self.cache_dir, '{0}-{1:x}.json'.format(game, options))
+
+    def read_cache(self, game, options):
+        try:
+            with open(self.cache_path(game, options), 'r') as file:
+                return json.load(file)
+        except (IOError, ValueError):
+            return None
+
+    def write_cache(self, game, options, digest, tables):
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(self.cache_path(game, options), 'w') as file:
+                json.dump({'digest': digest, 'tables': tables}, file)
+        except (IOError, OSError):
+            pass
+
+    def connect(self, address, game, mode=MODE_IDS, user=None):
+        self.sock = socket.create_connection(address)
+        self.rfile = self.sock.makefile('rb')
+        self.wfile = self.sock.makefile('wb')
+        self.mode = mode
+
+        options = self.options & CLIENT_OPTIONS
+        cached = mode == MODE_IDS and self.read_cache(game, options) or None
+        self.send({
+            'game': game,
+            'options': options,
+            'mode': mode,
+            'user': user,
+            'tables': cached and cached['digest'] or None
+        })
+
+        if mode == MODE_IDS:
+            reply = self.receive()
+            if reply is None or reply[0] != 'tables':
+                self.fatal(reply and reply[1] or 'Connection closed')
+
+            (digest, tables) = reply[1:]
+            if tables is None:
+                tables = cached['tables']
+            else:
+                self.write_cache(game, options, digest, tables)
+            self.load_tables(tables)
+
+        return self
+
+    def load_tables(self, tables):
+        self.options = (self.options & ~CLIENT_OPTIONS) | tables['options']
+        self.width = tables['width']
+        self.messages = tables['messages']
+        self.rooms = [Room() for text in tables['rooms']]
+        for (room, text) in zip(self.rooms, tables['rooms']):
+            room.text = text
+        self.items = [Item() for text in tables['items']]
+        for (item, text) in zip(self.items, tables['items']):
+            item.text = text
+        self.string_names = [name for (name, value) in tables['strings']]
+        self.strings = dict(tables['strings'])
+        self.room_cache = {}
+        return self
+
+    def send(self, obj):
+        self.wfile.write(encode(obj))
+        self.wfile.flush()
+        return self
+
+    def receive(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        self.bytes_received += len(line)
+        return decode(line)
+
+    def render_wire_event(self, event):
+        kind = EVENTS[event[0]]
+        args = event[1:]
+        if kind == Saga.EVENT_STRING or kind == Saga.EVENT_PROMPT:
+            args[0] = self.string_names[args[0]]
+
+        if kind == Saga.EVENT_PROMPT:
+            self.prompt = self.strings[args[0]]
+            return self
+
+        if kind == Saga.EVENT_ROOM:
+            self.view_shown = (args[0], args[1], tuple(args[2]), tuple(args[3]))
+        return self.render_event(kind, args)
+
+    def read_command(self):
+        while True:
+            command = self.input(self.prompt)
+            if len(command):
+                return command
+
+    def play(self):
+        while True:
+            turn = self.receive()
+            if turn is None:
+                break
+
+            exit = len(turn) and turn[0] == 'exit'
+            if exit:
+                turn = turn[2]
+
+            self.turns += 1
+            self.prompt = ''
+            if self.mode == MODE_TEXT:
+                self.output_write(turn)
+            else:
+                for event in turn:
+                    self.render_wire_event(event)
+
+            if exit:
+                break
+            self.send_line(self.read_command())
+
+        self.sock.close()
+        return self
+
+    def send_line(self, line):
+        self.wfile.write((line + '\n').encode('utf-8'))
+        self.wfile.flush()
+        return self
+
+
+def parse_address(address):
+    (host, sep, port) = address.rpartition(':')
+    return (sep and host or address, sep and int(port) or PORT)
+
+
+def usage(argv):
+    sys.stderr.write('''Usage: {0} [options] -l <gamedir>
+       {0} [options] -c <host[:port]> <gamename>
+Serve games from a directory, or play one from a server.
+Options:
+  -h  Print this message and exit
+  -l  Listen for players, serving the games found in gamedir
+  -b  Address to listen on (default: localhost:{1})
+  -S  SQLite database for saved games (default: no saving)
+  -M  Address to serve Prometheus metrics on, eg. localhost:9180
+  -J  File to write metrics to as JSON every minute
+  -L  Limits on each turn: action lines,output bytes,seconds; 0 for none
+      (default: {2:d},{3:d},{4:g})
+  -c  Connect to a server
+  -m  Protocol mode, ids or text (default: ids)
+  -u  User name for saved games
+  -y  Generate 'You are' type messages
+  -s  Generate authentic Scott Adams driver light messages
+  -t  Generate TRS80 style display
+  -p  Force lamp destruction when empty
+  -d  Print the bytes received per turn on exit
+'''.format(argv[0], PORT, *BUDGET))
+
+
+def main(argv):
+    options = 0
+    games = None
+    bind = 'localhost'
+    server = None
+    mode = MODE_IDS
+    saves = None
+    user = None
+    debugging = False
+    prometheus = None
+    metrics_file = None
+    budget = BUDGET
+
+    try:
+        opts, args = getopt.getopt(argv[1:], 'hl:b:S:M:J:L:c:m:u:ystpd', ['help'])
+    except getopt.GetoptError as err:
+        sys.stderr.write(str(err) + '\n')
+        usage(argv)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            usage(argv)
+            sys.exit(0)
+        elif opt == '-l':
+            games = arg
+        elif opt == '-b':
+            bind = arg
+        elif opt == '-S':
+            saves = arg
+        elif opt == '-M':
+            prometheus = arg
+        elif opt == '-J':
+            metrics_file = arg
+        elif opt == '-L':
+            try:
+                limits = [float(n) for n in arg.split(',')]
+            except ValueError:
+                usage(argv)
+                sys.exit(2)
+            budget = Budget(*[
+                n > 0 and (i < 2 and int(n) or n) or None
+                for (i, n) in enumerate((limits + [0, 0, 0])[:3])
+            ])
+        elif opt == '-c':
+            server = arg
+        elif opt == '-m':
+            mode = arg
+        elif opt == '-u':
+            user = arg
+        elif opt == '-y':
+            options |= Saga.FLAG_YOUARE
+        elif opt == '-s':
+            options |= Saga.FLAG_SCOTTLIGHT
+        elif opt == '-t':
+            options |= Saga.FLAG_TRS80_STYLE
+        elif opt == '-p':
+            options |= Saga.FLAG_PREHISTORIC_LAMP
+        elif opt == '-d':
+            debugging = True
+
+    if games is not None:
+        metrics = None
+        if prometheus is not None or metrics_file is not None:
+            metrics = Metrics()
+
+        wire = SagaWireServer(
+            parse_address(bind),
+            SagaLibrary(games),
+            saves is not None and SQLiteSaveStore(saves) or None,
+            metrics,
+            budget
+        )
+        sys.stderr.write('Serving {0} on {1}:{2}\n'.format(
+            games, *wire.server_address))
+
+        if prometheus is not None:
+            PrometheusExporter().serve(metrics, parse_address(prometheus))
+        exporter = None
+        if metrics_file is not None:
+            exporter = JSONExporter(metrics_file).start(metrics)
+
+        try:
+            wire.serve_forever()
+        except KeyboardInterrupt:
+            wire.server_close()
+            if wire.save_store is not None:
+                wire.save_store.close()
+            if exporter is not None:
+                exporter.stop(metrics)
+        return
+
+    if server is None or not len(args):
+        usage(argv)
+        sys.exit(2)
+
+    client = SagaClient(options).connect(
+        parse_address(server), args[0], mode, user)
+    client.play()
+
+    if debugging:
+        sys.stderr.write('{0:d} bytes in {1:d} turns\n'.format(
+            client.bytes_received, client.turns))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,157 @@
+#
+#   Small games built in memory for the tests
+#
+
+import os
+import sys
+import struct
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from pyscottfree import Saga, StringIO
+from sagaenv import EnvSaga
+
+VERBS = [
+    'AUT', 'GO', 'JUM', 'SCO', 'INV', 'QUI', 'LOO', 'OPE', 'LIG', 'SAV',
+    'GET', '*TAK', 'REA', 'WAI', 'SWI', 'THR', 'EXA', 'FIL', 'DRO', '*PUT'
+]
+NOUNS = [
+    'ANY', 'NOR', 'SOU', 'EAS', 'WES', 'UP', 'DOW', 'LAM', 'DOO', 'GOL',
+    'COI', 'KEY', 'BOO', 'ROP', 'APP', 'SWO', 'INV', 'GAM', 'STO', 'BAG'
+]
+ROOMS = [
+    ([0, 0, 0, 0, 0, 0], ''),
+    ([2, 0, 3, 0, 0, 0], 'small cave'),
+    ([0, 1, 0, 0, 4, 0], 'dark tunnel'),
+    ([0, 0, 0, 1, 0, 0], 'treasure vault'),
+    ([0, 0, 0, 0, 0, 2], 'tall tower'),
+    ([0, 0, 0, 0, 0, 0], 'limbo')
+]
+ITEMS = [
+    ('Rusty key/KEY/', 1),
+    ('Closed door', 1),
+    ('Open door', 0),
+    ('*Gold coin*/GOL/', 2),
+    ('Old book/BOO/', 1),
+    ('Coil of rope/ROP/', 3),
+    ('Red apple/APP/', 1),
+    ('*Silver sword*/SWO/', 4),
+    ('Stone/STO/', 2),
+    ('Lamp/LAM/', 1),
+    ('Sack/BAG/', 3),
+    ('Shiny coin/COI/', 1)
+]
+MESSAGES = ['', 'A bat flies past.', 'Nothing happens.']
+
+
+# An action line: vocab is verb * 150 + noun (or the chance for verb 0),
+# conditions are (condition, value) pairs then the opcodes' parameters
+def line(vocab, conditions=(), params=(), opcodes=()):
+    values = [cv + 20 * dv for (cv, dv) in conditions] + [20 * p for p in params]
+    values += [0] * (5 - len(values))
+    opcodes = list(opcodes) + [0] * (4 - len(opcodes))
+    return [vocab] + values + [
+        opcodes[0] * 150 + opcodes[1], opcodes[2] * 150 + opcodes[3]
+    ]
+
+
+def database(actions, light_time=40):
+    lines = ['0']
+    for n in (len(ITEMS) - 1, len(actions) - 1, len(VERBS) - 1, len(ROOMS) - 1,
+              6, 1, 2, 3, light_time, len(MESSAGES) - 1, 3):
+        lines.append(str(n))
+    for action in actions:
+        lines.append(' '.join(str(n) for n in action))
+    for (verb, noun) in zip(VERBS, NOUNS):
+        lines.extend(['"{0}"'.format(verb), '"{0}"'.format(noun)])
+    for (exits, text) in ROOMS:
+        lines.extend([' '.join(str(n) for n in exits), '"{0}"'.format(text)])
+    lines.extend(['"{0}"'.format(message) for message in MESSAGES])
+    lines.extend(['"{0}" {1:d}'.format(text, loc) for (text, loc) in ITEMS])
+    lines.extend(['""' for action in actions])
+    lines.extend(['416', '99', '0'])
+    return '\n'.join(lines) + '\n'
+
+
+def template(actions, options=0, light_time=40):
+    saga = Saga(options, None, 'test', None, False)
+    saga.load_database(StringIO(database(actions, light_time)), 'test')
+    saga.name = 'test'
+    return saga
+
+
+# A quiet Saga sharing the template's tables
+def game(template, seed):
+    saga = EnvSaga(template.options, seed, template.name)
+    saga.share_database(template)
+    return saga
+
+
+def rle_encode(pixels):
+    data = bytearray()
+    i = 0
+    while i < len(pixels):
+        n = 1
+        while i + n < len(pixels) and n < 127 and pixels[i + n] == pixels[i]:
+            n += 1
+        if n == 1 and pixels[i] < 128:
+            data.append(pixels[i])
+        else:
+            data.extend([128 + n, pixels[i]])
+        i += n
+    return data
+
+
+# A SagaGfx file of bitmaps, each (palette, pixels) or None for no picture;
+# logic maps a room to its rules of (what, conditions, pnr), the conditions
+# being (loc, obj) pairs
+def gfx_file(size, images, logic=None, rooms=None):
+    rules = bytearray()
+    for (room, room_rules) in sorted((logic or {}).items()):
+        rules.extend([room, len(room_rules)])
+        for (what, conditions, pnr) in room_rules:
+            rules.append(what)
+            for (loc, obj) in conditions:
+                rules.extend([loc, obj])
+            rules.append(pnr)
+
+    data = bytearray(struct.pack('>hhBBB', size[0], size[1],
+                                 rooms or len(images), 0, 0))
+    start = len(data) + 1 + 3 * len(images) + 2 + len(rules)
+    hunk = bytearray()
+    data.append(len(images))
+    for image in images:
+        if image is None:
+            data.extend(struct.pack('>BH', 0, 0))
+            continue
+
+        offset = start + len(hunk)
+        data.extend(struct.pack('>BH', offset >> 16, offset & 0xffff))
+        (palette, pixels) = image
+        hunk.append(len(palette))
+        for rgb in palette:
+            hunk.extend(rgb)
+        pixels = rle_encode(pixels)
+        hunk.extend(struct.pack('>h', len(pixels)))
+        hunk.extend(pixels)
+
+    data.extend(struct.pack('>h', len(rules)))
+    data.extend(rules)
+    return bytes(data + hunk)
+
+
+# Imports one of the frontends, whose file names aren't module names
+def load_script(filename):
+    name = os.path.splitext(filename)[0].replace('-', '_')
+    path = os.path.join(ROOT, filename)
+    try:
+        import importlib.util
+    except ImportError:
+        import imp
+        return imp.load_source(name, path)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,130 @@
+import random
+import unittest
+
+from games import line, template
+from sagabatch import BatchSaga, ScalarBatch, numpy, random_commands
+
+# Parameters taken by the opcodes the random games use
+PARAMS = {
+    52: 1, 53: 1, 54: 1, 55: 1, 58: 1, 59: 1, 60: 1, 62: 2, 72: 2, 74: 1,
+    75: 2, 79: 1, 81: 1, 82: 1, 83: 1, 87: 1
+}
+OPCODES = [
+    0, 1, 2, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 64, 65, 67, 68, 69,
+    72, 74, 75, 76, 77, 78, 79, 80, 81, 82, 83, 84, 86, 87
+]
+VERBS = [2, 3, 4, 6, 7, 8, 9, 10, 12, 13, 14, 15, 16, 17, 18]
+
+
+def random_condition(rng):
+    cv = rng.randint(1, 19)
+    if cv in (4, 7):
+        return (cv, rng.randint(1, 4))
+    if cv in (8, 9):
+        return (cv, rng.randint(0, 6))
+    if cv in (15, 16, 19):
+        return (cv, rng.randint(0, 8))
+    return (cv, rng.randint(0, 11))
+
+
+def random_param(rng, act, n):
+    if act == 54:
+        return rng.randint(1, 4)
+    if act in (58, 60):
+        return rng.randint(0, 6)
+    if act in (79, 82, 83):
+        return rng.randint(0, 8)
+    if act in (81, 87):
+        return rng.randint(0, 15)
+    if act == 62 and n == 1:
+        return rng.choice([0, 1, 2, 3, 4, 255])
+    return rng.randint(0, 11)
+
+
+def random_line(rng, vocab, continuation=False):
+    while True:
+        conditions = [random_condition(rng) for i in range(0, rng.randint(0, 3))]
+        opcodes = [rng.choice(OPCODES) for i in range(0, rng.randint(1, 4))]
+        if rng.random() < 0.03:
+            opcodes[0] = 63
+        if continuation:
+            opcodes[-1] = 73
+        params = []
+        for act in opcodes:
+            params += [random_param(rng, act, n) for n in range(0, PARAMS.get(act, 0))]
+        if len(conditions) + len(params) <= 5:
+            return line(vocab, conditions, params, opcodes)
+
+
+# Chance lines, continuation blocks and verb lines in a random mix
+def random_game(seed, size=60):
+    rng = random.Random(seed)
+    actions = []
+    while len(actions) < size:
+        continuation = rng.random() < 0.3
+        if rng.random() < 0.4:
+            vocab = rng.choice([5, 10, 25, 50, 75, 100])
+        else:
+            vocab = rng.choice(VERBS) * 150 + rng.choice([0] + list(range(7, 20)))
+        actions.append(random_line(rng, vocab, continuation))
+        if continuation:
+            actions.extend([
+                random_line(rng, 0) for i in range(0, rng.randint(1, 3))
+            ])
+    return template(actions)
+
+
+@unittest.skipIf(numpy is None, 'needs NumPy')
+class BatchTest(unittest.TestCase):
+    def assertAgree(self, game, seeds, commands):
+        reference = ScalarBatch(game, seeds)
+        batch = BatchSaga(game, seeds, True)
+        for (turn, command) in enumerate([None] + commands):
+            if command is not None:
+                reference.step(command)
+                batch.step(command)
+            self.assertEqual(
+                numpy.array(reference.observe()).tolist(), batch.observe().tolist(),
+                'turn {0:d} {1!r}'.format(turn, command))
+            self.assertEqual(
+                [tuple(bool(n) for n in outcome) for outcome in reference.outcomes()],
+                [tuple(bool(n) for n in outcome) for outcome in batch.outcomes()])
+        return batch
+
+    def test_random_games(self):
+        for seed in range(0, 6):
+            game = random_game(seed)
+            self.assertAgree(game, list(range(0, 24)), random_commands(game, 120, seed))
+
+    def test_continuation_then_chance_lines(self):
+        game = template([
+            line(100, params=[1], opcodes=[58, 73]),
+            line(0, params=[2], opcodes=[58]),
+            line(10, params=[3], opcodes=[58]),
+            line(50, params=[4], opcodes=[58, 73]),
+            line(0, params=[5], opcodes=[60]),
+            line(25, params=[5], opcodes=[58]),
+            line(13 * 150, params=[1], opcodes=[60])
+        ])
+        batch = self.assertAgree(game, list(range(0, 40)), ['wai any'] * 10)
+        flags = batch.observe()[:, 4]
+        self.assertTrue(0 < ((flags & (1 << 3)) != 0).sum() < 40)
+
+    def test_dead_rows_play_on(self):
+        # Dying moves the player to limbo, the game goes on until quit
+        game = template([
+            line(20, conditions=[(7, 5)], opcodes=[61]),
+            line(50, conditions=[(4, 5)], params=[2], opcodes=[58, 73]),
+            line(0, params=[3], opcodes=[82]),
+            line(13 * 150, params=[1], opcodes=[54]),
+            line(5 * 150, opcodes=[63])
+        ])
+        seeds = list(range(0, 40))
+        batch = self.assertAgree(game, seeds, ['wai', 'n', 'wai', 'n', 'n'])
+        self.assertTrue((batch.dead & ~batch.ended).any())
+        batch = self.assertAgree(game, seeds, ['wai', 'n', 'qui', 'wai'])
+        self.assertTrue(batch.ended.all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from games import line, template, game
+from pyscottfree import Budget, BudgetExceeded
+from sagametrics import Metrics
+
+
+def play(saga, commands):
+    text = [saga.advance()]
+    for command in commands:
+        text.append(saga.advance(command))
+    return ''.join(text)
+
+
+class BudgetTest(unittest.TestCase):
+    # Six automatic lines every turn, then six GET KEY lines that fail
+    ACTIONS = [line(100) for i in range(0, 6)] + [
+        line(10 * 150 + 11, conditions=[(4, 5)]) for i in range(0, 6)
+    ]
+
+    # An automatic line continued by a hundred more, each setting a flag
+    LOOP = [line(100, opcodes=[73])] + [
+        line(0, params=[i % 32], opcodes=[58]) for i in range(0, 100)
+    ]
+
+    def test_within_budget_matches_unlimited(self):
+        saga = template(self.ACTIONS)
+        commands = ['get key', 'n', 'get key', 's']
+        plain = game(saga, 1)
+        limited = game(saga, 1)
+        limited.budget = Budget(8, 4096, 5.0)
+        self.assertEqual(play(limited, commands), play(plain, commands))
+        self.assertEqual(limited.save_state(), plain.save_state())
+
+    def test_first_auto_pass_is_limited(self):
+        saga = game(template(self.LOOP), 1)
+        saga.budget = Budget(10, None, None)
+        saga.metrics = Metrics()
+        text = saga.advance()
+        self.assertTrue('over its lines limit of 10' in text)
+        self.assertEqual(saga.metrics.counters['budget_lines'], 1)
+        self.assertEqual(saga.bit_flags & 0xffff, (1 << 9) - 1)
+
+        # The next turn starts with a fresh budget and stops in the same place
+        text = saga.advance('n')
+        self.assertTrue('over its lines limit of 10' in text)
+        self.assertEqual(saga.metrics.counters['budget_lines'], 2)
+        self.assertEqual(saga.player_room, 2)
+
+    def test_spend(self):
+        saga = game(template(self.LOOP), 1)
+        saga.budget = Budget(None, 10, None)
+        saga.start_budget()
+        saga.spend(0, 10)
+        self.assertRaises(BudgetExceeded, saga.spend, 0, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
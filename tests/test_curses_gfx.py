@@ -0,0 +1,107 @@
+import unittest
+
+from games import load_script
+
+try:
+    frontend = load_script('pyscottfree-curses.py')
+except ImportError:
+    frontend = None
+
+
+# Colour pairs as a terminal keeps them: remaking a pair recolours the cells
+# already drawn with it
+class Curses:
+    COLOR_PAIRS = 64
+    A_REVERSE = 1 << 16
+    error = Exception
+
+    def __init__(self):
+        self.colours = {0: (-1, -1)}
+
+    def init_pair(self, pair, fg, bg):
+        self.colours[pair] = (fg, bg)
+
+    def color_pair(self, pair):
+        return pair << 8
+
+
+class Window:
+    def __init__(self, curses, rows, columns):
+        self.curses = curses
+        self.size = (rows, columns)
+        self.attrs = [[None] * columns for y in range(0, rows)]
+
+    def getmaxyx(self):
+        return self.size
+
+    def addstr(self, y, x, text, attr):
+        self.attrs[y][x] = attr
+
+    # The colours on screen now
+    def colours(self):
+        screen = []
+        for row in self.attrs:
+            screen.append([])
+            for attr in row:
+                (fg, bg) = self.curses.colours[(attr & 0xffff) >> 8]
+                screen[-1].append(attr & self.curses.A_REVERSE and (bg, fg) or (fg, bg))
+        return screen
+
+
+class Gfx:
+    cache_size = 16
+
+    def get_scene(self, saga, id):
+        return (id, None, (), 0)
+
+
+# The frontend without its windows
+def bare_saga():
+    class BareSaga(frontend.CursesSaga):
+        def __init__(self):
+            pass
+    return BareSaga()
+
+
+@unittest.skipIf(frontend is None, 'needs curses and PIL')
+class ColourPairsTest(unittest.TestCase):
+    def setUp(self):
+        self.curses = frontend.curses = Curses()
+        saga = self.saga = bare_saga()
+        saga.options = 0
+        saga.gfx = Gfx()
+        saga.win_gfx = Window(self.curses, 8, 8)
+        saga.cells = {}
+        saga.cells_shown = None
+        saga.pairs = {}
+        saga.dirty = set()
+        saga.gfx_stats = {'looks': 0, 'cells': 0, 'bytes': 0}
+
+    def tearDown(self):
+        frontend.curses = __import__('curses')
+
+    # A picture using every pair of its colours, drawn over the last one
+    def picture(self, id, colours):
+        cells = [
+            [(colours[(y * 8 + x) % len(colours)],
+              colours[(y * 8 + x) // len(colours) % len(colours)])
+             for x in range(0, 8)]
+            for y in range(0, 8)
+        ]
+        self.saga.cells[((id, None, (), 0), (8, 8))] = cells
+        return cells
+
+    def test_pictures_keep_their_colours(self):
+        pictures = [
+            self.picture(1, [0, 1, 2, 3, 4, 5, 6, 7]),
+            self.picture(2, [8, 9, 10, 11, 12, 13, 14, 15]),
+            self.picture(3, [0, 2, 4, 6, 8, 10, 12, 14]),
+            self.picture(4, [0, 1, 2, 3, 4, 5, 6, 7])
+        ]
+        for (id, cells) in enumerate(pictures):
+            self.saga.display_image(id + 1)
+            self.assertEqual(self.saga.win_gfx.colours(), cells)
+
+
+if __name__ == '__main__':
+    unittest.main()
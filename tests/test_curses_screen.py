@@ -0,0 +1,133 @@
+import unittest
+
+from games import line, template, load_script
+from pyscottfree import Saga
+
+try:
+    frontend = load_script('pyscottfree-curses.py')
+except ImportError:
+    frontend = None
+
+
+class Stop(Exception):
+    pass
+
+
+class Curses:
+    error = Exception
+
+    def __init__(self):
+        self.updates = 0
+
+    def doupdate(self):
+        self.updates += 1
+
+    def echo(self):
+        pass
+
+    def noecho(self):
+        pass
+
+
+class Window:
+    def __init__(self, commands=()):
+        self.commands = list(commands)
+        self.text = []
+        self.erases = 0
+        self.refreshes = 0
+
+    def addstr(self, text):
+        self.text.append(text)
+
+    def erase(self):
+        self.text = []
+        self.erases += 1
+
+    def move(self, y, x):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def noutrefresh(self):
+        self.refreshes += 1
+
+    def getstr(self):
+        if not len(self.commands):
+            raise Stop()
+        return self.commands.pop(0).encode('ascii')
+
+
+# What a frontend would be asked to write, window by window, unbatched
+class RecordingSaga(Saga):
+    def __init__(self, commands):
+        self.commands = list(commands)
+        self.writes = []
+        Saga.__init__(self, 0, 1, 'test', None, False)
+
+    def output_write(self, str, win=1, scroll=True):
+        self.writes.append((win, str))
+        return self
+
+    def input_read(self, str='', win=1):
+        self.output(str, win, False)
+        if not len(self.commands):
+            raise Stop()
+        return self.commands.pop(0)
+
+
+def curses_saga(commands):
+    class BareSaga(frontend.CursesSaga):
+        def __init__(self):
+            self.win = [Window(), Window(commands)]
+            self.win_height = (10, 14)
+            self.dirty = set()
+            self.gfx = None
+            self.curses_up = False
+            Saga.__init__(self, 0, 1, 'test', None, False)
+    return BareSaga()
+
+
+def play(saga):
+    saga.share_database(template(ACTIONS))
+    try:
+        saga.game_loop()
+    except Stop:
+        pass
+    return saga
+
+
+ACTIONS = [line(6 * 150, opcodes=[64]), line(10, opcodes=[1])]
+COMMANDS = ['look', 'look', 'get lamp', 'n', 'look', 's', 'inv', 'xyzzy', 'look']
+
+
+@unittest.skipIf(frontend is None, 'needs curses')
+class CursesScreenTest(unittest.TestCase):
+    def setUp(self):
+        self.curses = frontend.curses = Curses()
+
+    def tearDown(self):
+        frontend.curses = __import__('curses')
+
+    def test_matches_unbatched(self):
+        saga = play(curses_saga(COMMANDS))
+        expected = play(RecordingSaga(COMMANDS))
+
+        transcript = ''.join([text for (win, text) in expected.writes if win == 1])
+        self.assertEqual(''.join(saga.win[1].text), transcript)
+        room = [text for (win, text) in expected.writes if win == 0][-1]
+        self.assertEqual(''.join(saga.win[0].text), room)
+
+    def test_one_update_per_prompt(self):
+        saga = play(curses_saga(COMMANDS))
+        self.assertEqual(self.curses.updates, len(COMMANDS) + 1)
+        for win in saga.win:
+            self.assertTrue(win.refreshes <= self.curses.updates)
+
+        # Looking at an unchanged room doesn't repaint it; the room is only
+        # drawn at the start and after GET LAMP, N and S
+        self.assertEqual(saga.win[0].erases, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from games import database, line
+from pyscottfree import Saga
+from sagaenv import SagaEnv, VecSagaEnv
+
+COMMANDS = ['get lamp', 'n', 'u', 'get sword', 'd', 's', 'e', 'drop sword', 'w']
+
+
+class EnvTest(unittest.TestCase):
+    # Sets the top flag on the first turn, then a flag at random
+    ACTIONS = [
+        line(100, params=[31], opcodes=[58]),
+        line(30, params=[5], opcodes=[58])
+    ]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'test.dat')
+        with open(self.filename, 'w') as file:
+            file.write(database(self.ACTIONS))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_matches_single_env(self):
+        envs = [SagaEnv(self.filename) for i in range(0, 3)]
+        expected = [[env.reset(seed=10 + i)] for (i, env) in enumerate(envs)]
+        for command in COMMANDS:
+            for (i, env) in enumerate(envs):
+                expected[i].append(env.step(command)[0])
+        self.assertTrue(expected[0][0][4] & (1 << 31))
+
+        vec = VecSagaEnv(self.filename, 3, workers=2)
+        try:
+            observed = [[list(o)] for o in vec.reset(seed=10)]
+            for command in COMMANDS:
+                observations = vec.step([command] * 3)[0]
+                for (i, observation) in enumerate(observations):
+                    observed[i].append(list(observation))
+        finally:
+            vec.close()
+        self.assertEqual(observed, expected)
+
+    def test_treasure_reward(self):
+        env = SagaEnv(self.filename)
+        env.reset(seed=1)
+        rewards = [env.step(command)[1] for command in COMMANDS]
+        self.assertEqual(sum(rewards), 1)
+        self.assertEqual(env.saga.items[7].location, 3)
+        self.assertFalse(env.saga.bit_flags & Saga.FLAG_LIGHT_OUT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+from games import gfx_file
+try:
+    from sagagfx import SagaGfx, GfxError
+except ImportError:     # PIL is not installed
+    SagaGfx = None
+
+SIZE = (24, 16)
+PALETTE = [(0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+
+
+# Just what get_scene() looks at
+class Item:
+    def __init__(self, location):
+        self.location = location
+
+
+class Player:
+    def __init__(self, room, locations):
+        self.player_room = room
+        self.items = [Item(location) for location in locations]
+
+
+# A room's picture rules interpreted straight from the file's values
+def reference_scene(id, rules, player):
+    (overlays, frames, cycle) = ((), (), 0)
+    for (what, conditions, pnr) in rules:
+        for (loc, obj) in conditions:
+            where = player.items[obj].location
+            found = (loc % 80 in (1, 3) and where == player.player_room) \
+                or (loc % 80 in (2, 3) and where == 255)
+            if found == (loc > 80):
+                break
+        else:
+            if pnr == 0:
+                return None
+            if pnr == 255:
+                break
+            action = what // 10
+            if action == 8:
+                id = pnr
+            elif action == 7:
+                cycle = pnr
+            elif action == 6:
+                overlays += (pnr,)
+            elif action == 5:
+                frames += (pnr,)
+    return (id, overlays, frames, cycle)
+
+
+def random_rules(rng, pictures):
+    rules = []
+    for i in range(0, rng.randint(1, 5)):
+        action = rng.choice([8, 8, 7, 6, 5])
+        conditions = [
+            (rng.choice([1, 2, 3, 81, 82, 83]), rng.randint(0, 5))
+            for j in range(0, rng.randint(0, 3))
+        ]
+        what = action == 8 and 80 + len(conditions) or action * 10 + len(conditions)
+        pnr = rng.choice([rng.randint(1, pictures - 1)] * 8 + [0, 255])
+        rules.append((what, conditions, pnr))
+    return rules
+
+
+def pixels(rng):
+    # Stripes, so the images have runs as well as single pixels
+    data = []
+    while len(data) < SIZE[0] * SIZE[1]:
+        data.extend([rng.randint(0, len(PALETTE) - 1)] * rng.choice([1, 1, 3, 40]))
+    return data[:SIZE[0] * SIZE[1]]
+
+
+@unittest.skipIf(SagaGfx is None, 'needs PIL')
+class GfxTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.path = tempfile.mkdtemp()
+        self.images = [(PALETTE, pixels(rng)) for i in range(0, 6)]
+        self.images[4] = None
+        self.gfx = self.open(gfx_file(SIZE, self.images))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def open(self, data, name='test.gfx', **kwargs):
+        filename = os.path.join(self.path, name)
+        with open(filename, 'wb') as file:
+            file.write(data)
+        kwargs.setdefault('cache_dir', None)
+        return SagaGfx(filename, **kwargs).read()
+
+    def assertImage(self, image, expected):
+        self.assertEqual(list(bytearray(image.tobytes())), expected[1])
+        self.assertEqual(
+            image.getpalette()[:3 * len(PALETTE)],
+            [c for rgb in expected[0] for c in rgb]
+        )
+
+    def test_read(self):
+        gfx = self.gfx
+        self.assertEqual(gfx.state, SagaGfx.STATE_OK)
+        self.assertEqual(gfx.size, SIZE)
+        self.assertEqual(gfx.num_rooms, len(self.images))
+        self.assertFalse(gfx.is_line_drawings())
+        for (i, expected) in enumerate(self.images):
+            if expected is None:
+                self.assertEqual(gfx.read_image(i), None)
+            else:
+                self.assertImage(gfx.read_image(i), expected)
+        self.assertEqual(gfx.read_image(len(self.images)), None)
+
+
+    def test_scenes(self):
+        rng = random.Random(2)
+        logic = dict((room, random_rules(rng, 6)) for room in range(1, 6))
+        gfx = self.open(gfx_file(SIZE, self.images, logic))
+        places = [1, 2, 3, 255, 0]
+        for i in range(0, 3000):
+            player = Player(
+                rng.randint(1, 3),
+                [rng.choice(places) for j in range(0, 6)]
+            )
+            room = rng.randint(0, 6)
+            expected = reference_scene(room, logic.get(room, ()), player)
+            self.assertEqual(gfx.get_scene(player, room), expected)
+            self.assertEqual(gfx.get_image_id(player, room), expected and expected[0])
+        self.assertEqual(gfx.get_scene(player, None), None)
+
+    def test_export(self):
+        cache = os.path.join(self.path, 'cache')
+        self.assertEqual(self.gfx.export(cache, jobs=2), len(self.images) - 1)
+
+        # A fresh reader finds the exported pictures for the same file only
+        gfx = self.open(gfx_file(SIZE, self.images), cache_dir=cache)
+        self.assertEqual(gfx.cache_path, os.path.join(cache, self.gfx.digest))
+        for (i, expected) in enumerate(self.images):
+            if expected is None:
+                self.assertEqual(gfx.get_image(i), None)
+            else:
+                self.assertImage(gfx.get_image(i), expected)
+                self.assertEqual(gfx.get_image(i).format, 'PNG')
+
+        images = list(self.images)
+        images[1] = images[2]
+        gfx = self.open(gfx_file(SIZE, images), 'other.gfx', cache_dir=cache)
+        self.assertEqual(gfx.cache_path, None)
+
+    def test_frames(self):
+        gfx = self.gfx
+
+        def composite(id, layers):
+            result = list(self.images[id][1])
+            for layer in layers:
+                for (i, pixel) in enumerate(self.images[layer][1]):
+                    if pixel:
+                        result[i] = pixel
+            return result
+
+        scene = (0, (1,), (2, 3, 5), 0)
+        self.assertTrue(gfx.is_animated(scene))
+        self.assertFalse(gfx.is_animated((0, (1,), (), 1)))
+        self.assertFalse(gfx.is_animated(None))
+        for frame in range(0, 7):
+            layers = (1, (2, 3, 5)[frame % 3])
+            image = gfx.get_frame(scene, frame)
+            self.assertEqual(list(bytearray(image.tobytes())), composite(0, layers))
+            self.assertTrue(gfx.get_frame(scene, frame) is image)
+
+        # Composites leave the pictures they're made from alone
+        self.assertImage(gfx.get_image(0), self.images[0])
+        self.assertTrue(gfx.get_frame((2, (), (), 0)) is gfx.get_image(2))
+        self.assertImage(gfx.get_frame((0, (4,), (), 0)), self.images[0])
+
+    def test_colour_cycling(self):
+        flat = [c for rgb in PALETTE for c in rgb]
+        self.assertEqual(self.gfx.get_palette((0, (), (), 1), 3), None)
+        for cycle in (2, 3, 4):
+            for tick in range(0, 9):
+                palette = self.gfx.get_palette((0, (), (), cycle), tick)
+                shift = tick % cycle
+                colours = PALETTE[1:1 + cycle]
+                colours = colours[shift:] + colours[:shift]
+                expected = PALETTE[:1] + colours + PALETTE[1 + cycle:]
+                self.assertEqual(
+                    palette[:len(flat)], [c for rgb in expected for c in rgb])
+        self.assertImage(self.gfx.get_image(0), self.images[0])
+
+    def cached(self, gfx, index):
+        with gfx.lock:
+            return index in gfx.images
+
+    def test_image_cache(self):
+        gfx = self.open(gfx_file(SIZE, self.images), cache_size=3)
+        for index in (0, 1, 2, 0, 3, 5, 0, 1):
+            image = gfx.get_image(index)
+            self.assertImage(image, self.images[index])
+            self.assertTrue(gfx.get_image(index) is image)
+            self.assertTrue(len(gfx.images) <= 3)
+        self.assertEqual(list(gfx.images.keys()), [5, 0, 1])
+        self.assertEqual(gfx.get_image(4), None)
+
+    def test_prefetch(self):
+        data = gfx_file(SIZE, self.images)
+        # The last picture cut off in its palette
+        gfx = self.open(data[:self.gfx.offsets[5] + 4], 'damaged.gfx')
+        self.assertRaises(GfxError, gfx.read_image, 5)
+
+        gfx.prefetch([5, 1, 2])
+        deadline = time.time() + 10
+        while not (self.cached(gfx, 1) and self.cached(gfx, 2)) \
+                and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertImage(gfx.get_image(1), self.images[1])
+        self.assertImage(gfx.get_image(2), self.images[2])
+        self.assertFalse(self.cached(gfx, 5))
+
+        # The worker carries on after the damaged picture
+        gfx.prefetch([3])
+        while not self.cached(gfx, 3) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertImage(gfx.get_image(3), self.images[3])
+        self.assertRaises(GfxError, gfx.get_image, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import random
+import unittest
+
+try:
+    from sagagfx import numpy, rle_decode, rle_decode_numpy
+except ImportError:     # PIL is not installed
+    numpy = None
+
+
+# Image data of single pixels and runs, empty runs included, then more
+def encode(rng, size, empty):
+    data = bytearray()
+    pixels = 0
+    while pixels < size + 8:
+        if rng.random() < empty:
+            data.extend([128, rng.randint(0, 255)])
+        elif rng.random() < 0.5:
+            data.append(rng.randint(0, 127))
+            pixels += 1
+        else:
+            n = rng.randint(1, 127)
+            data.extend([128 + n, rng.randint(0, 255)])
+            pixels += n
+    return data
+
+
+@unittest.skipIf(numpy is None, 'needs PIL and NumPy')
+class RLETest(unittest.TestCase):
+    def assertSame(self, data, pos, size):
+        (expected, expected_pos) = rle_decode(data, pos, size)
+        (actual, actual_pos) = rle_decode_numpy(data, pos, size)
+        self.assertEqual(bytearray(actual), bytearray(expected))
+        self.assertEqual(actual_pos, expected_pos)
+
+    def test_random_images(self):
+        rng = random.Random(0)
+        for i in range(0, 2000):
+            size = rng.randint(1, 300)
+            # Images start part way into the file
+            before = bytearray(rng.randint(0, 255) for j in range(0, rng.randint(0, 3)))
+            data = before + encode(rng, size, rng.choice([0, 0.1, 0.6]))
+            self.assertSame(data, len(before), size)
+
+    def test_truncated(self):
+        rng = random.Random(1)
+        for i in range(0, 500):
+            size = rng.randint(1, 300)
+            data = encode(rng, size, rng.choice([0, 0.1, 0.6]))
+            for end in range(0, len(data) + 1, rng.randint(1, 7)):
+                self.assertSame(data[:end], 0, size)
+        # Ending on a run header
+        self.assertSame(bytearray([3, 4, 130]), 0, 5)
+        self.assertSame(bytearray([130, 7, 128, 9, 131]), 0, 9)
+        self.assertEqual(rle_decode(bytearray([3, 130]), 0, 4), (bytearray([3, 0, 0, 0]), 2))
+
+    def test_empty_runs(self):
+        # Mostly empty runs, well over two bytes per pixel
+        data = bytearray([128, 5] * 20 + [3, 4, 130, 7, 9, 10])
+        self.assertSame(data, 0, 4)
+        self.assertSame(data, 0, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
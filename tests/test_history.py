@@ -0,0 +1,71 @@
+import unittest
+
+from games import line, template
+from pyscottfree import Saga
+from sagaenv import EnvSaga
+
+# SWITCH makes it dark, OPEN makes it light, and GET GOLD swaps the gold coin
+# and the stone
+ACTIONS = [
+    line(6 * 150, opcodes=[64]),
+    line(14 * 150, opcodes=[56, 64]),
+    line(7 * 150, opcodes=[57, 64]),
+    line(10 * 150 + 9, params=[3, 8], opcodes=[72])
+]
+COMMANDS = [
+    'get lamp', 'swi', 'n', 'get all', 's', 'ope', 'get gold', 'drop key',
+    'e', 'drop all', 'w', 'get apple', 'n', 'u'
+]
+
+
+class ShortSaga(EnvSaga):
+    history_size = 4
+
+
+def play(saga):
+    saga.share_database(template(ACTIONS, saga.options))
+    text = [saga.advance()]
+    states = [saga.save_state()]
+    for command in COMMANDS:
+        text.append(saga.advance(command))
+        states.append(saga.save_state())
+    return (''.join(text), states)
+
+
+class HistoryTest(unittest.TestCase):
+    def test_matches_unrecorded(self):
+        (text, states) = play(EnvSaga(Saga.FLAG_HISTORY, 1, 'test'))
+        self.assertEqual((text, states), play(EnvSaga(0, 1, 'test')))
+
+    def test_step_back_and_forward(self):
+        saga = EnvSaga(Saga.FLAG_HISTORY, 1, 'test')
+        (text, states) = play(saga)
+        self.assertEqual(len(saga.history), len(COMMANDS))
+
+        turn = len(COMMANDS)
+        for (command, steps) in ((':back 3', 3), (':back', 1), (':forward 2', 2),
+                                 (':back 5', 5), (':forward 9', 7), (':back 99', 14)):
+            saga.advance(command)
+            turn += command.startswith(':back') and -steps or steps
+            self.assertEqual(saga.save_state(), states[turn])
+
+        # A new command drops the turns stepped back over
+        saga.advance('get lamp')
+        self.assertEqual(saga.save_state(), states[1])
+        saga.advance(':forward')
+        self.assertEqual(saga.save_state(), states[1])
+
+    def test_history_size(self):
+        saga = ShortSaga(Saga.FLAG_HISTORY, 1, 'test')
+        (text, states) = play(saga)
+        self.assertEqual(len(saga.history), 4)
+        self.assertEqual(saga.history[-1].number, len(COMMANDS))
+
+        saga.advance(':back 10')
+        self.assertEqual(saga.save_state(), states[-5])
+        saga.advance(':forward 10')
+        self.assertEqual(saga.save_state(), states[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from games import line, template, game
+from pyscottfree import Saga
+
+# SWITCH makes it dark, OPEN with the lamp carried makes it light, and GET
+# GOLD swaps the gold coin and the stone
+ACTIONS = [
+    line(6 * 150, opcodes=[64]),
+    line(14 * 150, opcodes=[56, 64]),
+    line(7 * 150, conditions=[(1, 9)], opcodes=[57, 64]),
+    line(10 * 150 + 9, params=[3, 8], opcodes=[72])
+]
+COMMANDS = [
+    'look', 'swi', 'ope', 'get lamp', 'ope', 'n', 'get all', 's', 'get gold',
+    'drop key', 'e', 'drop all', 'w', 'n', 'u', 'look'
+]
+MORE = ['d', 's', 'get all', 'swi', 'look', 'ope', 'inv']
+
+
+def play(saga, commands):
+    return [(saga.advance(command), saga.save_state()) for command in commands]
+
+
+class HooksTest(unittest.TestCase):
+    def setUp(self):
+        self.template = template(ACTIONS)
+
+    def test_matches_unhooked(self):
+        plain = game(self.template, 1)
+        hooked = game(self.template, 1)
+        calls = dict((hook, []) for hook in Saga.HOOKS)
+        callbacks = {}
+        for hook in Saga.HOOKS:
+            callbacks[hook] = (lambda hook: lambda saga, *args: calls[hook].append(args))(hook)
+            hooked.add_hook(hook, callbacks[hook])
+
+        start = [item.location for item in hooked.items]
+        expected = play(plain, [None] + COMMANDS)
+        self.assertEqual(play(hooked, [None] + COMMANDS), expected)
+
+        # The moves and rooms seen add up to where the game ended
+        for (item, old, new) in calls[Saga.HOOK_ITEM]:
+            self.assertEqual(start[item], old)
+            start[item] = new
+        self.assertEqual(start, [item.location for item in plain.items])
+        rooms = [1] + [new for (old, new) in calls[Saga.HOOK_ROOM]]
+        self.assertEqual(rooms, [1, 2, 1, 3, 1, 2, 4])
+
+        lines = [line for (line, action) in calls[Saga.HOOK_LINE]]
+        self.assertEqual(lines.count(0), COMMANDS.count('look'))
+        self.assertEqual(lines.count(2), COMMANDS.count('ope'))
+        self.assertEqual(calls[Saga.HOOK_CONDITION], [(2, 0, 1, 9, False), (2, 0, 1, 9, True)])
+        self.assertTrue((1, 56) in calls[Saga.HOOK_OPCODE])
+        self.assertTrue((3, 72) in calls[Saga.HOOK_OPCODE])
+
+        # Without hooks the game runs the plain methods again
+        for hook in Saga.HOOKS:
+            hooked.remove_hook(hook, callbacks[hook])
+        self.assertEqual(hooked.hooks, None)
+        for name in ('perform_actions', 'perform_line', 'move_item'):
+            self.assertFalse(name in vars(hooked))
+
+        count = sum([len(args) for args in calls.values()])
+        self.assertEqual(play(hooked, MORE), play(plain, MORE))
+        self.assertEqual(sum([len(args) for args in calls.values()]), count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from games import database, line
+from pyscottfree import Saga
+from sagalibrary import SagaLibrary
+
+
+# Loading 'slow' waits until the test lets it finish
+class SlowLibrary(SagaLibrary):
+    def __init__(self, *args, **kwargs):
+        SagaLibrary.__init__(self, *args, **kwargs)
+        self.started = threading.Event()
+        self.finish = threading.Event()
+
+    def load(self, name):
+        if name == 'slow':
+            self.started.set()
+            self.finish.wait(10)
+        return SagaLibrary.load(self, name)
+
+
+class LibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for name in ('test', 'slow'):
+            with open(os.path.join(self.path, name + '.dat'), 'w') as file:
+                file.write(database([line(13 * 150)]))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_open_options(self):
+        library = SagaLibrary(self.path, options=Saga.FLAG_YOUARE)
+        self.assertEqual(library.open('test').options, Saga.FLAG_YOUARE)
+        self.assertEqual(library.open('test', options=0).options, 0)
+        self.assertEqual(
+            library.open('test', options=Saga.FLAG_TRS80_STYLE).options,
+            Saga.FLAG_TRS80_STYLE)
+
+    def test_close_twice(self):
+        library = SagaLibrary(self.path, budget=0)
+        (first, second) = (library.open('test'), library.open('test'))
+        self.assertTrue(library.close(first))
+        self.assertFalse(library.close(first))
+        self.assertEqual(library.stats()['sessions'], 1)
+
+        # The game stays loaded while the second session plays it
+        library.evict()
+        self.assertEqual(library.stats()['games'], 1)
+        self.assertTrue(library.close(second))
+        self.assertEqual(library.stats()['games'], 0)
+
+    def test_missing_game(self):
+        library = SagaLibrary(self.path)
+        for i in range(0, 2):
+            self.assertRaises(IOError, library.open, 'missing')
+        self.assertEqual(library.loading, {})
+
+    def test_load_outside_lock(self):
+        library = SlowLibrary(self.path)
+        library.close(library.open('test'))
+        sessions = []
+
+        def open_slow():
+            sessions.append(library.open('slow'))
+
+        threads = [threading.Thread(target=open_slow) for i in range(0, 3)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(library.started.wait(10))
+
+        # Games already loaded are served while another game loads
+        library.close(library.open('test'))
+        self.assertEqual(library.stats()['hits'], 1)
+
+        library.finish.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(sessions), 3)
+        stats = library.stats()
+        self.assertEqual((stats['misses'], stats['hits']), (2, 3))
+        self.assertEqual(stats['sessions'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from games import line, template
+from sagamc import Analysis, Outcome
+
+
+class AnalysisTest(unittest.TestCase):
+    def test_win_rates_of_zero(self):
+        game = template([line(50, params=[1], opcodes=[58]), line(13 * 150)])
+        analysis = Analysis(game, ['wai'])
+        analysis.outcomes = [
+            Outcome(seed, False, False, False, 1, None, {0: 1}) for seed in range(0, 4)
+        ]
+        (summary,) = analysis.summary()['lines']
+        self.assertEqual(summary['won_fired'], 0.0)
+        self.assertEqual(summary['won_unfired'], None)
+
+    def test_played_here(self):
+        game = template([line(50, params=[1], opcodes=[58]), line(13 * 150)])
+        summary = Analysis(game, ['wai', 'wai']).run_here(list(range(0, 20))).summary()
+        self.assertEqual(summary['games'], 20)
+        self.assertEqual(summary['turns']['1.0'], 2)
+        self.assertTrue(0 < summary['lines'][0]['games'] < 1)
+        self.assertEqual(summary['lines'][0]['won_fired'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
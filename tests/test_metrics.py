@@ -0,0 +1,49 @@
+import unittest
+
+from games import line, template, game
+from sagametrics import Exporter, Histogram, Metrics, PrometheusExporter
+
+COMMANDS = ['get lamp', 'n', 's', 'e', 'inv', 'get all', 'drop all', 'look', 'w']
+
+
+def play(saga):
+    text = [saga.advance()]
+    for command in COMMANDS:
+        text.append(saga.advance(command))
+    return (''.join(text), saga.save_state())
+
+
+class MetricsTest(unittest.TestCase):
+    ACTIONS = [line(50, params=[1], opcodes=[58])]
+
+    def test_matches_unmetered(self):
+        saga = template(self.ACTIONS)
+        metrics = Metrics()
+        plain = game(saga, 1)
+        metered = game(saga, 1)
+        metered.metrics = metrics
+        self.assertEqual(play(metered), play(plain))
+
+        self.assertEqual(metrics.counters['turns'], len(COMMANDS) + 1)
+        for phase in ('parse', 'command', 'flush', 'turn'):
+            self.assertTrue(metrics.histograms[phase].count >= len(COMMANDS), phase)
+
+        text = PrometheusExporter().export(metrics)
+        self.assertTrue('scottfree_turns_total {0:d}\n'.format(
+            len(COMMANDS) + 1) in text)
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for value in range(1, 10001):
+            histogram.record(value)
+        for q in (0.5, 0.9, 0.99):
+            self.assertTrue(abs(histogram.percentile(q) - q * 10000) <= q * 10000 / 32)
+        self.assertEqual(histogram.percentile(1.0), 10000)
+        self.assertEqual(histogram.count, 10000)
+
+    def test_exporter_is_abstract(self):
+        self.assertRaises(TypeError, Exporter)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from games import line, template, game
+
+
+# The automatic lines as the original table scan ran them, with verb 0
+def baseline_occurrences(saga):
+    do_again = False
+    for action in saga.actions:
+        vv = nv = action.vocab
+        if vv != 0:
+            do_again = False
+
+        nv %= 150
+        vv //= 150
+        if vv == 0 or (do_again and action.vocab == 0):
+            if (vv == 0 and saga.random_percent(nv)) or do_again:
+                if saga.perform_line(action) == 2:
+                    do_again = True
+
+
+def state(saga):
+    return (
+        saga.player_room, saga.bit_flags, saga.current_counter, saga.light_time,
+        [item.location for item in saga.items], saga.random.getstate()
+    )
+
+
+class OccurrencesTest(unittest.TestCase):
+    # A line that always runs and continues, its continuation, then a 10%
+    # line that kills the player, a 50% line and another continuation block
+    ACTIONS = [
+        line(100, params=[1], opcodes=[58, 73]),
+        line(0, params=[2], opcodes=[58]),
+        line(10, opcodes=[61]),
+        line(50, params=[3], opcodes=[58, 73]),
+        line(0, params=[4], opcodes=[58]),
+        line(2 * 150 + 1, params=[5], opcodes=[58]),
+        line(0, params=[6], opcodes=[58])
+    ]
+
+    def test_matches_baseline(self):
+        saga = template(self.ACTIONS)
+        for seed in range(0, 50):
+            (new, old) = (game(saga, seed), game(saga, seed))
+            for turn in range(0, 20):
+                new.perform_occurrences()
+                baseline_occurrences(old)
+                self.assertEqual(state(new), state(old), 'seed {0:d}'.format(seed))
+
+    def test_chance_line_ends_continuation(self):
+        saga = template(self.ACTIONS)
+        died = 0
+        for seed in range(0, 50):
+            player = game(saga, seed)
+            player.perform_occurrences()
+            self.assertTrue(player.bit_flags & (1 << 2))
+            self.assertFalse(player.bit_flags & (1 << 6))
+            died += player.dead and 1 or 0
+        self.assertTrue(0 < died < 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from games import VERBS, NOUNS, line, template, game
+from pyscottfree import Saga
+
+WORDS = [
+    'n', 'N', 's', 'e', 'w', 'u', 'd', 'i', 'x', 'north', 'NORTH', 'nor', 'up',
+    'go', 'Go', 'get', 'take', 'TAKE', 'put', 'drop', 'inv', 'inventory',
+    'look', 'lookup', 'lo', 'xyzzy', '', 'lamp', 'lam', 'gold', 'any', 'aut'
+]
+
+
+# Word ids as the original get_input() found them, scanning the word lists
+def baseline(saga, verb, noun=None):
+    if noun is None and len(verb) == 1:
+        for (k, v) in saga.shortforms.items():
+            if k == verb.lower():
+                verb = v
+                break
+
+    noun_id = saga.which_word(verb, saga.nouns)
+    if noun_id >= 1 and noun_id <= 6:
+        verb_id = 1
+    else:
+        verb_id = saga.which_word(verb, saga.verbs)
+        noun_id = saga.which_word(noun, saga.nouns)
+    return (verb_id, noun_id)
+
+
+class ParseTest(unittest.TestCase):
+    def setUp(self):
+        self.template = template([line(6 * 150, opcodes=[64])])
+
+    def test_matches_baseline(self):
+        saga = game(self.template, 1)
+        words = WORDS + VERBS + NOUNS
+        for verb in words:
+            for noun in [None] + words:
+                if not len(verb):
+                    continue
+                expected = baseline(saga, verb, noun)
+                for i in range(0, 2):
+                    command = saga.parse_command(verb, noun)
+                    self.assertEqual(command[:2], expected)
+                    self.assertEqual(command.noun_text, noun)
+
+                if command.verb_id == -1:
+                    self.assertEqual(command.unknown, 0)
+                elif noun and command.noun_id == -1:
+                    self.assertEqual(command.unknown, 1)
+                else:
+                    self.assertEqual(command.unknown, -1)
+
+    def test_cache(self):
+        saga = game(self.template, 1)
+        other = game(self.template, 2)
+        self.assertTrue(saga.parse_cache is other.parse_cache)
+
+        saga.parse_command('GET', 'LAMPS')
+        self.assertEqual(len(saga.parse_cache), 1)
+        command = other.parse_command('get', 'lamp')
+        self.assertEqual(command, (10, 7, 'lamp', -1))
+        self.assertEqual(len(other.parse_cache), 1)
+
+        for i in range(0, Saga.PARSE_CACHE_SIZE + 10):
+            saga.parse_command('get', 'x{0:d}'.format(i))
+        self.assertTrue(len(saga.parse_cache) <= Saga.PARSE_CACHE_SIZE)
+        self.assertEqual(saga.parse_command('get', 'lamp'), command)
+
+
+if __name__ == '__main__':
+    unittest.main()
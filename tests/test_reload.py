@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from games import line, database, template, game
+from pyscottfree import Saga
+
+ACTIONS = [line(6 * 150, opcodes=[64])]
+
+
+class ReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'test.dat')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    # A game with the lamp carried, the key destroyed and the rope moved
+    def played(self):
+        saga = game(template(ACTIONS), 1)
+        saga.advance()
+        saga.advance('get lamp')
+        saga.move_item(0, Saga.LOC_DESTROYED)
+        saga.move_item(5, 4)
+        return saga
+
+    def test_reload_keeps_state(self):
+        saga = self.played()
+        locations = [item.location for item in saga.items]
+        self.assertEqual(locations[9], Saga.LOC_CARRIED)
+        self.assertEqual(locations[0], Saga.LOC_DESTROYED)
+
+        with open(self.filename, 'w') as file:
+            file.write(database(ACTIONS).replace('"Lamp/LAM/"', '"Brass lamp/LAM/"'))
+        saga.filename = self.filename
+        self.assertTrue(saga.reload_database())
+
+        self.assertEqual([item.location for item in saga.items], locations)
+        self.assertEqual(saga.items[9].text, 'Brass lamp')
+        self.assertEqual(saga.carried, 1)
+        self.assertEqual(saga.player_room, 1)
+        saga.advance('drop lamp')
+        self.assertTrue('Brass lamp' in saga.advance('look'))
+
+    def test_fewer_rooms(self):
+        saga = self.played()
+        tables = template(ACTIONS)
+        tables.rooms = tables.rooms[:4]
+        problems = saga.swap_database(tables)
+
+        self.assertEqual(problems, ['rooms 6 -> 4', 'item 5 returned to room 3'])
+        self.assertEqual(saga.items[9].location, Saga.LOC_CARRIED)
+        self.assertEqual(saga.items[0].location, Saga.LOC_DESTROYED)
+        self.assertEqual(saga.items[5].location, 3)
+        self.assertEqual(saga.carried, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+from games import line, template
+from pyscottfree import Saga, StringIO
+from sagaenv import EnvSaga
+
+
+# The room description as the original look() wrote it
+class BaselineSaga(EnvSaga):
+    def look(self):
+        strings = self.strings
+        if self.bit_flags & Saga.FLAG_DARK \
+                and self.items[Saga.ITEM_LIGHT].location != Saga.LOC_CARRIED \
+                and self.items[Saga.ITEM_LIGHT].location != self.player_room:
+            self.output(strings['too dark'], 0, False)
+            if self.options & Saga.FLAG_TRS80_STYLE:
+                self.output(strings['trs80 line'], 0, False)
+            return
+
+        r = self.rooms[self.player_room]
+        if r.text.startswith('*'):
+            self.output(r.text[1:] + '\n', 0, False)
+        else:
+            self.output(strings['look'].format(r.text), 0, False)
+
+        exits = [
+            strings['exit names'][i] for (i, exit) in enumerate(r.exits) if exit != 0
+        ]
+        exits = len(exits) and ', '.join(exits) or strings['none']
+        self.output(strings['exits'].format(exits), 0, False)
+
+        items = [item.text for item in self.items if item.location == self.player_room]
+        if len(items):
+            separator = strings['list separator']
+            lines = [strings['also see']]
+            for item in items:
+                if len(lines[-1]) + len(item) > self.width - 10:
+                    lines.append('')
+                lines[-1] += item + separator
+            lines = '\n'.join(lines)
+            if not self.options & Saga.FLAG_TRS80_STYLE:
+                lines = lines[:-len(separator)]
+            self.output(lines + '\n', 0, False)
+
+        if self.options & Saga.FLAG_TRS80_STYLE:
+            self.output(strings['trs80 line'], 0, False)
+
+
+# Records the events and how often the room was scanned
+class EventSaga(EnvSaga):
+    def __init__(self, *args):
+        self.events = []
+        self.scans = 0
+        EnvSaga.__init__(self, *args)
+
+    def emit(self, event, *args):
+        self.events.append((event,) + args)
+        return EnvSaga.emit(self, event, *args)
+
+    def room_contents(self):
+        self.scans += 1
+        return EnvSaga.room_contents(self)
+
+
+# SWITCH makes it dark, OPEN makes it light, and GET GOLD swaps the gold coin
+# and the stone, both moving items in other rooms
+ACTIONS = [
+    line(6 * 150, opcodes=[64]),
+    line(14 * 150, opcodes=[56, 64]),
+    line(7 * 150, opcodes=[57, 64]),
+    line(10 * 150 + 9, params=[3, 8], opcodes=[72])
+]
+COMMANDS = [
+    'look', 'swi', 'look', 'get lamp', 'n', 'drop lamp', 'look', 's', 'look',
+    'n', 'get lamp', 's', 'ope', 'get all', 'look', 'drop all', 'get gold',
+    'look', 'e', 'w', 'n', 'u', 'get all', 'look', 'd', 'look'
+]
+
+
+def play(saga):
+    saga.share_database(template(ACTIONS, saga.options))
+    text = [saga.advance()]
+    for command in COMMANDS:
+        text.append(saga.advance(command))
+    return ''.join(text)
+
+
+# Restoring a save and reloading the tables put items back without moving
+# them, so neither may show a cached room
+def restore(saga):
+    saga.share_database(template(ACTIONS, saga.options))
+    text = [saga.advance(), saga.advance('look')]
+    state = saga.save_state()
+    text.extend([saga.advance('get lamp'), saga.advance('get key')])
+    saga.restore_state(StringIO(state))
+    text.append(saga.advance('look'))
+
+    tables = template(ACTIONS, saga.options)
+    tables.items[9].text = 'Brass lamp'
+    saga.swap_database(tables)
+    text.append(saga.advance('look'))
+    return ''.join(text)
+
+
+class RoomTest(unittest.TestCase):
+    def test_matches_baseline(self):
+        for options in (0, Saga.FLAG_YOUARE | Saga.FLAG_TRS80_STYLE):
+            self.assertEqual(
+                play(EnvSaga(options, 1, 'test')),
+                play(BaselineSaga(options, 1, 'test'))
+            )
+
+    def test_invalidation(self):
+        text = restore(EnvSaga(0, 1, 'test'))
+        self.assertEqual(text, restore(BaselineSaga(0, 1, 'test')))
+        self.assertTrue('Brass lamp' in text)
+
+    def test_room_events(self):
+        saga = EventSaga(0, 1, 'test')
+        play(saga)
+        rooms = [event for event in saga.events if event[0] == Saga.EVENT_ROOM]
+        self.assertTrue(len(rooms) > COMMANDS.count('look'))
+        self.assertTrue((Saga.EVENT_ROOM, 1, True, (), ()) in rooms)
+        self.assertTrue((Saga.EVENT_ROOM, 3, False, (3,), (5, 10)) in rooms)
+
+        replay = EventSaga(0, 1, 'test')
+        replay.cache_room = lambda view, text, contents: replay
+        play(replay)
+        self.assertEqual(saga.events, replay.events)
+
+        # Looking again at an unchanged room doesn't scan the items
+        self.assertTrue(saga.scans < replay.scans)
+        saga.scans = 0
+        for i in range(0, 5):
+            saga.look()
+        self.assertEqual(saga.scans, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from sagasave import SaveStore, SQLiteSaveStore
+
+
+class SQLiteSaveStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'saves.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    # What another process would find on disk
+    def stored(self):
+        db = sqlite3.connect(self.filename)
+        try:
+            return dict(
+                ((user, slot), data) for (user, slot, data)
+                in db.execute('SELECT user, slot, data FROM saves')
+            )
+        finally:
+            db.close()
+
+    def test_save_committed_before_return(self):
+        store = SQLiteSaveStore(self.filename, batch_size=64, batch_time=0.5)
+        try:
+            store.save('ann', 'test', 'a', 'one')
+            self.assertEqual(self.stored(), {('ann', 'a'): 'one'})
+            store.save('ann', 'test', 'a', 'two')
+            self.assertEqual(self.stored(), {('ann', 'a'): 'two'})
+            self.assertEqual(store.load('ann', 'test', 'a'), 'two')
+        finally:
+            store.close()
+
+    def test_saves_from_threads(self):
+        store = SQLiteSaveStore(self.filename, batch_size=8, batch_time=0.01)
+
+        def worker(n):
+            for i in range(0, 20):
+                store.save('user{0:d}'.format(n), 'test', str(i % 3), str(i))
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(0, 6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = dict(
+            (('user{0:d}'.format(n), str(i % 3)), str(i))
+            for n in range(0, 6) for i in range(17, 20)
+        )
+        self.assertEqual(self.stored(), expected)
+        self.assertTrue(store.delete('user0', 'test', '0'))
+        self.assertEqual(store.slots('user0', 'test'), ['1', '2'])
+        store.close()
+
+    def test_store_is_abstract(self):
+        self.assertRaises(TypeError, SaveStore)
+
+        class PartialStore(SaveStore):
+            def save(self, user, game, slot, data):
+                pass
+
+        self.assertRaises(TypeError, PartialStore)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from games import line, template
+from pyscottfree import Saga, resolve_strings, string_tables
+from sagaenv import EnvSaga
+
+ACTIONS = [line(6 * 150, opcodes=[64])]
+OPTIONS = [0, Saga.FLAG_YOUARE, Saga.FLAG_SCOTTLIGHT | Saga.FLAG_TRS80_STYLE]
+PACK = {
+    'dead': ['Je suis mort.\n', 'Vous etes mort.\n'],
+    'ok': "D'accord. ",
+    'exit names': ['Nord', 'Sud', 'Est', 'Ouest', 'Haut', 'Bas']
+}
+
+
+class StringsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.pack = os.path.join(self.path, 'pack.json')
+        with open(self.pack, 'w') as file:
+            json.dump(PACK, file)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_cached_matches_fresh(self):
+        for pack in (None, self.pack):
+            for options in OPTIONS:
+                for width in (40, 80):
+                    cached = resolve_strings(options, width, pack)
+                    string_tables.clear()
+                    self.assertEqual(cached, resolve_strings(options, width, pack))
+
+        strings = resolve_strings(Saga.FLAG_TRS80_STYLE, 40)
+        self.assertEqual(strings['trs80 line'], '\n<' + '-' * 36 + '>\n')
+        self.assertEqual(strings['list separator'], '. ')
+        self.assertEqual(strings['look'], "I'm in a {0}\n")
+
+    def test_pack(self):
+        for (options, dead) in ((0, 'Je suis mort.\n'), (Saga.FLAG_YOUARE, 'Vous etes mort.\n')):
+            strings = resolve_strings(options, 64, self.pack)
+            self.assertEqual(strings['dead'], dead)
+            self.assertEqual(strings['ok'], "D'accord. ")
+            self.assertEqual(strings['none'], resolve_strings(options, 64)['none'])
+
+        class PackSaga(EnvSaga):
+            string_pack = self.pack
+
+        tables = template(ACTIONS)
+        saga = PackSaga(0, 1, 'test')
+        saga.share_database(tables)
+        self.assertTrue('Obvious exits: Nord, Est.' in saga.advance())
+        self.assertTrue(saga.advance('get lamp').startswith("D'accord. "))
+
+    def test_own_copy(self):
+        first = template(ACTIONS)
+        first.strings['none'] = 'nothing'
+        first.strings['exit names'][0] = 'Up north'
+        second = template(ACTIONS, first.options)
+        self.assertEqual(second.strings['none'], 'none')
+        self.assertEqual(second.strings['exit names'][0], 'North')
+        self.assertEqual(resolve_strings(0, second.width)['none'], 'none')
+
+    def test_option_flag(self):
+        saga = template(ACTIONS, Saga.FLAG_YOUARE)
+        self.assertEqual(saga.string('look'), 'You are {0}\n')
+        self.assertEqual(saga.string('look', Saga.FLAG_YOUARE), 'You are {0}\n')
+        self.assertEqual(saga.string('look', Saga.FLAG_TRS80_STYLE), "I'm in a {0}\n")
+        self.assertEqual(saga.string('ok', Saga.FLAG_YOUARE), 'O.K. ')
+
+        saga = template(ACTIONS)
+        self.assertEqual(saga.string('list separator', Saga.FLAG_TRS80_STYLE), ' - ')
+        saga.string_pack = self.pack
+        self.assertEqual(saga.string('dead', Saga.FLAG_YOUARE), 'Je suis mort.\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
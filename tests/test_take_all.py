@@ -0,0 +1,98 @@
+import unittest
+
+from games import line, template
+from pyscottfree import Saga
+from sagaenv import EnvSaga
+
+
+# TAKE ALL / DROP ALL as the original item scan ran them
+class BaselineSaga(EnvSaga):
+    def get_all(self, verb_id):
+        taken = False
+        for (i, item) in enumerate(self.items):
+            if item.location == self.player_room and len(item.auto_get) \
+                    and not item.auto_get.startswith('*'):
+                noun_id = self.which_word(item.auto_get, self.nouns)
+                self.perform_actions(verb_id, noun_id, False)
+                if self.count_items(Saga.LOC_CARRIED) == self.max_carry:
+                    self.emit(Saga.EVENT_STRING, 'overloaded')
+                    return 0
+
+                self.move_item(i, Saga.LOC_CARRIED)
+                self.redraw = True
+                self.emit(Saga.EVENT_STRING, 'take', item.text)
+                taken = True
+
+        if not taken:
+            self.emit(Saga.EVENT_STRING, 'nothing taken')
+        return 0
+
+    def drop_all(self, verb_id):
+        dropped = False
+        for (i, item) in enumerate(self.items):
+            if item.location == Saga.LOC_CARRIED and len(item.auto_get) \
+                    and not item.auto_get.startswith('*'):
+                noun_id = self.which_word(item.auto_get, self.nouns)
+                self.perform_actions(verb_id, noun_id, False)
+                self.move_item(i, self.player_room)
+                self.emit(Saga.EVENT_STRING, 'drop', item.text)
+                self.redraw = True
+                dropped = True
+
+        if not dropped:
+            self.emit(Saga.EVENT_STRING, 'nothing dropped')
+        return 0
+
+
+def play(saga, commands):
+    text = [saga.advance()]
+    for command in commands:
+        text.append(saga.advance(command))
+    return (''.join(text), [item.location for item in saga.items])
+
+
+class TakeAllTest(unittest.TestCase):
+    # GET KEY only prints a message, GET APPLE destroys the apple and
+    # DROP BOOK puts the book in the vault
+    ACTIONS = [
+        line(10 * 150 + 11, opcodes=[2]),
+        line(10 * 150 + 14, params=[6], opcodes=[59]),
+        line(18 * 150 + 12, params=[4, 3], opcodes=[62])
+    ]
+    COMMANDS = ['get all', 'n', 'drop all', 'get all', 's', 'e', 'get all']
+
+    def start(self, obj_type, options):
+        saga = obj_type(options, 1, 'test')
+        saga.share_database(template(self.ACTIONS))
+        return saga
+
+    def test_default_matches_baseline(self):
+        self.assertEqual(
+            play(self.start(EnvSaga, 0), self.COMMANDS),
+            play(self.start(BaselineSaga, 0), self.COMMANDS)
+        )
+
+    def test_default_takes_handled_items(self):
+        saga = self.start(EnvSaga, 0)
+        text = play(saga, ['get all'])[0]
+        self.assertTrue('Nothing happens.' in text)
+        for i in (0, 4, 6, 9, 11):
+            self.assertEqual(saga.items[i].location, Saga.LOC_CARRIED)
+
+    def test_tidy_leaves_handled_items(self):
+        saga = self.start(EnvSaga, Saga.FLAG_TIDY_ALL)
+        play(saga, ['get all'])
+        self.assertEqual(saga.items[0].location, 1)
+        self.assertEqual(saga.items[6].location, Saga.LOC_DESTROYED)
+        for i in (4, 9, 11):
+            self.assertEqual(saga.items[i].location, Saga.LOC_CARRIED)
+
+        play(saga, ['drop all'])
+        self.assertEqual(saga.items[4].location, 3)
+        for i in (9, 11):
+            self.assertEqual(saga.items[i].location, 1)
+        self.assertEqual(saga.count_carried(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import time
+import unittest
+
+from games import load_script
+
+try:
+    tk = load_script('pyscottfree-tk.py')
+except ImportError:
+    tk = None
+
+
+# Tk's timers, run by hand
+class Root:
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.timers[self.next_id] = callback
+        return self.next_id
+
+    def after_cancel(self, id):
+        del self.timers[id]
+
+    def run(self, limit=500):
+        while len(self.timers) and limit:
+            limit -= 1
+            time.sleep(0.002)
+            timers = list(self.timers.items())
+            self.timers.clear()
+            for (id, callback) in timers:
+                callback()
+
+
+class Gfx:
+    num_rooms = 4
+    num_action89 = 0
+    num_extended = 0
+    size = (1024, 768)
+    cache_size = 8
+
+    def get_frame(self, scene, frame):
+        return tk.Image.new('P', (256, 192), scene[0])
+
+
+# The frontend without its windows
+def bare_saga():
+    class BareSaga(tk.TkSaga):
+        def __init__(self):
+            pass
+    return BareSaga()
+
+
+@unittest.skipIf(tk is None, 'needs Tk and PIL')
+class ResizeTest(unittest.TestCase):
+    def setUp(self):
+        saga = self.saga = bare_saga()
+        saga.root = Root()
+        saga.gfx = Gfx()
+        saga.canvas_size = None
+        saga.tick = 0
+        saga.scaled = {}
+        saga.shown = None
+        saga.pending = None
+        saga.resized = tk.queue.Queue()
+        saga.poller = None
+        saga.resize_filter = tk.Image.NEAREST
+        saga.drawn = []
+        saga.draw_image = lambda key, image: saga.drawn.append(key)
+
+    def test_overlapping_resizes_share_one_poller(self):
+        saga = self.saga
+        for room in (1, 2, 3):
+            saga.scene = (room, None, (), 0)
+            saga.show_image()
+            self.assertEqual(len(saga.root.timers), 1)
+
+        saga.root.run()
+        self.assertEqual(saga.root.timers, {})
+        self.assertEqual(saga.poller, None)
+        self.assertEqual(saga.pending, None)
+        self.assertEqual([key[0][0] for key in saga.drawn], [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
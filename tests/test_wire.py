@@ -0,0 +1,76 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from games import database, line
+from sagalibrary import SagaLibrary
+from sagawire import SagaWireServer, encode, decode
+
+
+class WireTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.games = os.path.join(self.root, 'games')
+        os.mkdir(self.games)
+        with open(os.path.join(self.games, 'test.dat'), 'w') as file:
+            file.write(database([line(13 * 150, opcodes=[1])]))
+        # Databases outside the library that clients must not reach
+        with open(os.path.join(self.root, 'secret.dat'), 'w') as file:
+            file.write(database([line(13 * 150, opcodes=[2])]))
+
+        self.server = SagaWireServer(('localhost', 0), SagaLibrary(self.games))
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+
+    def send(self, hello):
+        sock = socket.create_connection(self.server.server_address)
+        try:
+            sock.sendall(encode(hello))
+            return decode(sock.makefile('rb').readline())
+        finally:
+            sock.close()
+
+    def hello(self, game):
+        return self.send({'game': game, 'mode': 'ids'})
+
+    def test_game_in_library(self):
+        self.assertEqual(self.hello('test')[0], 'tables')
+
+    def test_paths_rejected(self):
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        try:
+            for game in (
+                '../secret', '../secret.dat', os.path.join(self.root, 'secret.dat'),
+                'games/test', 'secret', 'secret.dat', '..', '', 5
+            ):
+                reply = self.hello(game)
+                self.assertEqual(reply[0], 'error', repr(game))
+        finally:
+            os.chdir(cwd)
+
+    def test_bad_hello(self):
+        for hello in (
+            ['test'], 'test', 5, None, {'game': ['test']},
+            {'game': 'test', 'options': '1'}, {'game': 'test', 'options': [1]},
+            {'game': 'test', 'options': 1.5}, {'game': 'test', 'mode': {}},
+            {'game': 'test', 'mode': 'pictures'}, {'game': 'test', 'user': [1]}
+        ):
+            reply = self.send(hello)
+            self.assertEqual(reply[0], 'error', repr(hello))
+
+        reply = self.send({'game': 'test', 'options': 1, 'user': 'ann'})
+        self.assertEqual(reply[0], 'tables')
+
+
+if __name__ == '__main__':
+    unittest.main()